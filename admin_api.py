@@ -0,0 +1,169 @@
+'''
+运维管理API
+查询服务内部运行状态；所有接口需通过运维鉴权（见 admin_auth.py）
+'''
+import logging
+from typing import Optional
+from fastapi import APIRouter, Depends
+from fastapi.responses import JSONResponse, PlainTextResponse
+from config import settings
+from media_allocator import media_allocator
+from endpoint_router import endpoint_router
+from bootstrap import startup_timer
+from drain import drain_controller
+from admission import admission_controller
+from admin_auth import require_admin
+from rts_client import rts_client
+from record_manager import record_manager
+from agent_manager import agent_manager
+from message_bus import message_bus
+from token_renewal import relay_token_renewer
+from task_ledger import task_ledger
+from reconciler import orphan_reconciler
+from loop_monitor import loop_monitor
+from profiler import sampling_profiler, ProfileFilter, ProfilerBusy
+from tracing import tracer
+from traffic_capture import traffic_capture
+from schemas import *
+
+
+logger = logging.getLogger(__name__)
+
+admin_router = APIRouter(dependencies=[Depends(require_admin)])
+
+
+# 查询媒体节点状态
+@admin_router.get("/admin/media-nodes", response_model=MediaNodesMessage)
+async def get_media_nodes():
+    return MediaNodesMessage(type=MessageType.MediaNodes, data=media_allocator.status())
+
+
+# 查询 Volc 接入点延迟
+@admin_router.get("/admin/volc-endpoints", response_model=VolcEndpointsMessage)
+async def get_volc_endpoints():
+    return VolcEndpointsMessage(type=MessageType.VolcEndpoints, data=endpoint_router.status())
+
+
+# 查询启动耗时（模块导入、实例初始化、后台任务启动）
+@admin_router.get("/admin/startup", response_model=StartupReportMessage)
+async def get_startup_report():
+    report = StartupReport(
+        ready=startup_timer.ready,
+        total_ms=startup_timer.total_ms(),
+        phases=[StartupPhase(name=name, offset_ms=offset, elapsed_ms=elapsed)
+                for name, offset, elapsed in startup_timer.phases],
+    )
+    return StartupReportMessage(type=MessageType.StartupReport, data=report)
+
+
+# 查询停机排空状态
+@admin_router.get("/admin/drain", response_model=DrainStatusMessage)
+async def get_drain_status():
+    return DrainStatusMessage(type=MessageType.Drain, data=drain_controller.status())
+
+
+# 开始排空（可在发布前由 preStop 钩子调用），之后的加入房间请求返回503；
+# stop_tasks=true 时等待进行中的操作后停止本进程登记的所有媒体任务（会中断进行中的会议，仅用于下线实例）
+@admin_router.post("/admin/drain", response_model=DrainStatusMessage)
+async def begin_drain(stop_tasks: bool = False):
+    drain_controller.begin()
+    if stop_tasks:
+        await drain_controller.drain(stop_tasks=True)
+    return DrainStatusMessage(type=MessageType.Drain, data=drain_controller.status())
+
+
+# 查询各接口类别的并发、排队和拒绝统计
+@admin_router.get("/admin/admission", response_model=AdmissionMessage)
+async def get_admission_status():
+    return AdmissionMessage(type=MessageType.Admission, data=admission_controller.status())
+
+
+# 查询 RTS 只读查询的延迟分位数和对冲统计
+@admin_router.get("/admin/rts-hedging", response_model=RtsHedgeMessage)
+async def get_rts_hedging_status():
+    return RtsHedgeMessage(type=MessageType.RtsHedging, data=rts_client.status())
+
+
+# 查询录制状态轮询调度统计
+@admin_router.get("/admin/recording", response_model=RecordPollerMessage)
+async def get_recording_status():
+    return RecordPollerMessage(type=MessageType.RecordPoller, data=record_manager.status())
+
+
+# 查询AI智能体启动耗时统计
+@admin_router.get("/admin/agents", response_model=AgentReportMessage)
+async def get_agent_report():
+    return AgentReportMessage(type=MessageType.AgentReport, data=agent_manager.status())
+
+
+# 查询实时消息发送队列统计
+@admin_router.get("/admin/rtm", response_model=RtmBusMessage)
+async def get_rtm_status():
+    return RtmBusMessage(type=MessageType.RtmBus, data=message_bus.status())
+
+
+# 查询在线媒体流输入令牌续期统计
+@admin_router.get("/admin/relay-tokens", response_model=RelayTokenMessage)
+async def get_relay_token_status():
+    return RelayTokenMessage(type=MessageType.RelayToken, data=relay_token_renewer.status())
+
+
+# 查询媒体任务日志统计
+@admin_router.get("/admin/task-ledger", response_model=TaskLedgerMessage)
+async def get_task_ledger_status():
+    return TaskLedgerMessage(type=MessageType.TaskLedger, data=task_ledger.status())
+
+
+# 查询孤儿任务回收统计
+@admin_router.get("/admin/reconciler", response_model=ReconcilerMessage)
+async def get_reconciler_status():
+    return ReconcilerMessage(type=MessageType.Reconciler, data=orphan_reconciler.status())
+
+
+# 查询事件循环调度延迟直方图和最近的阻塞调用栈
+@admin_router.get("/admin/loop-lag", response_model=LoopLagMessage)
+async def get_loop_lag_status():
+    return LoopLagMessage(type=MessageType.LoopLag, data=loop_monitor.status())
+
+
+# 查询分布式追踪的采样和导出统计
+@admin_router.get("/admin/tracing", response_model=TracingMessage)
+async def get_tracing_status():
+    return TracingMessage(type=MessageType.Tracing, data=tracer.status())
+
+
+# 查询当前 worker 的流量录制状态
+@admin_router.get("/admin/capture", response_model=TrafficCaptureMessage)
+async def get_capture_status():
+    return TrafficCaptureMessage(type=MessageType.TrafficCapture, data=traffic_capture.status())
+
+
+# 在当前 worker 上采样N秒，返回 collapsed stack 格式的调用栈统计（可用 flamegraph.pl、speedscope 生成火焰图）
+# route 只统计路径以该前缀开头的请求，header 只统计带有该请求头的请求（格式 "名称:值"），idle 是否包含空闲线程
+@admin_router.post("/admin/profile", response_class=PlainTextResponse)
+async def run_profile(seconds: float = 10.0, hz: float = 100.0, route: Optional[str] = None,
+                      header: Optional[str] = None, idle: bool = False):
+    if not 0 < seconds <= settings.profile_max_seconds or not 0 < hz <= settings.profile_max_hz:
+        content = ResponseMessageBase(
+            type=MessageType.Profile, code=400,
+            message=f"seconds 需在 (0, {settings.profile_max_seconds}]，hz 需在 (0, {settings.profile_max_hz}]"
+        )
+        return JSONResponse(status_code=400, content=content.model_dump())
+
+    profile_filter = None
+    if route or header:
+        name, _, value = (header or "").partition(":")
+        profile_filter = ProfileFilter(route=route, header=(name.strip().lower(), value.strip()) if header else None)
+
+    try:
+        profile = await sampling_profiler.profile(seconds, hz, profile_filter, include_idle=idle)
+    except ProfilerBusy as e:
+        content = ResponseMessageBase(type=MessageType.Profile, code=409, message=str(e))
+        return JSONResponse(status_code=409, content=content.model_dump())
+
+    logger.info(f"采样完成: {profile.samples} 次，{len(profile.stacks)} 个调用栈，开销 {profile.overhead:.2%}")
+    return PlainTextResponse(profile.collapsed(), headers={
+        "X-Profile-Samples": str(profile.samples),
+        "X-Profile-Duration": f"{profile.duration:.3f}",
+        "X-Profile-Overhead": f"{profile.overhead:.4f}",
+    })
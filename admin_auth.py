@@ -0,0 +1,41 @@
+'''
+运维接口鉴权
+运维接口（/admin/*）和内部转发接口只允许运维方调用：配置了 admin_token 时请求头 X-Admin-Token 需与之一致，
+未配置时只允许本机（loopback）访问；位于反向代理之后时代理的地址也是本机，此时应配置 admin_token
+'''
+import hmac
+import ipaddress
+import logging
+from fastapi import Request
+from config import settings
+
+
+logger = logging.getLogger(__name__)
+
+ADMIN_TOKEN_HEADER = "X-Admin-Token"
+
+
+class AdminForbidden(Exception):
+    """调用方无权访问运维接口"""
+
+
+def _is_loopback(host: str) -> bool:
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return host == "localhost"
+
+
+async def require_admin(request: Request) -> None:
+    """运维接口的依赖项，校验失败时抛出 AdminForbidden（返回403）"""
+    if settings.admin_token:
+        token = request.headers.get(ADMIN_TOKEN_HEADER, "")
+        if hmac.compare_digest(token.encode("utf-8"), settings.admin_token.encode("utf-8")):
+            return
+        raise AdminForbidden(f"请求头 {ADMIN_TOKEN_HEADER} 无效")
+
+    host = request.client.host if request.client else ""
+    if _is_loopback(host):
+        return
+    logger.warning(f"拒绝来自 {host} 的运维请求: {request.method} {request.url.path}")
+    raise AdminForbidden("未配置 admin_token 时只允许本机访问")
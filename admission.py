@@ -0,0 +1,163 @@
+'''
+准入控制
+按接口类别（调用 Volc OpenAPI、调用 RTS 服务、仅本地处理）限制并发请求数，超出时排队等待，
+队列已满或排队超时立即返回503和 Retry-After，避免慢的上游拖垮所有接口
+'''
+import asyncio
+import logging
+import time
+from enum import StrEnum
+from typing import Dict, List
+from fastapi import Depends, Request
+from config import settings
+from request_deadline import DEADLINE_HEADER, parse_timeout_header, remaining_time, set_deadline
+from schemas import AdmissionStatus
+
+
+logger = logging.getLogger(__name__)
+
+
+# 接口类别
+class EndpointClass(StrEnum):
+    Volc = "volc"  # 调用 Volc OpenAPI（启动/停止媒体任务）
+    RTS = "rts"  # 调用 jusi_meet_rts 服务
+    Local = "local"  # 仅本地处理
+
+
+# 各类别默认配置: [并发数, 队列长度, 最长排队秒数]
+DEFAULT_LIMITS: Dict[str, List[float]] = {
+    EndpointClass.Volc: [32, 64, 2.0],
+    EndpointClass.RTS: [64, 128, 1.0],
+    EndpointClass.Local: [256, 512, 0.5],
+}
+
+
+# 各类别请求的默认截止时间（秒），请求头 X-Request-Timeout-Ms 可覆盖
+DEFAULT_REQUEST_TIMEOUTS: Dict[str, float] = {
+    EndpointClass.Volc: 20.0,
+    EndpointClass.RTS: 10.0,
+    EndpointClass.Local: 5.0,
+}
+
+
+class AdmissionRejected(Exception):
+    """请求被拒绝（队列已满或排队超时）"""
+
+    def __init__(self, endpoint_class: str, reason: str):
+        super().__init__(f"{endpoint_class}: {reason}")
+        self.endpoint_class = endpoint_class
+        self.reason = reason
+
+
+class AdmissionLimiter:
+    """单个接口类别的并发限制和等待队列"""
+
+    def __init__(self, endpoint_class: str, concurrency: int, queue_size: int, max_wait: float):
+        self.endpoint_class = endpoint_class
+        self.concurrency = max(1, concurrency)
+        self.queue_size = max(0, queue_size)
+        self.max_wait = max_wait
+        self._semaphore = asyncio.Semaphore(self.concurrency)
+        self.active = 0
+        self.waiting = 0
+        self.peak_waiting = 0
+        self.admitted = 0
+        self.shed_queue_full = 0
+        self.shed_timeout = 0
+        self._wait_total = 0.0  # 已准入请求的累计排队时间（秒）
+
+    async def acquire(self) -> None:
+        if self._semaphore.locked():
+            if self.waiting >= self.queue_size:
+                self.shed_queue_full += 1
+                raise AdmissionRejected(self.endpoint_class, "队列已满")
+
+            # 排队时间同样计入请求截止时间
+            max_wait = self.max_wait
+            remaining = remaining_time()
+            if remaining is not None:
+                max_wait = max(0.0, min(max_wait, remaining))
+
+            start = time.perf_counter()
+            self.waiting += 1
+            self.peak_waiting = max(self.peak_waiting, self.waiting)
+            try:
+                await asyncio.wait_for(self._semaphore.acquire(), timeout=max_wait)
+            except asyncio.TimeoutError:
+                self.shed_timeout += 1
+                raise AdmissionRejected(self.endpoint_class, "排队超时")
+            finally:
+                self.waiting -= 1
+            self._wait_total += time.perf_counter() - start
+        else:
+            await self._semaphore.acquire()
+
+        self.active += 1
+        self.admitted += 1
+
+    def release(self) -> None:
+        self.active -= 1
+        self._semaphore.release()
+
+    async def __aenter__(self) -> "AdmissionLimiter":
+        await self.acquire()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb) -> None:
+        self.release()
+
+    def status(self) -> AdmissionStatus:
+        return AdmissionStatus(
+            endpoint_class=self.endpoint_class,
+            concurrency=self.concurrency,
+            queue_size=self.queue_size,
+            max_wait=self.max_wait,
+            active=self.active,
+            waiting=self.waiting,
+            peak_waiting=self.peak_waiting,
+            admitted=self.admitted,
+            shed_queue_full=self.shed_queue_full,
+            shed_timeout=self.shed_timeout,
+            avg_wait_ms=self._wait_total / self.admitted * 1000 if self.admitted else 0.0,
+        )
+
+
+class AdmissionController:
+    """各接口类别的准入限制"""
+
+    def __init__(self):
+        limits = {**DEFAULT_LIMITS, **settings.admission_limits}
+        self.limiters: Dict[str, AdmissionLimiter] = {
+            endpoint_class: AdmissionLimiter(endpoint_class, int(limit[0]), int(limit[1]), float(limit[2]))
+            for endpoint_class, limit in limits.items()
+        }
+
+    def limiter(self, endpoint_class: EndpointClass) -> AdmissionLimiter:
+        return self.limiters[endpoint_class]
+
+    def status(self) -> List[AdmissionStatus]:
+        return [limiter.status() for limiter in self.limiters.values()]
+
+
+# 准入控制全局实例
+admission_controller: AdmissionController = AdmissionController()
+
+
+def request_timeout(endpoint_class: EndpointClass) -> float:
+    return settings.request_timeouts.get(endpoint_class, DEFAULT_REQUEST_TIMEOUTS[endpoint_class])
+
+
+def admit(endpoint_class: EndpointClass, streaming: bool = False):
+    """路由依赖：设置请求截止时间，请求处理期间占用一个该类别的并发名额
+
+    streaming=True 用于 SSE 等流式接口：名额只在路由函数执行期间占用，返回 StreamingResponse 前释放，
+    避免长连接一直占用名额、挤占心跳等短请求
+    """
+    limiter = admission_controller.limiter(endpoint_class)
+
+    async def dependency(request: Request):
+        set_deadline(parse_timeout_header(request.headers.get(DEADLINE_HEADER), request_timeout(endpoint_class)))
+        async with limiter:
+            yield
+
+    return Depends(dependency, scope="function" if streaming else None)
@@ -0,0 +1,90 @@
+'''
+AI智能体API
+lazy 模式下设备检测到首次说话时启动智能体，设备上报智能体进房、欢迎词播放事件，查询启动时间线
+'''
+import logging
+from fastapi import APIRouter
+from agent_manager import agent_manager, AgentEvent, AgentKind, AgentStatus
+from session_registry import session_registry, TaskType, DeviceSession, MediaTask
+from task_manager import stop_session_tasks
+from drain import drain_controller
+from admission import admit, EndpointClass
+from request_deadline import DeadlineExceeded, no_deadline
+from schemas import *
+
+
+logger = logging.getLogger(__name__)
+
+agent_router = APIRouter()
+
+
+# 启动AI智能体接口（使用加入房间时构建好的请求体，重复调用返回已有结果）
+@agent_router.post("/agent/activate", response_model=AgentTimelineMessage, dependencies=[admit(EndpointClass.Volc)])
+async def activate_agent(data: AgentActivateRequest):
+    prepared = agent_manager.get(data.device_sn)
+    if prepared is None:
+        return AgentTimelineMessage(type=MessageType.AgentActivate, code=404, message="设备没有可启动的智能体")
+
+    # 设备已不在智能体对应的房间（房间已停止、会话已回收等）时不能启动，否则智能体任务无法登记，之后无人停止
+    session = session_registry.get_session(data.device_sn)
+    if session is None or session.room_id != prepared.room_id:
+        agent_manager.release(data.device_sn)
+        return AgentTimelineMessage(type=MessageType.AgentActivate, code=404,
+                                    message=f"设备不在房间 {prepared.room_id} 中，不能启动智能体")
+
+    try:
+        with drain_controller.track():
+            timeline = await agent_manager.start(data.device_sn)
+    except DeadlineExceeded as e:
+        # 智能体可能已启动，只停止智能体任务后返回超时，设备的媒体任务保持运行
+        logger.warning(f"启动智能体超过请求截止时间: {str(e)}")
+        session = session_registry.get_session(data.device_sn)
+        if session is not None:
+            tasks = {t: task for t, task in session.tasks.items() if t in (TaskType.VoiceChat, TaskType.VideoChat)}
+            agent_session = DeviceSession(device_sn=session.device_sn, room_id=session.room_id,
+                                          user_id=session.user_id, tasks=tasks)
+            with drain_controller.track(), no_deadline():
+                await stop_session_tasks([agent_session])
+        return AgentTimelineMessage(type=MessageType.AgentActivate, code=504,
+                                    message=f"启动智能体超过请求截止时间: {str(e)}")
+
+    # 启动期间会话被关闭或替换（房间停止、设备离开）时智能体任务未能登记，立即停止
+    if timeline.status == AgentStatus.Started and session_registry.get_session(data.device_sn) is not session:
+        task_type = TaskType.VoiceChat if timeline.kind == AgentKind.Voice else TaskType.VideoChat
+        agent_session = DeviceSession(device_sn=session.device_sn, room_id=session.room_id, user_id=session.user_id,
+                                      tasks={task_type: MediaTask(room_id=session.room_id, task_id=data.device_sn,
+                                                                  task_type=task_type)})
+        logger.warning(f"设备 {data.device_sn} 启动智能体期间已离开房间 {session.room_id}，停止智能体")
+        with drain_controller.track(), no_deadline():
+            await stop_session_tasks([agent_session])
+        agent_manager.release(data.device_sn)
+        return AgentTimelineMessage(type=MessageType.AgentActivate, code=404,
+                                    message=f"设备已离开房间 {session.room_id}，智能体已停止")
+
+    if timeline.status == AgentStatus.Failed:
+        return AgentTimelineMessage(type=MessageType.AgentActivate, code=500,
+                                    message=f"启动智能体失败: {timeline.error}", data=timeline)
+    return AgentTimelineMessage(type=MessageType.AgentActivate, data=timeline)
+
+
+# 上报AI智能体事件接口（智能体进房、欢迎词开始播放）
+@agent_router.post("/agent/events", response_model=AgentTimelineMessage, dependencies=[admit(EndpointClass.Local)])
+async def report_agent_event(data: AgentEventRequest):
+    try:
+        event = AgentEvent(data.event)
+    except ValueError:
+        return AgentTimelineMessage(type=MessageType.AgentEvent, code=400, message=f"未知的事件: {data.event}")
+
+    timeline = agent_manager.record_event(data.device_sn, event)
+    if timeline is None:
+        return AgentTimelineMessage(type=MessageType.AgentEvent, code=404, message="设备没有智能体")
+    return AgentTimelineMessage(type=MessageType.AgentEvent, data=timeline)
+
+
+# 查询AI智能体启动时间线接口
+@agent_router.get("/agent/{device_sn}", response_model=AgentTimelineMessage, dependencies=[admit(EndpointClass.Local)])
+async def get_agent_timeline(device_sn: str):
+    timeline = agent_manager.get(device_sn)
+    if timeline is None:
+        return AgentTimelineMessage(type=MessageType.AgentTimeline, code=404, message="设备没有智能体")
+    return AgentTimelineMessage(type=MessageType.AgentTimeline, data=timeline)
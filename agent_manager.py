@@ -0,0 +1,262 @@
+'''
+AI智能体生命周期管理
+设备加入房间时提前构建并校验 StartVoiceChat/StartVideoChat 请求体，按配置与媒体任务并发启动智能体，
+或在设备检测到首次说话时再启动；记录从请求启动到智能体启动、进房、播放欢迎词的时间线
+'''
+import asyncio
+import json
+import logging
+import time
+from collections import Counter, deque
+from dataclasses import dataclass
+from enum import StrEnum
+from typing import Deque, Dict, Optional
+from config import settings
+from vertc_client import rtc_client
+from session_registry import session_registry, TaskType, DeviceSession
+from request_deadline import DeadlineExceeded
+from schemas import AgentTimeline, AgentReport, LatencySummary
+from utils import current_timestamp_ms
+
+
+logger = logging.getLogger(__name__)
+
+
+# 智能体类型
+class AgentKind(StrEnum):
+    Voice = "voice"  # 实时对话式AI（StartVoiceChat）
+    Video = "video"  # 音视频互动智能体（StartVideoChat）
+
+
+# 智能体启动方式
+class AgentStartMode(StrEnum):
+    Off = "off"  # 不启动
+    Concurrent = "concurrent"  # 加入房间时与媒体任务并发启动
+    Lazy = "lazy"  # 设备检测到首次说话时启动
+
+
+# 智能体状态
+class AgentStatus(StrEnum):
+    Prepared = "prepared"  # 请求体已构建
+    Starting = "starting"
+    Started = "started"  # 启动接口已返回
+    Ready = "ready"  # 智能体已进房
+    Failed = "failed"
+    Stopped = "stopped"
+
+
+# 设备上报的时间线事件
+class AgentEvent(StrEnum):
+    Ready = "ready"  # 智能体进房
+    Welcome = "welcome"  # 欢迎词开始播放
+
+
+# 各类智能体对应的任务类型和启动接口（VertcService 方法名）
+_AGENT_APIS: Dict[AgentKind, tuple] = {
+    AgentKind.Voice: (TaskType.VoiceChat, "start_voice_chat"),
+    AgentKind.Video: (TaskType.VideoChat, "start_video_chat"),
+}
+
+# 请求体中必须有值的字段
+_REQUIRED_FIELDS: Dict[AgentKind, tuple] = {
+    AgentKind.Voice: ("AppId", "RoomId", "TaskId", "AgentConfig.UserId", "AgentConfig.TargetUserId",
+                      "Config.S2SConfig.ProviderParams.app.appid", "Config.S2SConfig.ProviderParams.app.token"),
+    AgentKind.Video: ("AppId", "RoomId", "TaskId", "AgentConfig.UserId", "AgentConfig.TargetUserId",
+                      "Config.LLMConfig.ModelName", "Config.TTSConfig.Provider"),
+}
+
+
+class AgentConfigError(ValueError):
+    """智能体请求体校验失败"""
+
+
+# 设备的智能体
+@dataclass
+class DeviceAgent:
+    kind: AgentKind
+    body: bytes  # 提前构建的启动请求体
+    timeline: AgentTimeline
+    starting: Optional[asyncio.Future] = None  # 启动中时，其他启动请求等待该结果
+
+
+class AgentManager:
+    """AI智能体的提前构建、启动和时间线统计（仅在事件循环线程中访问）"""
+
+    def __init__(self):
+        self.mode = AgentStartMode(settings.agent_start_mode)
+        self.kind = AgentKind(settings.agent_kind)
+        self.error: Optional[str] = None  # 配置校验失败原因，失败时不启动智能体
+        self._agents: Dict[str, DeviceAgent] = {}  # device_sn -> 智能体
+        self._start_ms: Deque[int] = deque(maxlen=settings.agent_timeline_samples)
+        self._ready_ms: Deque[int] = deque(maxlen=settings.agent_timeline_samples)
+        self._welcome_ms: Deque[int] = deque(maxlen=settings.agent_timeline_samples)
+
+    @property
+    def enabled(self) -> bool:
+        return self.mode != AgentStartMode.Off and self.error is None
+
+    def validate_config(self) -> None:
+        """启动时用示例参数构建一次请求体并校验，配置有误时记录原因并关闭智能体"""
+        if self.mode == AgentStartMode.Off:
+            return
+        try:
+            self._validate(self._build_body("room", "device", "user"))
+        except Exception as e:
+            self.error = str(e)
+            logger.error(f"智能体配置校验失败，不启动智能体: {self.error}")
+
+    def _build_body(self, room_id: str, device_sn: str, user_id: str) -> bytes:
+        if self.kind == AgentKind.Voice:
+            return rtc_client.build_voice_chat_body(
+                room_id=room_id, bot_id=device_sn, user_id=user_id, task_id=device_sn, dialog_id=device_sn
+            )
+        return rtc_client.build_video_chat_body(room_id=room_id, bot_id=device_sn, user_id=user_id, task_id=device_sn)
+
+    def _validate(self, body: bytes) -> None:
+        try:
+            payload = json.loads(body)
+        except ValueError as e:
+            raise AgentConfigError(f"请求体不是有效的JSON: {str(e)}")
+        for path in _REQUIRED_FIELDS[self.kind]:
+            value = payload
+            for key in path.split("."):
+                value = value.get(key) if isinstance(value, dict) else None
+            if not value:
+                raise AgentConfigError(f"请求体缺少 {path}")
+
+    def prepare(self, session: DeviceSession) -> Optional[AgentTimeline]:
+        """设备加入房间时构建并校验启动请求体（纯本地计算，不调用上游）"""
+        if not self.enabled:
+            return None
+
+        agent = self._agents.get(session.device_sn)
+        if agent is not None and agent.timeline.room_id == session.room_id \
+                and agent.timeline.status not in (AgentStatus.Failed, AgentStatus.Stopped):
+            return agent.timeline
+
+        start = time.perf_counter()
+        timeline = AgentTimeline(device_sn=session.device_sn, room_id=session.room_id, kind=self.kind,
+                                 mode=self.mode, status=AgentStatus.Prepared)
+        try:
+            body = self._build_body(session.room_id, session.device_sn, session.user_id)
+            self._validate(body)
+        except Exception as e:
+            logger.warning(f"设备 {session.device_sn} 的智能体请求体构建失败: {str(e)}")
+            timeline.status = AgentStatus.Failed
+            timeline.error = str(e)
+            body = b""
+        timeline.prepare_ms = (time.perf_counter() - start) * 1000
+        self._agents[session.device_sn] = DeviceAgent(kind=self.kind, body=body, timeline=timeline)
+        return timeline
+
+    def get(self, device_sn: str) -> Optional[AgentTimeline]:
+        agent = self._agents.get(device_sn)
+        return agent.timeline if agent is not None else None
+
+    async def start(self, device_sn: str) -> Optional[AgentTimeline]:
+        """使用提前构建的请求体启动智能体，重复调用时返回已有结果
+
+        启动失败只记录在时间线中，不影响加入房间；超过请求截止时间时登记可能已启动的任务后抛出 DeadlineExceeded
+        """
+        agent = self._agents.get(device_sn)
+        if agent is None or not agent.body:
+            return agent.timeline if agent is not None else None
+        if agent.starting is not None:
+            await asyncio.shield(agent.starting)
+            return agent.timeline
+        if agent.timeline.status not in (AgentStatus.Prepared, AgentStatus.Failed):
+            return agent.timeline
+
+        agent.starting = asyncio.get_running_loop().create_future()
+        try:
+            await self._start(device_sn, agent)
+        finally:
+            agent.starting.set_result(None)
+            agent.starting = None
+        return agent.timeline
+
+    async def _start(self, device_sn: str, agent: DeviceAgent) -> None:
+        timeline = agent.timeline
+        task_type, method = _AGENT_APIS[agent.kind]
+        timeline.status = AgentStatus.Starting
+        timeline.error = None
+        timeline.requested_at = current_timestamp_ms()
+        try:
+            # SDK为同步调用，放到线程池中执行
+            response = await asyncio.to_thread(rtc_client.start_agent, method, agent.body)
+            error = response.get("ResponseMetadata", {}).get("Error") if isinstance(response, dict) else None
+            if error:
+                raise Exception(f"{error.get('Code')}: {error.get('Message')}")
+        except DeadlineExceeded as e:
+            # 智能体可能已在服务端启动，登记后由调用方统一停止
+            session_registry.add_task(device_sn, task_type, device_sn)
+            timeline.status = AgentStatus.Failed
+            timeline.error = str(e)
+            raise
+        except Exception as e:
+            logger.warning(f"设备 {device_sn} 启动智能体失败: {str(e)}")
+            timeline.status = AgentStatus.Failed
+            timeline.error = str(e)
+            return
+
+        session_registry.add_task(device_sn, task_type, device_sn)
+        timeline.status = AgentStatus.Started
+        timeline.started_at = current_timestamp_ms()
+        timeline.start_ms = timeline.started_at - timeline.requested_at
+        self._start_ms.append(timeline.start_ms)
+        logger.info(f"设备 {device_sn} 的智能体已启动，耗时{timeline.start_ms}ms")
+
+    def record_event(self, device_sn: str, event: AgentEvent) -> Optional[AgentTimeline]:
+        """记录设备上报的智能体进房、欢迎词播放时间"""
+        agent = self._agents.get(device_sn)
+        if agent is None:
+            return None
+        timeline = agent.timeline
+        now = current_timestamp_ms()
+        if event == AgentEvent.Ready and timeline.ready_at is None:
+            timeline.ready_at = now
+            if timeline.status == AgentStatus.Started:
+                timeline.status = AgentStatus.Ready
+            if timeline.requested_at is not None:
+                timeline.ready_ms = now - timeline.requested_at
+                self._ready_ms.append(timeline.ready_ms)
+        elif event == AgentEvent.Welcome and timeline.welcome_at is None:
+            timeline.welcome_at = now
+            if timeline.requested_at is not None:
+                timeline.welcome_ms = now - timeline.requested_at
+                self._welcome_ms.append(timeline.welcome_ms)
+        return timeline
+
+    def release(self, device_sn: str) -> None:
+        """智能体任务已停止（设备离开房间等），移除设备的智能体"""
+        agent = self._agents.pop(device_sn, None)
+        if agent is not None:
+            agent.timeline.status = AgentStatus.Stopped
+
+    @staticmethod
+    def _summary(samples: Deque[int]) -> LatencySummary:
+        if not samples:
+            return LatencySummary(count=0)
+        ordered = sorted(samples)
+
+        def percentile(p: float) -> int:
+            return ordered[min(len(ordered) - 1, int(len(ordered) * p))]
+
+        return LatencySummary(count=len(ordered), p50_ms=percentile(0.50), p95_ms=percentile(0.95), max_ms=ordered[-1])
+
+    def status(self) -> AgentReport:
+        return AgentReport(
+            mode=self.mode,
+            kind=self.kind,
+            enabled=self.enabled,
+            error=self.error,
+            agents=len(self._agents),
+            by_status=dict(Counter(agent.timeline.status for agent in self._agents.values())),
+            start_ms=self._summary(self._start_ms),
+            ready_ms=self._summary(self._ready_ms),
+            welcome_ms=self._summary(self._welcome_ms),
+        )
+
+
+# 智能体管理全局实例
+agent_manager: AgentManager = AgentManager()
@@ -0,0 +1,129 @@
+'''
+access_token 兼容性语料
+固定 nonce / issued_at 生成各种形态的 token，记录参考实现的输出，
+用于校验 access_token.py 的任何改动（包括性能优化）与参考实现逐字节一致
+
+用法:
+  python bench/access_token_corpus.py           校验当前实现与语料一致
+  python bench/access_token_corpus.py --update  用当前实现重新生成语料（仅在确认格式变更时使用）
+'''
+import argparse
+import json
+import os
+import sys
+from common import setup_env
+
+setup_env()
+
+from access_token import AccessToken, parse, PrivPublishStream, PrivSubscribeStream
+
+CORPUS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "access_token_corpus.json")
+
+APP_ID = "0123456789abcdef01234567"
+APP_KEY = "bench_app_key"
+ISSUED_AT = 1700000000
+EXPIRE_AT = 4102444800  # 2100-01-01，保证 verify 不因过期失败
+
+# 形态名 -> (room_id, user_id, nonce, expire_at, [(权限, 过期时间)])
+SHAPES = {
+    "minimal": ("1", "u", 1, 0, []),
+    "subscribe_only": ("100", "user_1", 12345678, 0, [(PrivSubscribeStream, 0)]),
+    "publish_only": ("100", "user_1", 99999999, EXPIRE_AT, [(PrivPublishStream, EXPIRE_AT)]),
+    # 与 utils.generate_token / VertcClient 生成的 token 相同
+    "relay": ("10086", "SN00000001", 4242, EXPIRE_AT, [(PrivSubscribeStream, 0), (PrivPublishStream, EXPIRE_AT)]),
+    "unicode_ids": ("会议室-101", "用户_张三", 7, EXPIRE_AT, [(PrivSubscribeStream, 0), (PrivPublishStream, EXPIRE_AT)]),
+    "long_ids": ("r" * 128, "u" * 128, 55555555, EXPIRE_AT, [(PrivSubscribeStream, 0), (PrivPublishStream, EXPIRE_AT)]),
+    "max_values": ("4294967295", "4294967295", 0xFFFFFFFF, 0xFFFFFFFF,
+                   [(PrivSubscribeStream, 0xFFFFFFFF), (PrivPublishStream, 0xFFFFFFFF)]),
+    "unsorted_privileges": ("200", "user_2", 31415926, EXPIRE_AT,
+                            [(PrivSubscribeStream, EXPIRE_AT), (3, EXPIRE_AT - 3), (1, EXPIRE_AT - 1), (2, EXPIRE_AT - 2)]),
+}
+
+
+def build_token(shape: str) -> AccessToken:
+    """按形态构造 token，nonce 和 issued_at 固定以保证输出可复现"""
+    room_id, user_id, nonce, expire_at, privileges = SHAPES[shape]
+    token = AccessToken(APP_ID, APP_KEY, room_id, user_id)
+    token.nonce = nonce
+    token.issued_at = ISSUED_AT
+    for privilege, expire_ts in privileges:
+        token.add_privilege(privilege, expire_ts)
+    token.expire_time(expire_at)
+    return token
+
+
+def build_corpus() -> dict:
+    corpus = {}
+    for shape in SHAPES:
+        token = build_token(shape)
+        corpus[shape] = {
+            "room_id": token.room_id,
+            "user_id": token.user_id,
+            "nonce": token.nonce,
+            "issued_at": token.issued_at,
+            "expire_at": token.expire_at,
+            "privileges": {str(k): v for k, v in sorted(token.privileges.items())},
+            "token": token.serialize(),
+        }
+    return corpus
+
+
+def load_corpus() -> dict:
+    with open(CORPUS_FILE, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def check_corpus(corpus: dict) -> list:
+    """校验 serialize / parse / verify 与语料一致，返回不一致项的描述"""
+    mismatches = []
+    for shape, expected in corpus.items():
+        raw = build_token(shape).serialize()
+        if raw != expected["token"]:
+            mismatches.append(f"{shape}: serialize 输出不一致")
+
+        token = parse(expected["token"])
+        if token is None:
+            mismatches.append(f"{shape}: parse 失败")
+            continue
+        fields = {
+            "room_id": token.room_id,
+            "user_id": token.user_id,
+            "nonce": token.nonce,
+            "issued_at": token.issued_at,
+            "expire_at": token.expire_at,
+            "privileges": {str(k): v for k, v in sorted(token.privileges.items())},
+        }
+        for key, value in fields.items():
+            if value != expected[key]:
+                mismatches.append(f"{shape}: parse 字段 {key} 不一致: {value!r} != {expected[key]!r}")
+        if token.app_id != APP_ID:
+            mismatches.append(f"{shape}: parse 字段 app_id 不一致")
+        if not token.verify(APP_KEY):
+            mismatches.append(f"{shape}: verify 失败")
+        if token.verify(APP_KEY + "x"):
+            mismatches.append(f"{shape}: 错误密钥 verify 通过")
+    return mismatches
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="access_token 兼容性语料")
+    parser.add_argument("--update", action="store_true", help="用当前实现重新生成语料")
+    args = parser.parse_args()
+
+    if args.update:
+        with open(CORPUS_FILE, "w", encoding="utf-8") as f:
+            json.dump(build_corpus(), f, ensure_ascii=False, indent=2)
+            f.write("\n")
+        print(f"已生成 {CORPUS_FILE}")
+        return
+
+    mismatches = check_corpus(load_corpus())
+    for mismatch in mismatches:
+        print(f"[FAIL] {mismatch}")
+    if mismatches:
+        sys.exit(1)
+    print(f"兼容性校验通过，共 {len(SHAPES)} 种形态")
+
+
+if __name__ == "__main__":
+    main()
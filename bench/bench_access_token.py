@@ -0,0 +1,84 @@
+'''
+access_token 基准测试
+按兼容性语料中的各种 token 形态测量 serialize / parse / verify 以及内部打包函数的耗时，
+运行前先校验当前实现与语料逐字节一致，不一致时不输出结果
+
+用法:
+  python bench/bench_access_token.py
+  python bench/bench_access_token.py --save results.json          保存结果，便于跟踪
+  python bench/bench_access_token.py --baseline results.json      与保存的结果对比
+'''
+import argparse
+import json
+import platform
+import sys
+import time
+from common import measure, print_table
+from access_token_corpus import SHAPES, APP_KEY, build_token, check_corpus, load_corpus
+from access_token import parse, pack_map_uint32
+
+
+def cases(corpus: dict) -> list:
+    """(用例名, 调用函数)，每种形态一组"""
+    result = []
+    for shape in SHAPES:
+        token = build_token(shape)
+        raw = corpus[shape]["token"]
+        parsed = parse(raw)
+        result += [
+            (f"{shape}.serialize", token.serialize),
+            (f"{shape}.parse", lambda raw=raw: parse(raw)),
+            (f"{shape}.verify", lambda parsed=parsed: parsed.verify(APP_KEY)),
+            (f"{shape}.pack_msg", token.pack_msg),
+            (f"{shape}.pack_map_uint32", lambda privileges=token.privileges: pack_map_uint32(privileges)),
+        ]
+    return result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="access_token 基准测试")
+    parser.add_argument("--save", help="保存结果到 JSON 文件")
+    parser.add_argument("--baseline", help="与之前保存的结果对比")
+    parser.add_argument("--filter", default="", help="只运行名称包含该字符串的用例")
+    args = parser.parse_args()
+
+    corpus = load_corpus()
+    mismatches = check_corpus(corpus)
+    if mismatches:
+        for mismatch in mismatches:
+            print(f"[FAIL] {mismatch}")
+        sys.exit(1)
+
+    baseline = {}
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)["results"]
+
+    results, rows = {}, []
+    for name, func in cases(corpus):
+        if args.filter not in name:
+            continue
+        us = measure(func)
+        results[name] = us
+        row = [name, f"{us:.2f}"]
+        if baseline:
+            before = baseline.get(name)
+            row += [f"{before:.2f}" if before else "-", f"{before / us:.2f}x" if before else "-"]
+        rows.append(row)
+
+    headers = ["用例", "us/次"] + (["baseline", "加速"] if baseline else [])
+    print_table(f"access_token 耗时（Python {platform.python_version()}）", headers, rows)
+
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump({
+                "python": platform.python_version(),
+                "machine": platform.machine(),
+                "timestamp": int(time.time()),
+                "results": results,
+            }, f, ensure_ascii=False, indent=2)
+        print(f"\n结果已保存到 {args.save}")
+
+
+if __name__ == "__main__":
+    main()
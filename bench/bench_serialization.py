@@ -0,0 +1,85 @@
+'''
+响应序列化基准测试
+对比每个接口的响应在 FastAPI 中的序列化耗时（响应模型校验 + 序列化 + JSON编码）：
+  before: response_model=ResponseMessageBase（data 为 Any）+ 标准 JSONResponse
+  after:  response_model=ResponseMessage[具体类型] + 配置的响应类（默认 ORJSONResponse）
+
+用法: python bench/bench_serialization.py
+'''
+from common import setup_env, measure, print_table
+
+setup_env()
+
+from fastapi.responses import JSONResponse
+from fastapi.utils import create_model_field
+from main import get_response_class
+from schemas import *
+
+
+def sample_responses():
+    """各接口的典型响应: (接口, 旧响应模型, 新响应模型, 响应内容)"""
+    join = CameraJoinResponse(rtmp_url="rtmp://10.0.0.1:1935/live/SN0001", rtsp_url="rtsp://10.0.0.2:554/live_SN0001")
+    job = JoinJobStatus(
+        job_id="0" * 32, device_sn="SN0001", room_id="100", status="succeeded", result=join,
+        steps=[JoinJobStep(name="MixedStreamStarted"), JoinJobStep(name="RelayStreamStarted")],
+    )
+    teardown = RoomTeardownResponse(
+        room_id="100", total=20, stopped=20, failed=0, elapsed_ms=350,
+        tasks=[TaskStopResult(device_sn=f"SN{i:04d}", task_type="RelayStream", task_id=f"SN{i:04d}", success=True, attempts=1)
+               for i in range(20)],
+    )
+    nodes = [MediaNodeStatus(pool="ingest", node=f"10.0.0.{i}:1935", healthy=True, rtt_ms=1.5, devices=30, weight=0.8)
+             for i in range(8)]
+    endpoints = [VolcEndpointStatus(endpoint="rtc.volcengineapi.com@cn-north-1", healthy=True, probe_rtt_ms=12.0,
+                                    call_latency_ms=80.0, calls=1000, errors=2,
+                                    pool=VolcPoolStats(pool_size=10, created=4, requests=1000, idle=3, warmups=20))]
+    meetings = GetMyMeetingsResponse(code=200, total=20, meetings=[
+        MeetingInfo(room_id=f"{i}", room_name=f"会议{i}", host_user_id="u1", host_user_name="主持人",
+                    start_time=1700000000000, user_count=5)
+        for i in range(20)
+    ])
+
+    return [
+        ("POST /camera/join", ResponseMessageBase, CameraJoinMessage,
+         lambda m: m(type=MessageType.CameraJoinRoom, data=join)),
+        ("POST /camera/leave", ResponseMessageBase, CameraLeaveMessage,
+         lambda m: m(type=MessageType.CameraLeaveRoom)),
+        ("GET /camera/jobs/{job_id}", ResponseMessageBase, JoinJobMessage,
+         lambda m: m(type=MessageType.CameraJoinJob, data=job)),
+        ("POST /room/teardown", ResponseMessageBase, RoomTeardownMessage,
+         lambda m: m(type=MessageType.RoomTeardown, data=teardown)),
+        ("GET /admin/media-nodes", ResponseMessageBase, MediaNodesMessage,
+         lambda m: m(type=MessageType.MediaNodes, data=nodes)),
+        ("GET /admin/volc-endpoints", ResponseMessageBase, VolcEndpointsMessage,
+         lambda m: m(type=MessageType.VolcEndpoints, data=endpoints)),
+        ("POST /meeting/get-my", GetMyMeetingsResponse, GetMyMeetingsResponse,
+         lambda m: meetings),
+    ]
+
+
+def make_runner(model, response_class, content):
+    """与 fastapi.routing.serialize_response 相同的处理: 校验响应模型、序列化，再由响应类编码为响应体"""
+    field = create_model_field(name="Response", type_=model, mode="serialization")
+
+    def run():
+        value, errors = field.validate(content, {}, loc=("response",))
+        assert not errors, errors
+        return response_class(field.serialize(value)).body
+
+    return run
+
+
+def main():
+    response_class = get_response_class()
+    rows = []
+    for route, old_model, new_model, build in sample_responses():
+        before = measure(make_runner(old_model, JSONResponse, build(old_model)))
+        after = measure(make_runner(new_model, response_class, build(new_model)))
+        rows.append((route, f"{before:.1f}", f"{after:.1f}", f"{before / after:.2f}x"))
+
+    print_table(f"响应序列化耗时（us/请求），after 使用 {response_class.__name__}",
+                ["接口", "before", "after", "加速"], rows)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+'''
+启动耗时基准测试
+在全新的子进程中导入 main 并执行 lifespan 启动，重复多次，输出各启动阶段耗时的中位数；
+Volc 接入点指向本地未监听端口，预热快速失败，不访问真实服务
+
+用法: python bench/bench_startup.py --runs 5
+'''
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from collections import defaultdict
+from common import BENCH_ENV, ROOT_DIR, print_table
+
+# 子进程：导入 main，执行 lifespan 启动和关闭，输出启动报告
+CHILD = '''
+import asyncio, json
+import main
+from bootstrap import startup_timer
+
+async def run():
+    async with main.app.router.lifespan_context(main.app):
+        pass
+
+asyncio.run(run())
+print(json.dumps({"total_ms": startup_timer.total_ms(), "phases": startup_timer.phases}))
+'''
+
+
+def run_once() -> dict:
+    env = {**BENCH_ENV, **os.environ, "VOLC_ENDPOINTS": '["127.0.0.1:9@cn-north-1"]'}
+    output = subprocess.run([sys.executable, "-c", CHILD], cwd=ROOT_DIR, env=env,
+                            capture_output=True, text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="启动耗时基准测试")
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    totals, phases = [], defaultdict(list)
+    for _ in range(args.runs):
+        report = run_once()
+        totals.append(report["total_ms"])
+        for name, _, elapsed in report["phases"]:
+            phases[name].append(elapsed)
+
+    rows = [(name, f"{statistics.median(values):.1f}") for name, values in phases.items()]
+    rows.append(("total", f"{statistics.median(totals):.1f}"))
+    print_table(f"启动各阶段耗时中位数（ms，{args.runs} 次）", ["阶段", "耗时"], rows)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+'''
+worker 数扩展性基准测试
+按不同 worker 数以生产模式启动 server.py，用多个客户端进程在长连接上闭环压测同一接口，
+输出每种 worker 数下的吞吐和延迟，用于确定 workers 配置
+
+用法:
+  python bench/bench_workers.py --workers 1,2,4 --connections 64 --duration 10
+  python bench/bench_workers.py --workers 1,2 --loop asyncio --http h11     对比标准事件循环和解析器
+'''
+import argparse
+import asyncio
+import multiprocessing
+import os
+import socket
+import subprocess
+import sys
+import time
+from typing import List, Tuple
+from common import BENCH_ENV, ROOT_DIR, print_table
+
+
+async def _connection_loop(host: str, port: int, path: str, deadline: float, latencies: List[float]) -> int:
+    """单个长连接上顺序发送请求，返回失败数"""
+    request = f"GET {path} HTTP/1.1\r\nHost: {host}\r\n\r\n".encode()
+    errors = 0
+    reader, writer = await asyncio.open_connection(host, port)
+    while time.perf_counter() < deadline:
+        start = time.perf_counter()
+        try:
+            writer.write(request)
+            header = await reader.readuntil(b"\r\n\r\n")
+            length = 0
+            for line in header.split(b"\r\n"):
+                if line.lower().startswith(b"content-length:"):
+                    length = int(line.split(b":", 1)[1])
+            await reader.readexactly(length)
+            if not header.startswith(b"HTTP/1.1 200"):
+                errors += 1
+        except (OSError, asyncio.IncompleteReadError):
+            errors += 1
+            writer.close()
+            reader, writer = await asyncio.open_connection(host, port)
+            continue
+        latencies.append(time.perf_counter() - start)
+    writer.close()
+    return errors
+
+
+def _client_process(host: str, port: int, path: str, connections: int, duration: float) -> Tuple[List[float], int]:
+    async def run():
+        latencies = []
+        deadline = time.perf_counter() + duration
+        errors = await asyncio.gather(*[
+            _connection_loop(host, port, path, deadline, latencies) for _ in range(connections)
+        ])
+        return latencies, sum(errors)
+
+    return asyncio.run(run())
+
+
+def wait_ready(host: str, port: int, timeout: float = 60.0) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection((host, port), timeout=1).close()
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f"等待服务启动超时: {host}:{port}")
+
+
+def run_case(args, workers: int) -> tuple:
+    env = {**BENCH_ENV, **os.environ,
+           "DEBUG": "false", "WORKERS": str(workers), "ALLOW_MULTI_WORKER": "true", "BIND_ADDR": args.host, "BIND_PORT": str(args.port),
+           "LOOP": args.loop, "HTTP": args.http, "REUSE_PORT": str(args.reuse_port).lower(),
+           "VOLC_ENDPOINTS": '["127.0.0.1:9@cn-north-1"]'}
+    server = subprocess.Popen([sys.executable, "server.py"], cwd=ROOT_DIR, env=env,
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        wait_ready(args.host, args.port)
+        time.sleep(args.settle)  # 等待所有 worker 完成启动
+
+        per_client = max(1, args.connections // args.clients)
+        with multiprocessing.get_context("spawn").Pool(args.clients) as pool:
+            start = time.perf_counter()
+            results = pool.starmap(_client_process, [
+                (args.host, args.port, args.path, per_client, args.duration)
+            ] * args.clients)
+            elapsed = time.perf_counter() - start
+    finally:
+        server.terminate()
+        server.wait()
+
+    latencies = sorted(latency for result in results for latency in result[0])
+    errors = sum(result[1] for result in results)
+
+    def percentile(p: float) -> float:
+        return latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1000 if latencies else 0.0
+
+    return workers, len(latencies) / elapsed, percentile(0.50), percentile(0.99), errors
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="worker 数扩展性基准测试")
+    parser.add_argument("--workers", default="1,2,4", help="逗号分隔的 worker 数")
+    parser.add_argument("--path", default="/", help="压测接口路径（GET）")
+    parser.add_argument("--connections", type=int, default=64, help="总并发连接数")
+    parser.add_argument("--clients", type=int, default=2, help="客户端进程数")
+    parser.add_argument("--duration", type=float, default=10)
+    parser.add_argument("--settle", type=float, default=3, help="服务启动后等待所有 worker 就绪的时间（秒）")
+    parser.add_argument("--loop", default="auto")
+    parser.add_argument("--http", default="auto")
+    parser.add_argument("--reuse-port", action=argparse.BooleanOptionalAction, default=True)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=19200)
+    args = parser.parse_args()
+
+    rows = []
+    baseline = None
+    for workers in [int(w) for w in args.workers.split(",")]:
+        workers, rps, p50, p99, errors = run_case(args, workers)
+        baseline = baseline or rps
+        rows.append((workers, f"{rps:.0f}", f"{rps / baseline:.2f}x", f"{p50:.2f}", f"{p99:.2f}", errors))
+
+    print_table(f"GET {args.path}，{args.connections} 个连接，{args.clients} 个客户端进程，CPU {os.cpu_count()} 核，"
+                f"loop={args.loop} http={args.http} reuse_port={args.reuse_port}",
+                ["workers", "req/s", "扩展", "p50 ms", "p99 ms", "错误数"], rows)
+
+
+if __name__ == "__main__":
+    main()
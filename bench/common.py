@@ -0,0 +1,112 @@
+'''
+基准测试公共工具
+'''
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from collections import deque
+from typing import Callable, Dict, List
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 基准测试的媒体任务日志、追踪和流量录制写到临时目录：压测启动的假任务不能写入 data/，
+# 否则正式启动的服务会恢复这些任务并向真实的 Volc 发送停止请求
+BENCH_DATA_DIR = tempfile.mkdtemp(prefix="jusi_bench_")
+
+# 基准测试不访问真实服务，未配置的必填项使用占位值
+BENCH_ENV = {
+    "VIDEO_RTMP_HOST": "127.0.0.1",
+    "VIDEO_RTMP_PORT": "1935",
+    "AUDIO_RTMP_HOST": "127.0.0.1",
+    "AUDIO_RTMP_PORT": "1936",
+    "AUDIO_RTSP_PORT": "554",
+    "VOLC_RTC_APP_ID": "0123456789abcdef01234567",
+    "VOLC_RTC_APP_KEY": "bench_app_key",
+    "VOLC_CAI_APP_ID": "bench_cai_app_id",
+    "VOLC_CAI_APP_KEY": "bench_cai_app_key",
+    "DOUBAO_S2S_APP_ID": "bench_s2s_app_id",
+    "DOUBAO_S2S_ACCESS_TOKEN": "bench_s2s_token",
+    "VOLC_AK": "bench_ak",
+    "VOLC_SK": "bench_sk",
+    "VOLC_REGION": "cn-north-1",
+    "DEBUG": "false",
+    "TASK_LEDGER_PATH": os.path.join(BENCH_DATA_DIR, "task_ledger.bin"),
+    "TRACE_FILE_PATH": os.path.join(BENCH_DATA_DIR, "traces.jsonl"),
+    "CAPTURE_DIR": os.path.join(BENCH_DATA_DIR, "capture"),
+}
+
+
+def setup_env(**overrides: str) -> None:
+    """设置占位配置并把项目根目录加入 sys.path，需在导入项目模块之前调用"""
+    for key, value in BENCH_ENV.items():
+        os.environ.setdefault(key, value)
+    os.environ.update(overrides)
+    if ROOT_DIR not in sys.path:
+        sys.path.insert(0, ROOT_DIR)
+
+
+def measure(func: Callable[[], object], number: int = 0, min_time: float = 0.2, repeat: int = 5) -> float:
+    """返回单次调用耗时（微秒），取多轮中的最小值以降低噪声"""
+    if number <= 0:
+        number = 1
+        while True:
+            start = time.perf_counter()
+            for _ in range(number):
+                func()
+            if time.perf_counter() - start >= min_time:
+                break
+            number *= 2
+
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        best = min(best, (time.perf_counter() - start) / number)
+    return best * 1e6
+
+
+def percentile(samples: List[float], p: float) -> float:
+    if not samples:
+        return 0.0
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * p))]
+
+
+class LoopLagSampler:
+    """周期性 sleep 固定间隔，实际唤醒时间与预期的差值即为事件循环调度延迟"""
+
+    def __init__(self, interval: float = 0.01, max_samples: int = 100000):
+        self.interval = interval
+        self.samples = deque(maxlen=max_samples)
+
+    async def run(self) -> None:
+        while True:
+            start = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            self.samples.append(max(0.0, time.perf_counter() - start - self.interval) * 1000)
+
+    async def report(self, reset: int = 0) -> dict:
+        samples = sorted(self.samples)
+        if reset:
+            self.samples.clear()
+        if not samples:
+            return {"samples": 0}
+        return {
+            "samples": len(samples),
+            "p50_ms": percentile(samples, 0.50),
+            "p95_ms": percentile(samples, 0.95),
+            "p99_ms": percentile(samples, 0.99),
+            "max_ms": samples[-1],
+        }
+
+
+def print_table(title: str, headers: list, rows: list) -> None:
+    widths = [max(len(str(h)), *(len(str(r[i])) for r in rows)) for i, h in enumerate(headers)]
+    print(f"\n{title}")
+    print("  ".join(str(h).ljust(w) for h, w in zip(headers, widths)))
+    print("  ".join("-" * w for w in widths))
+    for row in rows:
+        print("  ".join(str(c).ljust(w) for c, w in zip(row, widths)))
@@ -0,0 +1,215 @@
+'''
+上游服务替身
+在本地模拟 Volc RTC OpenAPI 和 jusi_meet_rts 的 /meeting/* 接口，
+可配置响应延迟分布、错误率和限流（QPS），供压测使用
+
+用法:
+  python bench/fake_upstreams.py --volc-port 18001 --rts-port 18002 \
+      --volc-latency lognormal:80,400 --volc-error-rate 0.01 --volc-qps 200
+
+延迟分布格式（单位ms）:
+  fixed:50           固定延迟
+  uniform:20-80      均匀分布
+  lognormal:80,400   对数正态分布，参数为中位数和p99
+'''
+import argparse
+import asyncio
+import json
+import math
+import random
+import time
+import uuid
+from collections import Counter
+from typing import Callable, Optional
+import uvicorn
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse
+from starlette.routing import Route
+
+
+def parse_latency(spec: str) -> Callable[[], float]:
+    """解析延迟分布，返回采样函数（秒）"""
+    kind, _, args = spec.partition(":")
+    if kind == "fixed":
+        value = float(args or 0) / 1000
+        return lambda: value
+    if kind == "uniform":
+        low, _, high = args.partition("-")
+        low, high = float(low) / 1000, float(high or low) / 1000
+        return lambda: random.uniform(low, high)
+    if kind == "lognormal":
+        median, _, p99 = args.partition(",")
+        mu = math.log(float(median) / 1000)
+        sigma = (math.log(float(p99 or median) / 1000) - mu) / 2.326
+        return lambda: random.lognormvariate(mu, sigma)
+    raise ValueError(f"未知的延迟分布: {spec}")
+
+
+class TokenBucket:
+    """令牌桶限流，qps 为0表示不限流"""
+
+    def __init__(self, qps: float):
+        self.qps = qps
+        self.tokens = qps
+        self.updated = time.monotonic()
+
+    def acquire(self) -> bool:
+        if self.qps <= 0:
+            return True
+        now = time.monotonic()
+        self.tokens = min(self.qps, self.tokens + (now - self.updated) * self.qps)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+
+class FakeUpstream:
+    """按配置注入延迟、错误和限流"""
+
+    def __init__(self, latency: str, error_rate: float, qps: float):
+        self.latency = parse_latency(latency)
+        self.error_rate = error_rate
+        self.bucket = TokenBucket(qps)
+        self.stats = Counter()
+
+    async def admit(self, name: str) -> Optional[str]:
+        """返回 None 表示正常处理，否则返回注入的故障类型"""
+        self.stats[f"{name}.requests"] += 1
+        if not self.bucket.acquire():
+            self.stats[f"{name}.throttled"] += 1
+            return "throttled"
+        await asyncio.sleep(self.latency())
+        if random.random() < self.error_rate:
+            self.stats[f"{name}.errors"] += 1
+            return "error"
+        return None
+
+
+def build_volc_app(upstream: FakeUpstream) -> Starlette:
+    """Volc OpenAPI 替身：所有 Action 都在 / 上，按 Action 返回成功结果"""
+
+    def metadata(action: str, version: str, error: Optional[dict] = None) -> dict:
+        meta = {"RequestId": uuid.uuid4().hex, "Action": action, "Version": version, "Service": "rtc", "Region": "cn-north-1"}
+        if error:
+            meta["Error"] = error
+        return meta
+
+    # 云端录制任务: TaskId -> [启动时间, 停止时间]，录制启动1秒后开始，停止2秒后生成录制文件
+    records = {}
+
+    def record_task(task_id: str) -> dict:
+        record = records.get(task_id)
+        if record is None:
+            return {"Status": 4}
+        now = time.monotonic()
+        started, stopped = record
+        if stopped is not None and now - stopped >= 2:
+            files = [{"Vid": f"v_{task_id}", "Duration": int((stopped - started) * 1000), "Size": 1024}]
+            return {"Status": 3, "StopReason": "StopByAPI", "RecordFileList": files}
+        return {"Status": 1 if now - started < 1 else 2}
+
+    async def handle(request: Request):
+        action = request.query_params.get("Action", "")
+        version = request.query_params.get("Version", "")
+        body = await request.body()
+
+        fault = await upstream.admit(action)
+        if fault == "throttled":
+            error = {"Code": "RequestLimitExceeded", "Message": "fake throttled"}
+            return JSONResponse({"ResponseMetadata": metadata(action, version, error)}, status_code=429)
+        if fault == "error":
+            error = {"Code": "InternalError", "Message": "fake internal error"}
+            return JSONResponse({"ResponseMetadata": metadata(action, version, error)}, status_code=500)
+
+        result = "ok"
+        if action == "GetRecordTask":
+            result = {"RecordTask": record_task(request.query_params.get("TaskId", ""))}
+        elif action == "StartRecord":
+            records[json.loads(body)["TaskId"]] = [time.monotonic(), None]
+        elif action == "StopRecord":
+            record = records.get(json.loads(body)["TaskId"])
+            if record is not None and record[1] is None:
+                record[1] = time.monotonic()
+        return JSONResponse({"ResponseMetadata": metadata(action, version), "Result": result})
+
+    async def stats(request: Request):
+        return JSONResponse(dict(upstream.stats))
+
+    return Starlette(routes=[
+        Route("/", handle, methods=["GET", "POST", "HEAD"]),
+        Route("/__stats__", stats, methods=["GET"]),
+    ])
+
+
+def build_rts_app(upstream: FakeUpstream, api_prefix: str) -> Starlette:
+    """jusi_meet_rts 替身：实现 /meeting/* 接口"""
+
+    async def handle(request: Request):
+        endpoint = request.path_params["endpoint"]
+        data = await request.json() if request.method == "POST" else dict(request.query_params)
+
+        fault = await upstream.admit(endpoint)
+        if fault == "throttled":
+            return JSONResponse({"code": 429, "message": "fake throttled"}, status_code=429)
+        if fault == "error":
+            return JSONResponse({"code": 500, "message": "fake internal error"}, status_code=500)
+
+        room_id = data.get("room_id", "")
+        if endpoint == "book":
+            return JSONResponse({"code": 200, "room_id": room_id, "room_name": data.get("room_name") or room_id})
+        if endpoint == "cancel":
+            return JSONResponse({"code": 200, "room_id": room_id})
+        if endpoint == "get-my":
+            meetings = [
+                {"room_id": f"{i}", "room_name": f"会议{i}", "host_user_id": data.get("user_id", ""),
+                 "host_user_name": "主持人", "start_time": 1700000000000, "user_count": i}
+                for i in range(5)
+            ]
+            return JSONResponse({"code": 200, "meetings": meetings, "total": len(meetings)})
+        if endpoint == "check-room":
+            return JSONResponse({"code": 200, "room_id": room_id, "exists": True})
+        if endpoint == "check-user-in-room":
+            return JSONResponse({"code": 200, "room_id": room_id, "user_id": data.get("user_id", ""), "in_room": False})
+        return JSONResponse({"code": 404, "message": f"unknown endpoint {endpoint}"}, status_code=404)
+
+    async def stats(request: Request):
+        return JSONResponse(dict(upstream.stats))
+
+    return Starlette(routes=[
+        Route(f"{api_prefix}/meeting/{{endpoint}}", handle, methods=["GET", "POST"]),
+        Route("/__stats__", stats, methods=["GET"]),
+    ])
+
+
+async def serve(args) -> None:
+    volc = FakeUpstream(args.volc_latency, args.volc_error_rate, args.volc_qps)
+    rts = FakeUpstream(args.rts_latency, args.rts_error_rate, args.rts_qps)
+    servers = [
+        uvicorn.Server(uvicorn.Config(build_volc_app(volc), host=args.host, port=args.volc_port,
+                                      log_level="warning", backlog=4096)),
+        uvicorn.Server(uvicorn.Config(build_rts_app(rts, args.api_prefix), host=args.host, port=args.rts_port,
+                                      log_level="warning", backlog=4096)),
+    ]
+    await asyncio.gather(*[server.serve() for server in servers])
+
+
+def add_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--volc-port", type=int, default=18001)
+    parser.add_argument("--rts-port", type=int, default=18002)
+    parser.add_argument("--api-prefix", default="/api/v1")
+    parser.add_argument("--volc-latency", default="lognormal:80,400", help="Volc OpenAPI 延迟分布")
+    parser.add_argument("--volc-error-rate", type=float, default=0.0, help="Volc OpenAPI 错误率 0~1")
+    parser.add_argument("--volc-qps", type=float, default=0, help="Volc OpenAPI 限流QPS，0为不限流")
+    parser.add_argument("--rts-latency", default="lognormal:10,60", help="RTS 服务延迟分布")
+    parser.add_argument("--rts-error-rate", type=float, default=0.0, help="RTS 服务错误率 0~1")
+    parser.add_argument("--rts-qps", type=float, default=0, help="RTS 服务限流QPS，0为不限流")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Volc OpenAPI / jusi_meet_rts 本地替身")
+    add_arguments(parser)
+    asyncio.run(serve(parser.parse_args()))
@@ -0,0 +1,272 @@
+'''
+端到端压测
+启动 Volc OpenAPI / jusi_meet_rts 本地替身和应用进程，按目标RPS（开环）驱动摄像头加入/离开和会议接口，
+报告吞吐、各接口 p50/p95/p99 延迟、错误数以及应用进程的事件循环延迟
+
+用法:
+  python bench/loadtest.py --rps 50 --duration 30
+  python bench/loadtest.py --rps 200 --mix join=1,leave=1,check-room=4,get-my=2 --volc-latency lognormal:120,800
+  回归门禁（超出阈值时退出码为1）:
+  python bench/loadtest.py --rps 100 --max-p99-ms 1500 --max-error-rate 0.01
+'''
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+from collections import defaultdict, deque
+from typing import Dict, List, Optional, Tuple
+import httpx
+from common import BENCH_ENV, percentile, print_table
+from fake_upstreams import add_arguments as add_upstream_arguments
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# 接口名 -> 路径后缀（实际路径从应用的 openapi.json 中查找）
+ROUTES = {
+    "join": "camera/join",
+    "leave": "camera/leave",
+    "teardown": "room/teardown",
+    "book": "meeting/book",
+    "cancel": "meeting/cancel",
+    "get-my": "meeting/get-my",
+    "check-room": "meeting/check-room",
+    "check-user": "meeting/check-user-in-room",
+}
+
+DEFAULT_MIX = "join=3,leave=3,check-room=2,get-my=1,check-user=1"
+
+
+def parse_mix(spec: str) -> List[Tuple[str, float]]:
+    mix = []
+    for item in spec.split(","):
+        name, _, weight = item.partition("=")
+        name = name.strip()
+        if name not in ROUTES:
+            raise ValueError(f"未知接口: {name}，可选: {', '.join(ROUTES)}")
+        mix.append((name, float(weight or 1)))
+    return mix
+
+
+class LoadGenerator:
+    """开环负载：按计划时间发出请求，不等待前一个请求完成"""
+
+    def __init__(self, client: httpx.AsyncClient, paths: Dict[str, str], args):
+        self.client = client
+        self.paths = paths
+        self.args = args
+        self.mix = parse_mix(args.mix)
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Dict[str, int] = defaultdict(int)
+        self.dropped = 0
+        self.inflight = 0
+        self.joined = deque()  # 已加入房间、可用于离开的设备
+        self.seq = itertools.count()
+
+    def next_request(self) -> Tuple[str, dict]:
+        names, weights = zip(*self.mix)
+        name = random.choices(names, weights)[0]
+        n = next(self.seq)
+        room_id = f"bench-room-{n % self.args.rooms}"
+
+        if name == "leave":
+            if not self.joined:
+                name = "join"
+            else:
+                device_sn, room_id, user_id = self.joined.popleft()
+                return name, {"user_id": user_id, "room_id": room_id, "device_sn": device_sn}
+        if name == "join":
+            return name, {"user_id": f"bench-user-{n}", "room_id": room_id, "device_sn": f"bench-sn-{n}",
+                          "async_mode": self.args.async_join}
+        if name == "teardown":
+            return name, {"room_id": room_id}
+        if name == "book":
+            return name, {"room_id": f"bench-book-{n}", "room_name": "压测会议",
+                          "host_user_id": "bench-host", "host_user_name": "压测"}
+        if name == "cancel":
+            return name, {"room_id": f"bench-book-{n}", "user_id": "bench-host"}
+        if name == "get-my":
+            return name, {"user_id": "bench-host"}
+        if name == "check-room":
+            return name, {"room_id": room_id}
+        return name, {"room_id": room_id, "user_id": f"bench-user-{n}"}
+
+    async def send(self, name: str, body: dict) -> None:
+        self.inflight += 1
+        start = time.perf_counter()
+        ok = False
+        try:
+            response = await self.client.post(self.paths[name], json=body)
+            ok = response.status_code in (200, 202) and response.json().get("code") in (200, 202)
+            if ok and name == "join":
+                self.joined.append((body["device_sn"], body["room_id"], body["user_id"]))
+        except Exception:
+            ok = False
+        finally:
+            self.inflight -= 1
+        self.latencies[name].append((time.perf_counter() - start) * 1000)
+        if not ok:
+            self.errors[name] += 1
+
+    async def run(self, duration: float) -> float:
+        """运行 duration 秒，返回实际耗时（含等待在途请求完成）"""
+        tasks = set()
+        start = time.perf_counter()
+        next_at = start
+        while next_at - start < duration:
+            delay = next_at - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            if self.inflight >= self.args.max_inflight:
+                self.dropped += 1
+            else:
+                task = asyncio.create_task(self.send(*self.next_request()))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+            gap = 1.0 / self.args.rps
+            next_at += random.expovariate(1.0 / gap) if self.args.arrival == "poisson" else gap
+        if tasks:
+            await asyncio.wait(tasks)
+        return time.perf_counter() - start
+
+
+def start_process(script: str, args: List[str], env: Optional[dict] = None) -> subprocess.Popen:
+    return subprocess.Popen([sys.executable, os.path.join(BENCH_DIR, script), *args], env=env)
+
+
+async def wait_ready(url: str, timeout: float = 30.0) -> None:
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient(trust_env=False) as client:
+        while time.monotonic() < deadline:
+            try:
+                await client.get(url, timeout=1.0)
+                return
+            except httpx.TransportError:
+                await asyncio.sleep(0.2)
+    raise RuntimeError(f"等待服务启动超时: {url}")
+
+
+async def resolve_paths(base_url: str) -> Dict[str, str]:
+    """从 openapi.json 查找各接口的实际路径"""
+    async with httpx.AsyncClient(trust_env=False) as client:
+        openapi = (await client.get(f"{base_url}/openapi.json")).json()
+    paths = {}
+    for name, suffix in ROUTES.items():
+        matches = [path for path in openapi["paths"] if path.endswith(suffix)]
+        if matches:
+            paths[name] = matches[0]
+    return paths
+
+
+async def run_load(args) -> int:
+    host = "127.0.0.1"
+    base_url = f"http://{host}:{args.app_port}"
+    upstream_args = [
+        "--host", host, "--volc-port", str(args.volc_port), "--rts-port", str(args.rts_port),
+        "--volc-latency", args.volc_latency, "--volc-error-rate", str(args.volc_error_rate),
+        "--volc-qps", str(args.volc_qps), "--rts-latency", args.rts_latency,
+        "--rts-error-rate", str(args.rts_error_rate), "--rts-qps", str(args.rts_qps),
+    ]
+
+    env = dict(os.environ)
+    for key, value in BENCH_ENV.items():
+        env.setdefault(key, value)
+    env.update({
+        "VOLC_ENDPOINTS": json.dumps([f"{host}:{args.volc_port}@cn-north-1"]),
+        "RTS_SERVICE_URL": f"http://{host}:{args.rts_port}",
+        "DEBUG": "false",
+    })
+
+    processes = [
+        start_process("fake_upstreams.py", upstream_args),
+        start_process("serve_app.py", ["--host", host, "--port", str(args.app_port)], env=env),
+    ]
+    try:
+        await wait_ready(f"http://{host}:{args.volc_port}/__stats__")
+        await wait_ready(f"http://{host}:{args.rts_port}/__stats__")
+        await wait_ready(f"{base_url}/")
+        paths = await resolve_paths(base_url)
+
+        limits = httpx.Limits(max_connections=args.max_inflight, max_keepalive_connections=args.max_inflight)
+        async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=args.timeout, trust_env=False) as client:
+            if args.warmup > 0:
+                await LoadGenerator(client, paths, args).run(args.warmup)
+            await client.get("/__bench__/loop-lag", params={"reset": 1})
+
+            generator = LoadGenerator(client, paths, args)
+            elapsed = await generator.run(args.duration)
+
+            loop_lag = (await client.get("/__bench__/loop-lag")).json()
+            volc_stats = (await client.get(f"http://{host}:{args.volc_port}/__stats__")).json()
+            rts_stats = (await client.get(f"http://{host}:{args.rts_port}/__stats__")).json()
+    finally:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.wait()
+
+    return report(args, generator, elapsed, loop_lag, volc_stats, rts_stats)
+
+
+def report(args, generator: LoadGenerator, elapsed: float, loop_lag: dict, volc_stats: dict, rts_stats: dict) -> int:
+    rows = []
+    all_latencies, total, errors = [], 0, 0
+    for name in sorted(generator.latencies):
+        samples = generator.latencies[name]
+        all_latencies.extend(samples)
+        total += len(samples)
+        errors += generator.errors[name]
+        rows.append((name, len(samples), generator.errors[name], f"{percentile(samples, 0.50):.1f}",
+                     f"{percentile(samples, 0.95):.1f}", f"{percentile(samples, 0.99):.1f}", f"{max(samples):.1f}"))
+    rows.append(("ALL", total, errors, f"{percentile(all_latencies, 0.50):.1f}", f"{percentile(all_latencies, 0.95):.1f}",
+                 f"{percentile(all_latencies, 0.99):.1f}", f"{max(all_latencies, default=0):.1f}"))
+
+    print_table(f"目标 {args.rps} RPS，持续 {args.duration}s，实际吞吐 {total / elapsed:.1f} req/s，"
+                f"因在途请求超过 {args.max_inflight} 丢弃 {generator.dropped} 个",
+                ["接口", "请求数", "错误数", "p50 ms", "p95 ms", "p99 ms", "max ms"], rows)
+    print(f"\n应用事件循环延迟: {json.dumps(loop_lag)}")
+    print(f"Volc 替身统计: {json.dumps(volc_stats, ensure_ascii=False)}")
+    print(f"RTS 替身统计: {json.dumps(rts_stats, ensure_ascii=False)}")
+
+    failed = False
+    p99 = percentile(all_latencies, 0.99)
+    error_rate = errors / total if total else 0.0
+    if args.max_p99_ms and p99 > args.max_p99_ms:
+        print(f"\n[FAIL] p99 {p99:.1f}ms 超过阈值 {args.max_p99_ms}ms")
+        failed = True
+    if args.max_error_rate is not None and error_rate > args.max_error_rate:
+        print(f"\n[FAIL] 错误率 {error_rate:.2%} 超过阈值 {args.max_error_rate:.2%}")
+        failed = True
+    if args.max_loop_lag_ms and loop_lag.get("p99_ms", 0) > args.max_loop_lag_ms:
+        print(f"\n[FAIL] 事件循环延迟 p99 {loop_lag['p99_ms']:.1f}ms 超过阈值 {args.max_loop_lag_ms}ms")
+        failed = True
+    return 1 if failed else 0
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="端到端压测")
+    parser.add_argument("--rps", type=float, default=50, help="目标每秒请求数")
+    parser.add_argument("--duration", type=float, default=30, help="压测时长（秒）")
+    parser.add_argument("--warmup", type=float, default=3, help="预热时长（秒），不计入结果")
+    parser.add_argument("--arrival", choices=["constant", "poisson"], default="poisson", help="请求到达分布")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help=f"接口权重，可选接口: {', '.join(ROUTES)}")
+    parser.add_argument("--rooms", type=int, default=20, help="房间数")
+    parser.add_argument("--async-join", action="store_true", help="camera/join 使用异步模式")
+    parser.add_argument("--max-inflight", type=int, default=1000, help="最大在途请求数，超出的请求被丢弃并计数")
+    parser.add_argument("--timeout", type=float, default=60.0, help="单个请求超时（秒）")
+    parser.add_argument("--app-port", type=int, default=19006)
+    parser.add_argument("--max-p99-ms", type=float, default=0, help="p99 延迟阈值，0为不检查")
+    parser.add_argument("--max-error-rate", type=float, default=None, help="错误率阈值 0~1")
+    parser.add_argument("--max-loop-lag-ms", type=float, default=0, help="事件循环延迟 p99 阈值，0为不检查")
+    add_upstream_arguments(parser)
+    args = parser.parse_args()
+
+    sys.exit(asyncio.run(run_load(args)))
+
+
+if __name__ == "__main__":
+    main()
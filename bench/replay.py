@@ -0,0 +1,153 @@
+'''
+流量回放
+把 traffic_capture 录制的请求按录制时的到达间隔发送到目标服务（如预发布环境），可按倍速压缩间隔；
+开环发送（不等待上一个请求返回），报告各接口的吞吐、延迟分位数、错误数、状态码与录制时不一致的请求数，
+以及实际发送时间相对计划的偏差（偏差小才说明保持了原始的到达间隔）
+
+用法:
+  python bench/replay.py data/capture --target http://staging:8000
+  python bench/replay.py data/capture/*.bin --target http://staging:8000 --speed 5 --routes /api/v1/camera/
+  只回放录制开始后第 600~900 秒的流量:
+  python bench/replay.py data/capture --target http://staging:8000 --skip 600 --duration 300
+'''
+import argparse
+import asyncio
+import time
+from collections import defaultdict
+from typing import Dict, List
+import httpx
+from common import percentile, print_table, setup_env
+
+setup_env()
+from traffic_capture import CapturedRequest, read_captures
+
+
+class Replayer:
+    """按计划时间（录制时的到达时间 / speed）发出请求"""
+
+    def __init__(self, client: httpx.AsyncClient, args):
+        self.client = client
+        self.args = args
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Dict[str, int] = defaultdict(int)
+        self.mismatched: Dict[str, int] = defaultdict(int)  # 状态码与录制时不一致
+        self.send_lag_ms: List[float] = []  # 实际发送时间 - 计划发送时间
+        self.skipped = 0  # 未录制请求体的请求
+        self.dropped = 0
+        self.inflight = 0
+        self.captured_span = 0.0  # 回放的请求在录制时跨越的时长（秒）
+
+    def _matches(self, entry: CapturedRequest) -> bool:
+        return not self.args.routes or any(entry.path.startswith(prefix) for prefix in self.args.routes)
+
+    async def send(self, entry: CapturedRequest) -> None:
+        self.inflight += 1
+        start = time.perf_counter()
+        status = None
+        try:
+            headers = {"X-Replay": "1"}
+            if entry.content_type:
+                headers["Content-Type"] = entry.content_type
+            url = f"{entry.path}?{entry.query}" if entry.query else entry.path
+            response = await self.client.request(entry.method, url, content=entry.body or None, headers=headers)
+            status = response.status_code
+        except Exception:
+            status = None
+        finally:
+            self.inflight -= 1
+        self.latencies[entry.path].append((time.perf_counter() - start) * 1000)
+        if status is None or status >= 500:
+            self.errors[entry.path] += 1
+        if status != entry.status:
+            self.mismatched[entry.path] += 1
+
+    async def run(self, paths: List[str]) -> float:
+        """回放全部录制，返回实际耗时（含等待在途请求完成）"""
+        tasks = set()
+        first_ts = None
+        start = time.perf_counter()
+        for entry in read_captures(paths):
+            if first_ts is None:
+                first_ts = entry.ts_us
+            offset = (entry.ts_us - first_ts) / 1e6
+            if offset < self.args.skip:
+                continue
+            if self.args.duration and offset >= self.args.skip + self.args.duration:
+                break
+            if not self._matches(entry):
+                continue
+            if entry.body_omitted:
+                self.skipped += 1
+                continue
+
+            self.captured_span = offset - self.args.skip
+            due = start + self.captured_span / self.args.speed
+            delay = due - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            self.send_lag_ms.append((time.perf_counter() - due) * 1000)
+            if self.inflight >= self.args.max_inflight:
+                self.dropped += 1
+                continue
+            task = asyncio.create_task(self.send(entry))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+        if tasks:
+            await asyncio.wait(tasks)
+        return time.perf_counter() - start
+
+
+def report(args, replayer: Replayer, elapsed: float) -> None:
+    routes = sorted(replayer.latencies, key=lambda path: len(replayer.latencies[path]), reverse=True)
+    rows = []
+    all_latencies, total, errors, mismatched = [], 0, 0, 0
+    for index, path in enumerate(routes):
+        samples = replayer.latencies[path]
+        all_latencies.extend(samples)
+        total += len(samples)
+        errors += replayer.errors[path]
+        mismatched += replayer.mismatched[path]
+        if index < args.top:
+            rows.append((path, len(samples), replayer.errors[path], replayer.mismatched[path],
+                         f"{percentile(samples, 0.50):.1f}", f"{percentile(samples, 0.95):.1f}",
+                         f"{percentile(samples, 0.99):.1f}", f"{max(samples):.1f}"))
+    rows.append(("ALL", total, errors, mismatched, f"{percentile(all_latencies, 0.50):.1f}",
+                 f"{percentile(all_latencies, 0.95):.1f}", f"{percentile(all_latencies, 0.99):.1f}",
+                 f"{max(all_latencies, default=0):.1f}"))
+
+    print_table(f"{args.speed}x 回放录制中 {replayer.captured_span:.1f}s 的流量，耗时 {elapsed:.1f}s，"
+                f"实际吞吐 {total / elapsed if elapsed else 0:.1f} req/s",
+                ["接口", "请求数", "错误数", "状态码不一致", "p50 ms", "p95 ms", "p99 ms", "max ms"], rows)
+    lags = replayer.send_lag_ms
+    print(f"\n发送时间偏差: p50 {percentile(lags, 0.50):.2f}ms  p99 {percentile(lags, 0.99):.2f}ms  "
+          f"max {max(lags, default=0):.2f}ms")
+    print(f"未录制请求体跳过 {replayer.skipped} 个，因在途请求超过 {args.max_inflight} 丢弃 {replayer.dropped} 个")
+
+
+async def run_replay(args) -> None:
+    limits = httpx.Limits(max_connections=args.max_inflight, max_keepalive_connections=args.max_inflight)
+    async with httpx.AsyncClient(base_url=args.target, limits=limits, timeout=args.timeout, trust_env=False) as client:
+        replayer = Replayer(client, args)
+        elapsed = await replayer.run(args.captures)
+    report(args, replayer, elapsed)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="流量回放")
+    parser.add_argument("captures", nargs="+", help="录制分段文件或分段目录（多个 worker 的分段按到达时间合并）")
+    parser.add_argument("--target", required=True, help="目标服务地址，如 http://staging:8000")
+    parser.add_argument("--speed", type=float, default=1.0, help="回放倍速，2 表示到达间隔缩短为一半")
+    parser.add_argument("--skip", type=float, default=0, help="跳过录制开始后的前N秒")
+    parser.add_argument("--duration", type=float, default=0, help="只回放录制中的N秒，0为全部")
+    parser.add_argument("--routes", nargs="*", default=[], help="只回放路径以这些前缀开头的请求")
+    parser.add_argument("--max-inflight", type=int, default=1000, help="最大在途请求数，超出的请求被丢弃并计数")
+    parser.add_argument("--timeout", type=float, default=60.0, help="单个请求超时（秒）")
+    parser.add_argument("--top", type=int, default=20, help="按请求数列出前N个接口")
+    args = parser.parse_args()
+    if args.speed <= 0:
+        parser.error("--speed 必须大于0")
+    asyncio.run(run_replay(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,40 @@
+'''
+压测用应用启动器
+在 uvicorn 中运行 main.app，并在同一事件循环中采样调度延迟（event-loop lag），
+通过 GET /__bench__/loop-lag 查询统计结果（?reset=1 清空样本）
+
+配置通过环境变量传入（与 .env 相同的字段），由 loadtest.py 负责设置
+'''
+import argparse
+import asyncio
+from common import LoopLagSampler, setup_env
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="压测用应用启动器")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=19006)
+    parser.add_argument("--lag-interval", type=float, default=0.01, help="事件循环延迟采样间隔（秒）")
+    args = parser.parse_args()
+
+    setup_env()
+    import uvicorn
+    from main import app
+
+    sampler = LoopLagSampler(args.lag_interval)
+    app.add_api_route("/__bench__/loop-lag", sampler.report, methods=["GET"], include_in_schema=False)
+
+    server = uvicorn.Server(uvicorn.Config(app, host=args.host, port=args.port, log_level="warning", backlog=4096))
+
+    async def run() -> None:
+        sampler_task = asyncio.create_task(sampler.run())
+        try:
+            await server.serve()
+        finally:
+            sampler_task.cancel()
+
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+'''
+应用启动
+延迟初始化的全局实例，以及启动各阶段（模块导入、实例初始化、后台任务启动）的耗时统计
+'''
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Generic, List, Optional, Tuple, TypeVar
+
+
+T = TypeVar("T")
+
+
+class StartupTimer:
+    """记录启动各阶段耗时，起点为本模块首次导入的时间
+
+    本模块只依赖标准库，应在 main 中最先导入，使后续模块的导入耗时都能被统计
+    """
+
+    def __init__(self):
+        self.started_at = time.perf_counter()
+        self.ready_at: Optional[float] = None
+        self.phases: List[Tuple[str, float, float]] = []  # (阶段, 相对起点的开始时间ms, 耗时ms)
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def phase(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, start)
+
+    def record(self, name: str, start: float) -> None:
+        with self._lock:
+            self.phases.append((name, (start - self.started_at) * 1000, (time.perf_counter() - start) * 1000))
+
+    def mark_ready(self) -> None:
+        self.ready_at = time.perf_counter()
+
+    @property
+    def ready(self) -> bool:
+        return self.ready_at is not None
+
+    def total_ms(self) -> float:
+        """从起点到启动完成（未完成时到当前）的耗时"""
+        return ((self.ready_at or time.perf_counter()) - self.started_at) * 1000
+
+    def summary(self) -> str:
+        with self._lock:
+            phases = list(self.phases)
+        lines = [f"启动耗时 {self.total_ms():.1f}ms"]
+        lines += [f"  {name:<32} +{offset:>8.1f}ms {elapsed:>8.1f}ms" for name, offset, elapsed in phases]
+        return "\n".join(lines)
+
+
+# 启动耗时统计全局实例
+startup_timer: StartupTimer = StartupTimer()
+
+
+class LazyInstance(Generic[T]):
+    """首次使用时才构造的全局实例
+
+    属性访问和赋值都转发给实际实例，调用方按原实例使用即可；
+    应用在 lifespan 中调用 get() 提前构造，避免首个请求承担初始化耗时
+    """
+
+    def __init__(self, factory: Callable[[], T], name: str):
+        object.__setattr__(self, "_factory", factory)
+        object.__setattr__(self, "_name", name)
+        object.__setattr__(self, "_instance", None)
+        object.__setattr__(self, "_lock", threading.Lock())
+
+    def get(self) -> T:
+        instance = self._instance
+        if instance is None:
+            with self._lock:
+                instance = self._instance
+                if instance is None:
+                    with startup_timer.phase(f"init.{self._name}"):
+                        instance = self._factory()
+                    object.__setattr__(self, "_instance", instance)
+        return instance
+
+    @property
+    def initialized(self) -> bool:
+        return self._instance is not None
+
+    def reset(self) -> None:
+        """丢弃已构造的实例，下次使用时重新构造"""
+        with self._lock:
+            object.__setattr__(self, "_instance", None)
+
+    def __getattr__(self, name: str):
+        return getattr(self.get(), name)
+
+    def __setattr__(self, name: str, value) -> None:
+        setattr(self.get(), name, value)
+
+    def __repr__(self) -> str:
+        state = repr(self._instance) if self._instance is not None else "未初始化"
+        return f"<LazyInstance {self._name}: {state}>"
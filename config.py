@@ -1,3 +1,4 @@
+from typing import Any, Dict, List
 from pydantic_settings import BaseSettings
 
 class Settings(BaseSettings):
@@ -10,6 +11,15 @@ class Settings(BaseSettings):
     audio_rtmp_host: str
     audio_rtmp_port: int
     audio_rtsp_port: int
+
+    # 媒体边缘节点池，为空时使用上面的单节点配置
+    # 上行节点格式 "host:rtmp_port"，下行节点格式 "host:rtmp_port:rtsp_port"，环境变量中使用JSON数组
+    media_ingest_nodes: List[str] = []
+    media_egress_nodes: List[str] = []
+    media_node_capacity: int = 200  # 单节点建议承载的设备数，用于计算负载权重
+    media_probe_interval: float = 10.0  # 健康探测间隔（秒）
+    media_probe_timeout: float = 2.0  # 单次探测超时（秒）
+    media_probe_failures: int = 2  # 连续失败多少次判定节点不可用
     # VolcEngine RTC 配置
     volc_rtc_app_id: str
     volc_rtc_app_key: str
@@ -27,6 +37,19 @@ class Settings(BaseSettings):
     volc_ak: str
     volc_sk: str
     volc_region: str
+
+    # Volc OpenAPI 接入点，格式 "host@region"，为空时使用 rtc.volcengineapi.com 和 volc_region
+    volc_endpoints: List[str] = []
+    volc_endpoint_probe_interval: float = 30.0  # 延迟探测间隔（秒）
+    volc_endpoint_probe_timeout: float = 3.0  # 单次探测超时（秒）
+
+    # Volc OpenAPI 连接池
+    volc_pool_size: int = 10  # 每个接入点保持的长连接数上限
+    volc_connect_timeout: float = 5.0  # 默认连接超时（秒）
+    volc_read_timeout: float = 30.0  # 默认读超时（秒）
+    volc_action_timeouts: Dict[str, List[float]] = {}  # 按接口覆盖超时，如 {"StartRelayStream": [3, 10]}
+    volc_warmup_connections: int = 2  # 启动时每个接入点预建的连接数
+    volc_keepalive_interval: float = 50.0  # 空闲连接保活间隔（秒），应小于服务端空闲断开时间
     
     # 服务器配置
     app_name: str = "JUSI Meet Server"
@@ -35,9 +58,152 @@ class Settings(BaseSettings):
     bind_addr: str = "0.0.0.0"
     bind_port: int = 9006
     debug: bool = True
+    response_class: str = "orjson"  # 响应JSON编码: json/orjson/ujson，orjson/ujson 未安装时退回 json
+
+    # 生产启动配置（debug=False 时由 server.py 按以下配置启动多个 worker 进程）
+    # 设备会话、加入任务、智能体、录制等状态保存在各 worker 进程内存中，请求落到其他 worker 时查不到（任务进度404、心跳503、
+    # 停止房间只停止本 worker 的会话），因此默认单 worker；只有状态改为共享存储，或负载均衡按 device_sn/room_id
+    # 粘性路由到固定 worker 时，才可设置 allow_multi_worker 启用多个 worker
+    workers: int = 1  # worker 进程数，0为CPU核数；allow_multi_worker 为 False 时只启动1个
+    allow_multi_worker: bool = False  # 确认状态已共享或请求已粘性路由后才允许多个 worker
+    worker_index: int = 0  # 当前 worker 的序号（由 server.py 设置），重启的 worker 沿用原序号
+    reuse_port: bool = True  # 每个 worker 使用 SO_REUSEPORT 独立监听，由内核分发连接；不支持时共享监听socket
+    loop: str = "auto"  # 事件循环: auto/asyncio/uvloop，auto 时已安装 uvloop 则使用
+    http: str = "auto"  # HTTP解析器: auto/h11/httptools，auto 时已安装 httptools 则使用
+    backlog: int = 2048  # 监听队列长度
+    keepalive_timeout: int = 5  # HTTP 长连接空闲超时（秒），位于负载均衡之后时应大于其空闲超时
+    limit_concurrency: int = 0  # 单个 worker 的最大并发连接数，超出返回503，0为不限制
+    limit_max_requests: int = 0  # worker 处理多少个请求后优雅退出并由主进程重启，0为不重启
+    limit_max_requests_jitter: int = 0  # 每个 worker 的请求数上限额外增加 0~jitter 的随机数，避免同时重启
+    worker_shutdown_timeout: float = 30.0  # worker 等待连接关闭的超时（秒），超时后取消进行中的请求
+
+    # 准入控制：按接口类别（volc/rts/local）限制并发，超出时排队，队列已满或排队超时返回503
+    admission_limits: Dict[str, List[float]] = {}  # 覆盖默认值，如 {"volc": [32, 64, 2.0]}，即 [并发数, 队列长度, 最长排队秒数]
+    admission_retry_after: int = 1  # 拒绝请求时返回的 Retry-After（秒）
+
+    # 请求截止时间：取请求头 X-Request-Timeout-Ms（毫秒）或按接口类别的默认值，上游调用只使用剩余时间
+    request_timeouts: Dict[str, float] = {}  # 覆盖默认值（秒），如 {"volc": 20, "rts": 10, "local": 5}
+    request_timeout_max: float = 60.0  # 请求头指定的超时上限（秒）
+
+    # 停机排空配置
+    drain_timeout: float = 20.0  # 停机时等待进行中的加入/离开等操作完成的最长时间（秒）
+    drain_stop_tasks: bool = False  # 停机排空后停止本进程登记的剩余媒体任务；False 时保留运行，重启后由媒体任务日志恢复
+    drain_retry_after: int = 5  # 排空期间拒绝加入房间请求时返回的 Retry-After（秒）
+
+    # 运维接口鉴权
+    admin_token: str = ""  # 运维接口和 /rtm/send 的请求头 X-Admin-Token 需与之一致；为空时只允许本机访问
+
+    # 停止媒体任务配置
+    task_stop_concurrency: int = 8  # 同时停止的任务数上限
+    task_stop_retries: int = 3  # 每个任务的最大尝试次数
+    task_stop_retry_delay: float = 0.5  # 首次重试间隔（秒），之后按2倍递增
+
+    # 云端录制配置
+    volc_record_storage: Dict[str, Any] = {}  # StartRecord 的 StorageConfig，如 {"Type": 0, "TosConfig": {"AccountId": "...", "Region": "...", "Bucket": "..."}}
+    record_poll_min_interval: float = 2.0  # 录制刚启动、停止或状态变化后的轮询间隔（秒）
+    record_poll_max_interval: float = 60.0  # 状态稳定后的最长轮询间隔（秒）
+    record_poll_backoff: float = 2.0  # 状态不变时轮询间隔的增长倍数
+    record_poll_qps: float = 10.0  # GetRecordTask 的总QPS上限
+    record_poll_batch_size: int = 20  # 每批轮询的任务数上限
+    record_poll_batch_window: float = 0.5  # 将该时间内即将到期的任务合并到同一批提前轮询（秒）
+    record_poll_concurrency: int = 4  # 每批内同时进行的查询数
+    record_poll_max_errors: int = 5  # 连续查询失败该次数后停止轮询并标记为失败
+    record_poll_throttle_backoff: float = 5.0  # 被 Volc 限流后暂停轮询的时间（秒）
+    record_cache_ttl_seconds: int = 3600  # 已结束录制任务状态的保留时间（秒）
+
+    # AI智能体配置
+    agent_start_mode: str = "off"  # off: 不启动；concurrent: 加入房间时与媒体任务并发启动；lazy: 设备检测到首次说话时调用 /agent/activate 启动
+    agent_kind: str = "voice"  # voice: 实时对话式AI（StartVoiceChat）；video: 音视频互动智能体（StartVideoChat）
+    agent_timeline_samples: int = 256  # 统计启动耗时分布的最近样本数
+
+    # 实时消息发送队列（SendBroadcast/SendRoomUnicast/SendUnicast）
+    rtm_flush_interval: float = 0.05  # 房间队列的最长缓冲时间（秒）
+    rtm_flush_size: int = 50  # 房间队列达到该消息数时立即发送
+    rtm_qps: float = 50.0  # 所有消息接口的总QPS上限
+    rtm_concurrency: int = 4  # 同时发送的房间数
+    rtm_batch_unicast: bool = True  # 同一房间内发给多个用户的相同消息合并为一次 BatchSendRoomUnicast
+    rtm_batch_max_users: int = 100  # BatchSendRoomUnicast 每次的接收者数上限
+    rtm_retries: int = 2  # 发送失败或被限流时的重试次数
+    rtm_max_pending: int = 10000  # 待发送消息数上限，超出时拒绝入队
+    rtm_shutdown_flush_timeout: float = 5.0  # 停机时发送剩余消息的最长时间（秒）
+    rtm_latency_samples: int = 1024  # 统计发送延迟分布的最近样本数
+
+    # 在线媒体流输入令牌续期
+    relay_token_renew_method: str = "update"  # update: UpdateRelayStream 更新令牌；restart: 停止后用新令牌以相同任务ID重新启动
+    relay_token_renew_before: float = 600.0  # 令牌过期前多久开始续期（秒）
+    relay_token_renew_jitter: float = 300.0  # 在 renew_before 基础上再随机提前 0~jitter 秒，分散同时加入的任务
+    relay_token_renew_batch_size: int = 20  # 每批续期的任务数上限
+    relay_token_renew_batch_window: float = 5.0  # 将该时间内即将到期的任务合并到同一批提前续期（秒）
+    relay_token_renew_batch_interval: float = 1.0  # 两批续期之间的最小间隔（秒）
+    relay_token_renew_concurrency: int = 4  # 每批内同时进行的更新数
+    relay_token_retry_delay: float = 30.0  # 续期失败后的首次重试间隔（秒），之后指数退避
+
+    # 媒体任务日志（崩溃重启后恢复进行中的任务）
+    task_ledger_path: str = "data/task_ledger.bin"  # 日志文件路径，为空时不记录；序号非0的 worker 写 task_ledger-<序号>.bin
+    task_ledger_commit_interval: float = 0.005  # 组提交间隔：合并该时间内追加的记录为一次 fsync（秒）
+    task_ledger_compact_interval: float = 300.0  # 定期检查压缩的间隔（秒）
+    task_ledger_compact_min_bytes: int = 1048576  # 日志小于该大小时不压缩
+    task_ledger_compact_ratio: float = 4.0  # 日志大小超过进行中任务记录大小的该倍数时立即压缩
+
+    # 孤儿任务回收（设备掉线且未离开房间时停止其任务）
+    reconcile_interval: float = 30.0  # 检查间隔（秒），为0时不回收
+    reconcile_stale_seconds: float = 180.0  # 上报过心跳的设备超过该时间无心跳视为失联（秒）
+    reconcile_join_stale_seconds: float = 43200.0  # 从未上报心跳的设备加入房间超过该时间视为失联（秒）
+    reconcile_batch_size: int = 100  # 每轮最多回收的设备数
+    reconcile_concurrency: int = 4  # 同时停止的任务数
+    reconcile_qps: float = 5.0  # 停止任务的总QPS上限
+
+    # 事件循环延迟监控
+    loop_lag_interval: float = 0.05  # 测量间隔（秒），为0时不监控
+    loop_lag_threshold: float = 0.1  # 调度延迟超过该值视为阻塞并抓取调用栈（秒）
+    loop_lag_capture_interval: float = 10.0  # 两次抓取调用栈的最小间隔（秒）
+    loop_lag_stalls: int = 20  # 保留最近的阻塞记录数
+    loop_lag_stack_depth: int = 30  # 调用栈保留的最内层帧数
+
+    # 采样分析器（/admin/profile）
+    profile_max_seconds: float = 60.0  # 单次采样的最长时间（秒）
+    profile_max_hz: float = 1000.0  # 采样频率上限
+    profile_max_depth: int = 64  # 每个调用栈保留的最内层帧数
+
+    # 分布式追踪（W3C traceparent）
+    trace_exporter: str = ""  # 导出方式：file 写入JSON行文件，otlp 发送到 OTLP/HTTP 采集器，为空时不采样
+    trace_sample_rate: float = 0.01  # 请求的采样比例
+    trace_parent_based: bool = True  # 有上游 traceparent 时沿用其采样决定（采样/不采样）
+    trace_file_path: str = "data/traces.jsonl"  # file 导出的文件路径
+    trace_collector_url: str = "http://127.0.0.1:4318/v1/traces"  # OTLP/HTTP 采集器地址
+    trace_export_timeout: float = 5.0  # 发送到采集器的超时（秒）
+    trace_batch_size: int = 512  # 每批导出的 span 数，队列达到该数量时立即导出
+    trace_export_interval: float = 2.0  # 导出间隔（秒）
+    trace_queue_size: int = 20000  # 待导出 span 上限，超过时丢弃
+
+    # 流量录制（供 bench/replay.py 按原始到达间隔回放）
+    capture_enabled: bool = False  # 是否录制请求
+    capture_dir: str = "data/capture"  # 分段文件目录
+    capture_format: str = "jsonl"  # 分段格式：jsonl 或 bin（长度+CRC32分帧的二进制记录，体积更小）
+    capture_sample_rate: float = 1.0  # 录制比例
+    capture_routes: List[str] = []  # 只录制路径以这些前缀开头的请求，为空时录制全部
+    capture_exclude_routes: List[str] = ["/api/v1/admin/"]  # 不录制的路径前缀
+    capture_max_body_bytes: int = 64 * 1024  # 请求体超过该大小时不录制请求体（回放时跳过该请求）
+    capture_segment_bytes: int = 64 * 1024 * 1024  # 单个分段文件的大小上限
+    capture_max_bytes: int = 1024 * 1024 * 1024  # 每个 worker 录制的总量上限，达到后停止录制
+    capture_flush_interval: float = 1.0  # 写入分段文件的间隔（秒）
+    capture_queue_size: int = 20000  # 待写入的请求数上限，超过时丢弃
+
+    # 异步加入房间任务配置
+    join_job_ttl_seconds: int = 600  # 已结束任务的保留时间（秒）
+    join_job_keepalive_seconds: float = 15.0  # SSE 心跳间隔（秒）
 
     # RTS 服务配置
     rts_service_url: str = "http://localhost:9000"  # jusi_meet_rts 服务地址
+    rts_timeout: float = 10.0  # 调用 RTS 服务的超时（秒），不超过请求剩余时间
+
+    # RTS 只读查询对冲：主实例超过分位数延迟未响应时向其他实例发出相同请求，先返回者胜出
+    rts_hedge_urls: List[str] = []  # 可对冲的其他 RTS 实例地址，为空时不对冲
+    rts_hedge_percentile: float = 0.95  # 对冲等待时间取最近响应耗时的该分位数
+    rts_hedge_initial_delay: float = 0.1  # 样本不足时的对冲等待时间（秒）
+    rts_hedge_min_delay: float = 0.01  # 对冲等待时间下限（秒）
+    rts_hedge_budget: float = 0.1  # 对冲请求数不超过请求数的该比例，0为关闭对冲
+    rts_hedge_burst: float = 10.0  # 可累积的对冲次数上限
     
     # 指定配置文件和相关参数
     class Config:
@@ -0,0 +1,130 @@
+'''
+停机排空
+收到停机信号后拒绝新的加入房间请求，等待进行中的加入/离开操作完成（有超时）；
+剩余媒体任务默认保留运行（进行中的会议不因发布或 worker 重启中断），重启后由媒体任务日志恢复，
+运维显式排空（POST /admin/drain?stop_tasks=true）或配置 drain_stop_tasks 时才并发停止
+'''
+import asyncio
+import logging
+import signal
+import threading
+from contextlib import contextmanager
+from typing import Optional
+from config import settings
+from session_registry import session_registry
+from task_manager import stop_session_tasks
+from schemas import DrainReport, DrainStatus
+from utils import current_timestamp_ms
+
+
+logger = logging.getLogger(__name__)
+
+
+class DrainController:
+    """记录进行中的媒体操作，停机时排空"""
+
+    def __init__(self):
+        self.draining = False
+        self.inflight = 0
+        self.report: Optional[DrainReport] = None
+        self._idle: Optional[asyncio.Event] = None
+
+    def _idle_event(self) -> asyncio.Event:
+        if self._idle is None:
+            self._idle = asyncio.Event()
+            if self.inflight == 0:
+                self._idle.set()
+        return self._idle
+
+    def enter(self) -> None:
+        self.inflight += 1
+        self._idle_event().clear()
+
+    def exit(self) -> None:
+        self.inflight -= 1
+        if self.inflight == 0:
+            self._idle_event().set()
+
+    @contextmanager
+    def track(self):
+        """标记一个进行中的媒体操作（启动或停止任务），排空时等待其完成"""
+        self.enter()
+        try:
+            yield
+        finally:
+            self.exit()
+
+    def begin(self) -> None:
+        """开始排空：之后的加入房间请求返回503"""
+        if not self.draining:
+            self.draining = True
+            logger.info(f"开始排空，进行中的操作 {self.inflight} 个")
+
+    def install_signal_handlers(self) -> None:
+        """在 uvicorn 的停机信号处理之前标记排空，使 uvicorn 等待连接关闭期间到达的加入请求也被拒绝"""
+        if threading.current_thread() is not threading.main_thread():
+            return
+
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            previous = signal.getsignal(sig)
+
+            def handler(signum, frame, previous=previous):
+                self.draining = True
+                if callable(previous):
+                    previous(signum, frame)
+
+            signal.signal(sig, handler)
+
+    def status(self) -> DrainStatus:
+        return DrainStatus(draining=self.draining, inflight=self.inflight, report=self.report)
+
+    async def drain(self, stop_tasks: Optional[bool] = None) -> DrainReport:
+        """排空：等待进行中的操作（最长 drain_timeout 秒），再停止剩余任务
+
+        stop_tasks 为 None 时按 drain_stop_tasks 配置：停机（含 worker 按请求数上限重启）默认保留任务运行，
+        由媒体任务日志在重启后恢复；只有运维显式排空时才停止
+        """
+        if stop_tasks is None:
+            stop_tasks = settings.drain_stop_tasks
+        start_time = current_timestamp_ms()
+        self.begin()
+        inflight = self.inflight
+
+        timed_out = False
+        try:
+            await asyncio.wait_for(self._idle_event().wait(), timeout=settings.drain_timeout)
+        except asyncio.TimeoutError:
+            timed_out = True
+            logger.warning(f"等待进行中的操作超时，剩余 {self.inflight} 个")
+
+        sessions = session_registry.all_sessions()
+        tasks = sum(len(s.tasks) for s in sessions)
+        stopped = failed = 0
+        if stop_tasks and sessions:
+            results = await stop_session_tasks(sessions)
+            stopped = sum(1 for r in results if r.success)
+            failed = len(results) - stopped
+
+        self.report = DrainReport(
+            inflight=inflight,
+            inflight_remaining=self.inflight,
+            timed_out=timed_out,
+            sessions=len(sessions),
+            tasks=tasks,
+            stopped=stopped,
+            failed=failed,
+            left_running=tasks - stopped - failed,
+            elapsed_ms=current_timestamp_ms() - start_time,
+        )
+        message = (f"排空完成: 进行中的操作{inflight}个（剩余{self.inflight}个）, 会话{len(sessions)}个, "
+                   f"任务{tasks}个, 停止{stopped}个, 失败{failed}个, 保留{self.report.left_running}个, "
+                   f"耗时{self.report.elapsed_ms}ms")
+        if timed_out or failed:
+            logger.warning(message)
+        else:
+            logger.info(message)
+        return self.report
+
+
+# 停机排空全局实例
+drain_controller: DrainController = DrainController()
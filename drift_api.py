@@ -1,9 +1,23 @@
 '''
 面向APP提供的API接口
 '''
+import asyncio
 import logging
+import time
+from typing import Callable, Optional, Tuple
 from fastapi import APIRouter, Response
+from fastapi.responses import JSONResponse, StreamingResponse
 from vertc_client import rtc_client
+from session_registry import session_registry, TaskType, MediaTask, DeviceSession
+from task_manager import stop_session_tasks, teardown_room
+from job_manager import job_manager, JoinStep
+from media_allocator import media_allocator, MediaNode
+from agent_manager import agent_manager, AgentStartMode
+from token_renewal import relay_token_renewer
+from task_ledger import task_ledger
+from drain import drain_controller
+from admission import admission_controller, admit, EndpointClass
+from request_deadline import DeadlineExceeded, check_deadline, no_deadline
 from config import settings
 from schemas import *
 
@@ -13,18 +27,36 @@ logger = logging.getLogger(__name__)
 drift_router = APIRouter()
 
 
-# 摄像头加入房间接口
-@drift_router.post("/camera/join", response_model=ResponseMessageBase)
-async def camera_join_room(data: CameraJoinRequest):
+# 计算设备的上下行媒体流地址（纯字符串拼接，不依赖上游调用）
+def build_stream_urls(device_sn: str, ingest: MediaNode, egress: MediaNode) -> Tuple[str, str, str]:
     # 上行媒体流
-    up_rtmp_url = f"rtmp://{settings.video_rtmp_host}:{settings.video_rtmp_port}/live/{data.device_sn}"
+    up_rtmp_url = f"rtmp://{ingest.host}:{ingest.rtmp_port}/live/{device_sn}"
     # 下行媒体流
-    dn_rtmp_url = f"rtmp://{settings.audio_rtmp_host}:{settings.audio_rtmp_port}/live/{data.device_sn}"
-    dn_rtsp_url = f"rtsp://{settings.audio_rtmp_host}:{settings.audio_rtsp_port}/live_{data.device_sn}"
+    dn_rtmp_url = f"rtmp://{egress.host}:{egress.rtmp_port}/live/{device_sn}"
+    dn_rtsp_url = f"rtsp://{egress.host}:{egress.rtsp_port or settings.audio_rtsp_port}/live_{device_sn}"
+    return up_rtmp_url, dn_rtmp_url, dn_rtsp_url
+
+
+# 等待并发启动的智能体结束（其登记的任务由调用方统一处理）
+async def settle_agent(agent_task: Optional[asyncio.Task]) -> None:
+    if agent_task is not None:
+        await asyncio.gather(agent_task, return_exceptions=True)
+
 
+# 依次启动设备的媒体任务并登记到设备会话，智能体按配置并发启动
+async def start_device_tasks(data: CameraJoinRequest, session: DeviceSession, up_rtmp_url: str, dn_rtmp_url: str,
+                             on_step: Optional[Callable[..., None]] = None) -> Optional[str]:
+    pending: Optional[TaskType] = None  # 已发出启动请求、尚未确认结果的任务
+    agent_task: Optional[asyncio.Task] = None
+    if agent_manager.mode == AgentStartMode.Concurrent and agent_manager.get(data.device_sn) is not None:
+        # 使用加入房间时构建好的请求体，与媒体任务并发启动，失败不影响加入房间
+        agent_task = asyncio.create_task(agent_manager.start(data.device_sn))
     try:
-        # 启动合流转推
-        response = rtc_client.start_push_mixed_stream(
+        # 启动合流转推（SDK为同步调用，放到线程池中执行）
+        check_deadline("启动合流转推")
+        pending = TaskType.MixedStream
+        response = await asyncio.to_thread(
+            rtc_client.start_push_mixed_stream,
             room_id=data.room_id,
             user_id=data.user_id,  # 排除的用户ID
             task_id=data.device_sn,
@@ -32,80 +64,263 @@ async def camera_join_room(data: CameraJoinRequest):
         )
 
         logger.info(f"启动合流转推: {response}")
+        session_registry.add_task(data.device_sn, TaskType.MixedStream, data.device_sn)
+        pending = None
+        if on_step:
+            on_step(JoinStep.MixedStreamStarted)
 
         # 启动在线媒体流输入
-        response = rtc_client.start_relay_stream(
+        check_deadline("启动在线媒体流输入")
+        pending = TaskType.RelayStream
+        expire_at = int(time.time()) + settings.volc_token_expire_seconds
+        response = await asyncio.to_thread(
+            rtc_client.start_relay_stream,
             room_id=data.room_id,
             user_id=data.user_id,  # 在线媒体流输入的用户ID
             task_id=data.device_sn,
             stream_url=up_rtmp_url,
+            expire_at=expire_at,
         )
 
         logger.info(f"启动在线媒体流输入: {response}")
+        session_registry.add_task(data.device_sn, TaskType.RelayStream, data.device_sn, up_rtmp_url)
+        # 令牌过期前由续期调度更新，避免长会议中输入流被断开
+        relay_token_renewer.track(session, up_rtmp_url, expire_at)
+        pending = None
+        if on_step:
+            on_step(JoinStep.RelayStreamStarted)
 
-        # 启动实时对话式AI
-        '''
-        response = rtc_client.start_voice_chat(
-            room_id=data.room_id,
-            bot_id=data.device_sn,
-            user_id=data.user_id,
-            task_id=data.device_sn,
-            dialog_id=data.device_sn,
-        )
-        '''
+        # 等待并发启动的AI智能体
+        timeline = agent_manager.get(data.device_sn)
+        if agent_task is not None:
+            timeline = await agent_task
+            if on_step:
+                on_step(JoinStep.AgentStarted, timeline.status)
+        return timeline.status if timeline is not None else None
 
-        response_data = CameraJoinResponse(
-            rtmp_url=up_rtmp_url,
-            rtsp_url=dn_rtsp_url,
-        )
+    except DeadlineExceeded:
+        # 等待响应时超过截止时间，任务可能已在服务端启动，登记后由调用方统一停止
+        await settle_agent(agent_task)
+        if pending is not None:
+            session_registry.add_task(data.device_sn, pending, data.device_sn)
+        elif not session.tasks:
+            session_registry.close_session(data.device_sn)
+        raise
 
-        return ResponseMessageBase(type=MessageType.CameraJoinRoom, data=response_data)
+    except Exception:
+        await settle_agent(agent_task)
+        if not session.tasks:
+            session_registry.close_session(data.device_sn)
+        raise
+
+    finally:
+        # 已登记的任务落盘后再返回，进程崩溃重启后仍能找到这些任务
+        await task_ledger.sync()
+
+
+# 摄像头加入房间接口
+@drift_router.post("/camera/join", response_model=CameraJoinMessage, dependencies=[admit(EndpointClass.Volc)])
+async def camera_join_room(data: CameraJoinRequest, response: Response):
+    # 停机排空期间拒绝新的加入请求，由客户端重试到其他实例
+    if drain_controller.draining:
+        response.status_code = 503
+        response.headers["Retry-After"] = str(settings.drain_retry_after)
+        return CameraJoinMessage(type=MessageType.CameraJoinRoom, code=503, message="服务正在停止，请稍后重试")
+
+    # 设备切换房间（未调用离开接口）时先停止旧房间的任务，停止失败时保留旧会话，由设备重试加入
+    previous = session_registry.get_session(data.device_sn)
+    if previous is not None and previous.room_id != data.room_id and previous.tasks:
+        logger.warning(f"设备 {data.device_sn} 从房间 {previous.room_id} 切换到 {data.room_id}，停止旧任务: {list(previous.tasks)}")
+        with drain_controller.track():
+            results = await stop_session_tasks([previous])
+        failed = [r for r in results if not r.success]
+        if failed:
+            return CameraJoinMessage(
+                type=MessageType.CameraJoinRoom,
+                code=500,
+                message=f"停止房间 {previous.room_id} 的旧任务失败: " + "; ".join(f"{r.task_type}: {r.error}" for r in failed)
+            )
+        agent_manager.release(data.device_sn)
+
+    # 登记设备会话，记录已启动的任务以便离开或停止房间时统一清理
+    try:
+        session = session_registry.open_session(data.device_sn, data.room_id, data.user_id)
+    except RuntimeError as e:
+        # 旧房间的任务未全部停止（部分停止失败，或同一设备的另一个加入请求正在切换房间），由设备稍后重试
+        logger.warning(f"处理CameraJoinRoom请求失败: {str(e)}")
+        response.status_code = 409
+        return CameraJoinMessage(type=MessageType.CameraJoinRoom, code=409, message=f"设备仍有未停止的任务: {str(e)}")
+
+    # 分配上下行媒体节点（同一会话内保持不变）
+    ingest, egress = media_allocator.allocate(session)
+    up_rtmp_url, dn_rtmp_url, dn_rtsp_url = build_stream_urls(data.device_sn, ingest, egress)
+
+    # 提前构建并校验AI智能体的启动请求体（纯本地计算）
+    timeline = agent_manager.prepare(session)
+
+    response_data = CameraJoinResponse(
+        rtmp_url=up_rtmp_url,
+        rtsp_url=dn_rtsp_url,
+        agent_status=timeline.status if timeline is not None else None,
+    )
+
+    # 异步模式：立即返回202和任务ID，媒体任务在后台启动
+    if data.async_mode:
+        job = job_manager.create_job(data.device_sn, data.room_id)
+        response_data.job_id = job.job_id
+        job.result = response_data
+
+        # 在返回前计入进行中的操作，避免任务尚未开始运行时排空判断为空闲
+        drain_controller.enter()
+
+        async def runner(on_step: Callable[[str], None]) -> None:
+            try:
+                # 后台启动不受请求截止时间限制，但同样受 Volc 类别的并发限制，排队超时则任务失败
+                with no_deadline():
+                    async with admission_controller.limiter(EndpointClass.Volc):
+                        await start_device_tasks(data, session, up_rtmp_url, dn_rtmp_url, on_step)
+            finally:
+                drain_controller.exit()
+
+        job_manager.run_job(job, runner)
+
+        response.status_code = 202
+        return CameraJoinMessage(type=MessageType.CameraJoinRoom, code=202, message="accepted", data=response_data)
+
+    try:
+        with drain_controller.track():
+            response_data.agent_status = await start_device_tasks(data, session, up_rtmp_url, dn_rtmp_url)
+
+        return CameraJoinMessage(type=MessageType.CameraJoinRoom, data=response_data)
+
+    except DeadlineExceeded as e:
+        # 设备已不再等待，停止本次已启动的任务，避免遗留
+        logger.warning(f"处理CameraJoinRoom请求超过截止时间: {str(e)}")
+        if session.tasks:
+            with drain_controller.track(), no_deadline():
+                await stop_session_tasks([session])
+        response.status_code = 504
+        return CameraJoinMessage(
+            type=MessageType.CameraJoinRoom,
+            code=504,
+            message=f"启动RTC服务超过请求截止时间: {str(e)}"
+        )
 
     except Exception as e:
         logger.error(f"处理CameraJoinRoom请求失败: {str(e)}")
-        return ResponseMessageBase(
+        return CameraJoinMessage(
             type=MessageType.CameraJoinRoom,
             code=500,
             message=f"启动RTC服务失败: {str(e)}"
         )
 
 
+# 查询异步加入房间任务进度接口
+@drift_router.get("/camera/jobs/{job_id}", response_model=JoinJobMessage, dependencies=[admit(EndpointClass.Local)])
+async def get_camera_join_job(job_id: str):
+    job = job_manager.get_job(job_id)
+    if job is None:
+        return JoinJobMessage(type=MessageType.CameraJoinJob, code=404, message="任务不存在")
+
+    return JoinJobMessage(type=MessageType.CameraJoinJob, data=job)
+
+
+# 订阅异步加入房间任务进度接口（SSE）
+@drift_router.get("/camera/jobs/{job_id}/events", dependencies=[admit(EndpointClass.Local, streaming=True)])
+async def stream_camera_join_job(job_id: str):
+    if job_manager.get_job(job_id) is None:
+        return JSONResponse(
+            status_code=404,
+            content=JoinJobMessage(type=MessageType.CameraJoinJob, code=404, message="任务不存在").model_dump()
+        )
+
+    async def event_stream():
+        async for snapshot in job_manager.subscribe(job_id):
+            if snapshot is None:
+                yield ": keepalive\n\n"
+            else:
+                yield f"event: {snapshot.status}\ndata: {snapshot.model_dump_json()}\n\n"
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
 # 摄像头离开房间接口
-@drift_router.post("/camera/leave", response_model=ResponseMessageBase)
+@drift_router.post("/camera/leave", response_model=CameraLeaveMessage, dependencies=[admit(EndpointClass.Volc)])
 async def camera_leave_room(data: CameraLeaveRequest):
 
     try:
-        # 停止合流转推
-        response = rtc_client.stop_push_stream_to_cdn(
-            room_id=data.room_id,
-            task_id=data.device_sn
-        )
+        # 优先按登记的任务停止；未登记时（如服务重启后）按默认任务ID停止合流转推和在线媒体流输入
+        session = session_registry.get_session(data.device_sn)
+        if session is None or session.room_id != data.room_id:
+            session = DeviceSession(device_sn=data.device_sn, room_id=data.room_id, user_id=data.user_id)
+            for task_type in (TaskType.MixedStream, TaskType.RelayStream):
+                session.tasks[task_type] = MediaTask(room_id=data.room_id, task_id=data.device_sn, task_type=task_type)
 
-        logger.info(f"停止合流转推: {response}")
+        # 并发停止合流转推、在线媒体流输入等任务
+        with drain_controller.track():
+            results = await stop_session_tasks([session])
+        logger.info(f"停止设备 {data.device_sn} 的任务: {results}")
 
-        # 停止在线媒体流输入
-        response = rtc_client.stop_relay_stream(
-            room_id=data.room_id,
-            task_id=data.device_sn
-        )
-
-        logger.info(f"停止在线媒体流输入: {response}")
+        failed = [r for r in results if not r.success]
+        if failed:
+            raise Exception("; ".join(f"{r.task_type}: {r.error}" for r in failed))
 
-        # 关闭实时对话式AI
-        '''
-        response = rtc_client.stop_voice_chat(
-            room_id=data.room_id,
-            task_id=data.device_sn
-        )
+        # 移除设备已构建但未启动（lazy 模式下未说话）的智能体
+        agent_manager.release(data.device_sn)
 
-        logger.info(f"关闭实时对话式AI: {response}")
-        '''
-        return ResponseMessageBase(type=MessageType.CameraLeaveRoom)
+        return CameraLeaveMessage(type=MessageType.CameraLeaveRoom, data=CameraLeaveResponse())
 
     except Exception as e:
         logger.error(f"处理CameraLeaveRoom请求失败: {str(e)}")
-        return ResponseMessageBase(
+        return CameraLeaveMessage(
             type=MessageType.CameraLeaveRoom,
             code=500,
             message=f"停止RTC服务失败: {str(e)}"
         )
+
+
+# 相机心跳接口：设备在房间内时定期调用，超过 reconcile_stale_seconds 无心跳的设备任务由孤儿任务回收停止
+@drift_router.post("/camera/heartbeat", response_model=CameraHeartbeatMessage, dependencies=[admit(EndpointClass.Local)])
+async def camera_heartbeat(data: CameraHeartbeatRequest, response: Response):
+    session = session_registry.touch(data.device_sn)
+    if session is None and not session_registry.owns_all_devices:
+        # 会话可能在其他 worker，不能让设备重新加入（否则同一设备在两个 worker 各有一组任务），稍后重试
+        response.status_code = 503
+        response.headers["Retry-After"] = str(settings.admission_retry_after)
+        return CameraHeartbeatMessage(type=MessageType.CameraHeartbeat, code=503, message="设备会话不在本 worker，请重试")
+    if session is None:
+        # 会话不存在（已被回收或服务重启前未登记），设备需重新加入房间
+        return CameraHeartbeatMessage(type=MessageType.CameraHeartbeat, code=404, message="设备未加入房间")
+
+    return CameraHeartbeatMessage(type=MessageType.CameraHeartbeat, data=CameraHeartbeatResponse(room_id=session.room_id))
+
+
+# 停止房间内所有设备任务接口（会议取消或结束时调用）
+@drift_router.post("/room/teardown", response_model=RoomTeardownMessage, dependencies=[admit(EndpointClass.Volc)])
+async def room_teardown(data: RoomTeardownRequest):
+
+    try:
+        with drain_controller.track():
+            summary = await teardown_room(data.room_id)
+
+        if summary.failed:
+            return RoomTeardownMessage(
+                type=MessageType.RoomTeardown,
+                code=500,
+                message=f"{summary.failed}个任务停止失败",
+                data=summary
+            )
+
+        return RoomTeardownMessage(type=MessageType.RoomTeardown, data=summary)
+
+    except Exception as e:
+        logger.error(f"处理RoomTeardown请求失败: {str(e)}")
+        return RoomTeardownMessage(
+            type=MessageType.RoomTeardown,
+            code=500,
+            message=f"停止房间任务失败: {str(e)}"
+        )
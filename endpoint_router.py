@@ -0,0 +1,259 @@
+'''
+Volc OpenAPI 多接入点路由
+后台周期性探测各接入点的连接耗时，每次调用优先路由到最快的健康接入点，
+连接失败时自动切换到下一个接入点，并统计每个接入点的调用延迟
+'''
+import asyncio
+import logging
+import threading
+import time
+from dataclasses import dataclass
+from typing import List, Optional, TYPE_CHECKING
+from bootstrap import LazyInstance
+from config import settings
+from request_deadline import DeadlineExceeded, check_deadline, deadline_expired
+from schemas import VolcEndpointStatus, VolcPoolStats
+from tracing import tracer, current_span, SpanKind
+
+if TYPE_CHECKING:
+    from vertc_service import VertcService
+
+
+logger = logging.getLogger(__name__)
+
+# 延迟指数滑动平均系数
+EWMA_ALPHA = 0.3
+
+
+def _ewma(old: Optional[float], value: float) -> float:
+    return value if old is None else old * (1 - EWMA_ALPHA) + value * EWMA_ALPHA
+
+
+# Volc OpenAPI 接入点
+@dataclass
+class VolcEndpoint:
+    host: str
+    region: str
+    service: "VertcService"
+    healthy: bool = True
+    probe_rtt_ms: Optional[float] = None  # 探测连接耗时（滑动平均）
+    call_latency_ms: Optional[float] = None  # 实际调用耗时（滑动平均）
+    calls: int = 0
+    errors: int = 0
+    failures: int = 0  # 连续失败次数
+    last_used: float = 0.0  # 最近一次调用或预热的时间（monotonic）
+
+    @property
+    def name(self) -> str:
+        return f"{self.host}@{self.region}"
+
+    @staticmethod
+    def parse(spec: str) -> "VolcEndpoint":
+        """解析接入点配置，格式为 host@region"""
+        from vertc_service import VertcService  # 延迟导入 volcengine SDK，构造路由时才加载
+
+        host, _, region = spec.strip().partition("@")
+        region = region or settings.volc_region
+        service = VertcService(host, region)
+        service.set_ak(settings.volc_ak)
+        service.set_sk(settings.volc_sk)
+        return VolcEndpoint(host=host, region=region, service=service)
+
+
+def _request_not_sent(error: BaseException) -> bool:
+    """请求是否确定未发出：连接超时、建立连接失败或域名解析失败（urllib3 的 ConnectTimeoutError 及其子类）"""
+    import requests
+    from urllib3.exceptions import ConnectTimeoutError, MaxRetryError
+
+    seen = set()
+    while error is not None and id(error) not in seen:
+        seen.add(id(error))
+        if isinstance(error, (requests.exceptions.ConnectTimeout, ConnectTimeoutError)):
+            return True
+        if isinstance(error, MaxRetryError):
+            error = error.reason
+            continue
+        # requests 将 urllib3 的异常作为第一个参数包装，未设置 __cause__
+        nested = next((arg for arg in getattr(error, "args", ()) if isinstance(arg, BaseException)), None)
+        error = nested or error.__cause__ or error.__context__
+    return False
+
+
+class EndpointRouter:
+    """按延迟选择接入点并在连接失败时切换"""
+
+    def __init__(self):
+        from vertc_service import VOLC_DEFAULT_HOST
+
+        specs = settings.volc_endpoints or [f"{VOLC_DEFAULT_HOST}@{settings.volc_region}"]
+        self.endpoints: List[VolcEndpoint] = [VolcEndpoint.parse(spec) for spec in specs]
+        self._lock = threading.Lock()  # 调用在线程池中执行，统计数据需加锁
+        self._probe_task: Optional[asyncio.Task] = None
+        self._keepalive_task: Optional[asyncio.Task] = None
+
+    def candidates(self) -> List[VolcEndpoint]:
+        """按优先级排序的接入点：健康的在前，其中探测耗时低的在前；未探测过的保持配置顺序"""
+        with self._lock:
+            ordered = sorted(
+                enumerate(self.endpoints),
+                key=lambda item: (not item[1].healthy, item[1].probe_rtt_ms is None,
+                                  item[1].probe_rtt_ms or 0.0, item[0])
+            )
+        return [endpoint for _, endpoint in ordered]
+
+    def call(self, method: str, body) -> dict:
+        """调用 VertcService 的指定方法（同步，在线程池中执行）
+
+        仅在连接阶段失败（请求未发出）时切换接入点，避免非幂等的启动类接口被重复执行
+        """
+        with tracer.span(f"volc.{method}", SpanKind.Client):
+            return self._call(method, body)
+
+    def _call(self, method: str, body) -> dict:
+        import requests
+
+        check_deadline(method)
+        last_error = None
+        for endpoint in self.candidates():
+            start = time.perf_counter()
+            try:
+                response = getattr(endpoint.service, method)(body)
+            except DeadlineExceeded:
+                raise
+            except requests.exceptions.ConnectionError as e:
+                if not _request_not_sent(e):
+                    # 请求可能已发出（如复用的长连接已被服务端关闭，Connection aborted），切换接入点可能重复执行启动类接口
+                    self._record(endpoint, time.perf_counter() - start, failed=False, error=True)
+                    if deadline_expired():
+                        raise DeadlineExceeded(f"{method} 已超过请求截止时间") from e
+                    raise
+                if deadline_expired():
+                    # 连接超时由请求截止时间导致，不判定接入点不可用
+                    self._record(endpoint, time.perf_counter() - start, failed=False, error=True)
+                    raise DeadlineExceeded(f"{method} 已超过请求截止时间") from e
+                last_error = e
+                self._record(endpoint, time.perf_counter() - start, failed=True)
+                logger.warning(f"Volc接入点 {endpoint.name} 连接失败，切换接入点: {str(e)}")
+                continue
+            except Exception as e:
+                self._record(endpoint, time.perf_counter() - start, failed=False, error=True)
+                if deadline_expired():
+                    raise DeadlineExceeded(f"{method} 已超过请求截止时间") from e
+                raise
+            self._record(endpoint, time.perf_counter() - start, failed=False)
+            span = current_span()
+            if span is not None:
+                span.set("volc.endpoint", endpoint.name)
+            return response
+
+        raise Exception(f"所有Volc接入点均不可用: {str(last_error)}")
+
+    def _record(self, endpoint: VolcEndpoint, elapsed: float, failed: bool, error: bool = False) -> None:
+        with self._lock:
+            endpoint.last_used = time.monotonic()
+            endpoint.calls += 1
+            if failed or error:
+                endpoint.errors += 1
+            if failed:
+                endpoint.failures += 1
+                endpoint.healthy = False
+            else:
+                endpoint.failures = 0
+                endpoint.healthy = True
+                endpoint.call_latency_ms = _ewma(endpoint.call_latency_ms, elapsed * 1000)
+
+    def status(self) -> List[VolcEndpointStatus]:
+        with self._lock:
+            return [
+                VolcEndpointStatus(
+                    endpoint=endpoint.name,
+                    healthy=endpoint.healthy,
+                    probe_rtt_ms=endpoint.probe_rtt_ms,
+                    call_latency_ms=endpoint.call_latency_ms,
+                    calls=endpoint.calls,
+                    errors=endpoint.errors,
+                    pool=VolcPoolStats(**endpoint.service.pool_stats()),
+                )
+                for endpoint in self.endpoints
+            ]
+
+    async def start(self) -> None:
+        """预热连接池，并启动周期性延迟探测和连接保活"""
+        await self.warm_up(list(self.endpoints))
+        if self._probe_task is None:
+            self._probe_task = asyncio.create_task(self._probe_loop())
+        if self._keepalive_task is None:
+            self._keepalive_task = asyncio.create_task(self._keepalive_loop())
+
+    async def stop(self) -> None:
+        for task in (self._probe_task, self._keepalive_task):
+            if task is not None:
+                task.cancel()
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
+        self._probe_task = None
+        self._keepalive_task = None
+
+    async def warm_up(self, endpoints: List[VolcEndpoint]) -> None:
+        """并发预热各接入点的连接池（DNS解析、TCP/TLS建连），失败不影响启动"""
+
+        async def _warm_up(endpoint: VolcEndpoint) -> None:
+            try:
+                elapsed = await asyncio.to_thread(endpoint.service.warm_up, settings.volc_warmup_connections)
+                with self._lock:
+                    endpoint.last_used = time.monotonic()
+                logger.info(f"Volc接入点 {endpoint.name} 预热完成，耗时{elapsed:.1f}ms")
+            except Exception as e:
+                with self._lock:
+                    endpoint.healthy = False
+                logger.warning(f"Volc接入点 {endpoint.name} 预热失败: {str(e)}")
+
+        await asyncio.gather(*[_warm_up(endpoint) for endpoint in endpoints])
+
+    async def _keepalive_loop(self) -> None:
+        """对空闲超过保活间隔的健康接入点发送轻量请求，避免长连接被服务端断开"""
+        while True:
+            await asyncio.sleep(settings.volc_keepalive_interval / 2)
+            deadline = time.monotonic() - settings.volc_keepalive_interval / 2
+            with self._lock:
+                idle = [e for e in self.endpoints if e.healthy and e.last_used < deadline]
+            if idle:
+                await self.warm_up(idle)
+
+    async def _probe_loop(self) -> None:
+        while True:
+            try:
+                await asyncio.gather(*[self._probe(endpoint) for endpoint in self.endpoints])
+            except Exception as e:
+                logger.warning(f"Volc接入点探测失败: {str(e)}")
+            await asyncio.sleep(settings.volc_endpoint_probe_interval)
+
+    async def _probe(self, endpoint: VolcEndpoint) -> None:
+        """测量到接入点的 TCP 建连耗时"""
+        host, _, port = endpoint.host.partition(":")
+        port = int(port) if port else (443 if endpoint.service.service_info.scheme == "https" else 80)
+        start = time.perf_counter()
+        try:
+            _, writer = await asyncio.wait_for(
+                asyncio.open_connection(host, port),
+                timeout=settings.volc_endpoint_probe_timeout
+            )
+            writer.close()
+        except Exception as e:
+            with self._lock:
+                endpoint.failures += 1
+                if endpoint.healthy:
+                    logger.warning(f"Volc接入点不可用: {endpoint.name}: {str(e)}")
+                endpoint.healthy = False
+            return
+
+        with self._lock:
+            endpoint.probe_rtt_ms = _ewma(endpoint.probe_rtt_ms, (time.perf_counter() - start) * 1000)
+            endpoint.failures = 0
+            endpoint.healthy = True
+
+
+# Volc 接入点路由全局实例（首次使用时构造）
+endpoint_router: EndpointRouter = LazyInstance(EndpointRouter, "endpoint_router")
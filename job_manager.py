@@ -0,0 +1,129 @@
+'''
+异步任务管理
+摄像头加入房间的异步模式：接口立即返回任务ID，后台依次启动媒体任务，
+进度可通过轮询接口或SSE推送获取
+'''
+import asyncio
+import logging
+import uuid
+from enum import StrEnum
+from typing import AsyncGenerator, Awaitable, Callable, Dict, List, Optional, Set
+from config import settings
+from schemas import JoinJobStatus, JoinJobStep
+from utils import current_timestamp_ms
+
+
+logger = logging.getLogger(__name__)
+
+
+# 任务状态
+class JobStatus(StrEnum):
+    Pending = "pending"
+    Running = "running"
+    Succeeded = "succeeded"
+    Failed = "failed"
+
+
+# 加入房间的步骤
+class JoinStep(StrEnum):
+    MixedStreamStarted = "MixedStreamStarted"  # 合流转推已启动
+    RelayStreamStarted = "RelayStreamStarted"  # 在线媒体流输入已启动
+    AgentStarted = "AgentStarted"  # AI智能体启动完成（message 为智能体状态）
+
+
+class JobManager:
+    """异步任务管理器（仅在事件循环线程中访问）"""
+
+    def __init__(self):
+        self._jobs: Dict[str, JoinJobStatus] = {}
+        self._subscribers: Dict[str, List[asyncio.Queue]] = {}
+        self._running: Set[asyncio.Task] = set()  # 持有后台任务引用，防止被回收
+
+    def create_job(self, device_sn: str, room_id: str) -> JoinJobStatus:
+        """创建任务，同时清理过期的已结束任务"""
+        self._expire_jobs()
+        job = JoinJobStatus(
+            job_id=uuid.uuid4().hex,
+            device_sn=device_sn,
+            room_id=room_id,
+            status=JobStatus.Pending,
+        )
+        self._jobs[job.job_id] = job
+        return job
+
+    def get_job(self, job_id: str) -> Optional[JoinJobStatus]:
+        return self._jobs.get(job_id)
+
+    def run_job(self, job: JoinJobStatus, runner: Callable[[Callable[[str, str], None]], Awaitable[None]]) -> None:
+        """在后台执行任务，runner 通过回调上报每一步的进度"""
+
+        def on_step(name: str, message: str = "ok") -> None:
+            self._add_step(job, name, message)
+
+        async def _run() -> None:
+            job.status = JobStatus.Running
+            job.updated_at = current_timestamp_ms()
+            self._publish(job)
+            try:
+                await runner(on_step)
+                job.status = JobStatus.Succeeded
+            except Exception as e:
+                logger.error(f"异步任务 {job.job_id} 执行失败: {str(e)}")
+                job.status = JobStatus.Failed
+                job.error = str(e)
+            job.updated_at = current_timestamp_ms()
+            self._publish(job)
+
+        task = asyncio.create_task(_run())
+        self._running.add(task)
+        task.add_done_callback(self._running.discard)
+
+    async def subscribe(self, job_id: str) -> AsyncGenerator[Optional[JoinJobStatus], None]:
+        """订阅任务进度，任务结束后生成器退出；长时间无进度时产出 None 作为心跳"""
+        job = self._jobs.get(job_id)
+        if job is None:
+            return
+
+        queue: asyncio.Queue = asyncio.Queue()
+        self._subscribers.setdefault(job_id, []).append(queue)
+        try:
+            # 先推送当前状态，之后每次进度变化推送一次快照
+            snapshot = job.model_copy(deep=True)
+            yield snapshot
+            while not self._is_finished(snapshot):
+                try:
+                    await asyncio.wait_for(queue.get(), timeout=settings.join_job_keepalive_seconds)
+                except asyncio.TimeoutError:
+                    yield None  # 心跳
+                    continue
+                snapshot = job.model_copy(deep=True)
+                yield snapshot
+        finally:
+            queues = self._subscribers.get(job_id, [])
+            if queue in queues:
+                queues.remove(queue)
+            if not queues:
+                self._subscribers.pop(job_id, None)
+
+    def _add_step(self, job: JoinJobStatus, name: str, message: str) -> None:
+        job.steps.append(JoinJobStep(name=name, message=message))
+        job.updated_at = current_timestamp_ms()
+        self._publish(job)
+
+    def _publish(self, job: JoinJobStatus) -> None:
+        for queue in self._subscribers.get(job.job_id, []):
+            queue.put_nowait(job.updated_at)
+
+    @staticmethod
+    def _is_finished(job: JoinJobStatus) -> bool:
+        return job.status in (JobStatus.Succeeded, JobStatus.Failed)
+
+    def _expire_jobs(self) -> None:
+        deadline = current_timestamp_ms() - settings.join_job_ttl_seconds * 1000
+        expired = [job_id for job_id, job in self._jobs.items() if self._is_finished(job) and job.updated_at < deadline]
+        for job_id in expired:
+            self._jobs.pop(job_id, None)
+
+
+# 异步任务管理器全局实例
+job_manager: JobManager = JobManager()
@@ -1,8 +1,11 @@
 import json
 import logging
+from contextlib import ExitStack
 from fastapi import Request
 from starlette.middleware.base import BaseHTTPMiddleware
 from utils import current_timestamp_ms
+from tracing import tracer
+from traffic_capture import traffic_capture
 
 
 logger = logging.getLogger(__name__)
@@ -11,9 +14,23 @@ class RequestLoggingMiddleware(BaseHTTPMiddleware):
     """请求日志中间件"""
     
     async def dispatch(self, request: Request, call_next):
+        # 请求的根 span（接受上游的 traceparent），日志中间件读取和格式化请求/响应体的耗时记录为子 span（由 stages 打开和结束）
+        with tracer.start_request(request.headers.get("traceparent"), f"{request.method} {request.url.path}",
+                                  **{"http.method": request.method, "http.target": request.url.path}) as span, \
+                ExitStack() as stages:
+            response = await self._dispatch(request, call_next, stages)
+            if span is not None:
+                span.set("http.status_code", response.status_code)
+            return response
+
+    async def _dispatch(self, request: Request, call_next, stages: ExitStack):
         # 记录请求开始时间
         start_time = current_timestamp_ms()
         
+        stages.enter_context(tracer.span("log_mw.request"))
+        # 录制请求（未开启录制时返回 None），需在读取请求体之前
+        captured = await traffic_capture.capture_request(request)
+        
         # 获取请求体（对于可能验证失败的情况特别重要）
         request_body = await self._get_request_body(request)
         
@@ -27,6 +44,7 @@ class RequestLoggingMiddleware(BaseHTTPMiddleware):
             # 格式化请求体为易读JSON
             formatted_request_body = self._format_body(request_body)
             logger.info(f"请求体: {formatted_request_body}")
+        stages.close()
         
         # 存储请求体到 state 以便后续使用
         request.state.request_body = request_body
@@ -41,8 +59,14 @@ class RequestLoggingMiddleware(BaseHTTPMiddleware):
             if hasattr(request.state, 'request_body'):
                 formatted_request_body = self._format_body(request.state.request_body)
                 logger.error(f"请求体: {formatted_request_body}")
+            if captured is not None:
+                traffic_capture.record(captured, 500)
             raise
 
+        if captured is not None:
+            traffic_capture.record(captured, response.status_code)
+
+        stages.enter_context(tracer.span("log_mw.response"))
         # 尝试读取并记录响应体（安全且有限制）
         response_body = None
         try:
@@ -58,7 +82,10 @@ class RequestLoggingMiddleware(BaseHTTPMiddleware):
                     should_try_read = False
             else:
                 # 若没有 content-length，且类型可读时尝试读取
-                if content_type.startswith("application/json") or content_type.startswith("text/"):
+                # SSE 等长连接流式响应不能读取，否则会阻塞到流结束
+                if content_type.startswith("text/event-stream"):
+                    should_try_read = False
+                elif content_type.startswith("application/json") or content_type.startswith("text/"):
                     should_try_read = True
 
             if should_try_read:
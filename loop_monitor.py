@@ -0,0 +1,155 @@
+'''
+事件循环延迟监控
+事件循环中执行同步阻塞代码（SDK同步调用、大对象序列化等）时，所有请求都会被推迟：
+监控协程按固定间隔休眠，实际唤醒时间与预期的差值即调度延迟，计入直方图；
+看门狗线程发现监控协程超过阈值未唤醒时，抓取事件循环线程当前的调用栈，定位阻塞的代码行（限频）
+'''
+import asyncio
+import bisect
+import logging
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from dataclasses import dataclass
+from typing import Deque, List, Optional
+from config import settings
+from schemas import LoopLagStatus, LoopLagBucket, LoopStall
+from utils import current_timestamp_ms
+
+
+logger = logging.getLogger(__name__)
+
+# 直方图桶上界（ms），最后一个桶为超过最大上界的延迟
+LAG_BUCKETS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000)
+
+
+# 一次超过阈值的阻塞
+@dataclass
+class Stall:
+    detected_at: int  # 看门狗发现阻塞的时间戳ms
+    stack: List[str]  # 发现阻塞时事件循环线程的调用栈（由外到内）
+    lag_ms: Optional[float] = None  # 阻塞结束后的总延迟
+
+
+class LoopMonitor:
+    """事件循环调度延迟直方图和阻塞调用栈抓取"""
+
+    def __init__(self):
+        self._task: Optional[asyncio.Task] = None
+        self._watchdog: Optional[threading.Thread] = None
+        self._stopped = threading.Event()
+        self._loop_thread_id: Optional[int] = None
+        self._last_tick = time.monotonic()  # 监控协程最近一次唤醒的时间（看门狗线程读取）
+        self._current: Optional[Stall] = None  # 进行中的阻塞（看门狗线程写入，监控协程结束）
+        self._last_capture = 0.0
+        self._lock = threading.Lock()
+        self.stalls: Deque[Stall] = deque(maxlen=settings.loop_lag_stalls)
+        self.buckets = [0] * (len(LAG_BUCKETS_MS) + 1)
+        self.samples = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.over_threshold = 0
+        self.suppressed = 0  # 因限频未抓取调用栈的阻塞次数
+
+    @property
+    def enabled(self) -> bool:
+        return self._task is not None
+
+    async def start(self) -> None:
+        if self._task is not None or settings.loop_lag_interval <= 0:
+            return
+        self._loop_thread_id = threading.get_ident()
+        self._last_tick = time.monotonic()
+        self._stopped.clear()
+        self._task = asyncio.create_task(self._monitor_loop())
+        self._watchdog = threading.Thread(target=self._watchdog_loop, name="loop-watchdog", daemon=True)
+        self._watchdog.start()
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        self._stopped.set()
+        if self._watchdog is not None:
+            self._watchdog.join(timeout=1)
+            self._watchdog = None
+
+    # ============================ 延迟测量 ============================
+
+    async def _monitor_loop(self) -> None:
+        interval = settings.loop_lag_interval
+        while True:
+            expected = time.monotonic() + interval
+            await asyncio.sleep(interval)
+            now = time.monotonic()
+            self._last_tick = now
+            self._observe(max(0.0, (now - expected) * 1000))
+
+    def _observe(self, lag_ms: float) -> None:
+        self.samples += 1
+        self.total_ms += lag_ms
+        self.max_ms = max(self.max_ms, lag_ms)
+        self.buckets[bisect.bisect_left(LAG_BUCKETS_MS, lag_ms)] += 1
+        if lag_ms >= settings.loop_lag_threshold * 1000:
+            self.over_threshold += 1
+        with self._lock:
+            stall, self._current = self._current, None
+        if stall is not None:
+            stall.lag_ms = lag_ms
+            if stall.stack:
+                logger.warning(f"事件循环阻塞 {lag_ms:.0f}ms，阻塞位置:\n{''.join(stall.stack[-3:])}")
+
+    # ============================ 调用栈抓取 ============================
+
+    def _watchdog_loop(self) -> None:
+        threshold = settings.loop_lag_threshold
+        while not self._stopped.wait(min(settings.loop_lag_interval, threshold) / 2):
+            # 监控协程应在 interval 后唤醒，超过 interval + threshold 未唤醒即事件循环被阻塞
+            blocked = time.monotonic() - self._last_tick - settings.loop_lag_interval
+            if blocked < threshold:
+                continue
+            with self._lock:
+                now = time.monotonic()
+                # 同一次阻塞只抓取一次；加锁后重新检查，避免监控协程刚刚唤醒
+                if self._current is not None or now - self._last_tick - settings.loop_lag_interval < threshold:
+                    continue
+                if now - self._last_capture < settings.loop_lag_capture_interval:
+                    self.suppressed += 1
+                    self._current = Stall(detected_at=current_timestamp_ms(), stack=[])
+                    continue
+                self._last_capture = now
+                stall = self._current = Stall(detected_at=current_timestamp_ms(), stack=self._capture_stack())
+            self.stalls.append(stall)
+
+    def _capture_stack(self) -> List[str]:
+        frame = sys._current_frames().get(self._loop_thread_id)
+        if frame is None:
+            return []
+        return traceback.format_stack(frame, limit=settings.loop_lag_stack_depth)
+
+    # ============================ 统计 ============================
+
+    def status(self) -> LoopLagStatus:
+        bounds = [float(b) for b in LAG_BUCKETS_MS] + [None]
+        return LoopLagStatus(
+            enabled=self.enabled,
+            interval_ms=settings.loop_lag_interval * 1000,
+            threshold_ms=settings.loop_lag_threshold * 1000,
+            samples=self.samples,
+            mean_ms=self.total_ms / self.samples if self.samples else None,
+            max_ms=self.max_ms,
+            over_threshold=self.over_threshold,
+            suppressed=self.suppressed,
+            histogram=[LoopLagBucket(le_ms=bound, count=count) for bound, count in zip(bounds, self.buckets)],
+            stalls=[LoopStall(detected_at=s.detected_at, lag_ms=s.lag_ms, stack=s.stack) for s in reversed(self.stalls)],
+        )
+
+
+# 事件循环延迟监控全局实例
+loop_monitor: LoopMonitor = LoopMonitor()
@@ -1,13 +1,42 @@
+from bootstrap import startup_timer  # 最先导入，作为启动耗时统计的起点
 import logging
+import time
 from typing import AsyncGenerator
 
-from fastapi import FastAPI
-from fastapi.middleware.cors import CORSMiddleware
-from drift_api import drift_router
-from meeting_api import meeting_router
-from config import settings
+with startup_timer.phase("import.fastapi"):
+    from fastapi import FastAPI, Request
+    from fastapi.middleware.cors import CORSMiddleware
+    from fastapi.responses import JSONResponse, ORJSONResponse, UJSONResponse
+with startup_timer.phase("import.config"):
+    from config import settings
+with startup_timer.phase("import.routers"):
+    from drift_api import drift_router
+    from meeting_api import meeting_router
+    from admin_api import admin_router
+    from record_api import record_router
+    from agent_api import agent_router
+    from rtm_api import rtm_router
+from media_allocator import media_allocator
+from endpoint_router import endpoint_router
+from vertc_client import rtc_client
+from drain import drain_controller
+from rts_client import rts_client
+from record_manager import record_manager
+from agent_manager import agent_manager
+from message_bus import message_bus
+from token_renewal import relay_token_renewer
+from task_ledger import task_ledger
+from session_registry import session_registry
+from reconciler import orphan_reconciler
+from loop_monitor import loop_monitor
+from profiler import ProfilerMiddleware
+from tracing import tracer
+from traffic_capture import traffic_capture
+from admission import AdmissionRejected
+from admin_auth import AdminForbidden
+from request_deadline import DeadlineExceeded
+from schemas import MessageType, ResponseMessageBase
 from log_mw import RequestLoggingMiddleware
-import uvicorn
 
 
 # 配置日志
@@ -19,6 +48,24 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+
+# 按配置选择响应JSON编码器，依赖库未安装时退回标准库 json
+def get_response_class() -> type[JSONResponse]:
+    if settings.response_class == "orjson":
+        try:
+            import orjson  # noqa: F401
+            return ORJSONResponse
+        except ImportError:
+            logger.warning("未安装 orjson，使用标准 JSONResponse")
+    elif settings.response_class == "ujson":
+        try:
+            import ujson  # noqa: F401
+            return UJSONResponse
+        except ImportError:
+            logger.warning("未安装 ujson，使用标准 JSONResponse")
+    return JSONResponse
+
+
 # 定义Lifespan事件
 async def lifespan(app: FastAPI) -> AsyncGenerator[None, None]:
     """应用生命周期事件"""
@@ -31,13 +78,86 @@ async def lifespan(app: FastAPI) -> AsyncGenerator[None, None]:
     
     # 启动心跳监控
     #await manager.start_heartbeat_monitor()
-    
+
+    # 监控事件循环调度延迟，定位阻塞事件循环的同步代码
+    await loop_monitor.start()
+
+    # 启动追踪 span 的批量导出
+    await tracer.start()
+
+    # 开启流量录制（capture_enabled）
+    await traffic_capture.start()
+
+    # 回放媒体任务日志，恢复崩溃前进行中的任务
+    with startup_timer.phase("replay.task_ledger"):
+        restored_tasks = task_ledger.replay()
+        session_registry.restore(restored_tasks)
+        # 恢复的输入流任务重新登记令牌续期（重启前的令牌过期时间未知，立即续期）
+        relay_token_renewer.restore(restored_tasks)
+    await task_ledger.start()
+
+    # 构造 Volc 客户端（导入 volcengine SDK、建立连接池），避免首个请求承担初始化耗时
+    rtc_client.get()
+
+    # 校验AI智能体配置（构建一次请求体），配置有误时不启动智能体
+    agent_manager.validate_config()
+
+    # 启动媒体节点健康探测
+    with startup_timer.phase("start.media_allocator"):
+        await media_allocator.start()
+
+    # 预热 Volc 接入点连接并启动延迟探测
+    with startup_timer.phase("start.endpoint_router"):
+        await endpoint_router.start()
+
+    # 创建 RTS 服务的共享连接池
+    await rts_client.start()
+
+    # 启动录制状态轮询调度
+    await record_manager.start()
+
+    # 启动实时消息发送队列
+    await message_bus.start()
+
+    # 启动在线媒体流输入令牌续期调度
+    await relay_token_renewer.start()
+
+    # 启动孤儿任务回收
+    await orphan_reconciler.start()
+
+    # 收到停机信号时立即开始拒绝新的加入请求
+    drain_controller.install_signal_handlers()
+
+    startup_timer.mark_ready()
     logger.info("应用启动完成")
+    logger.info(startup_timer.summary())
     
     yield  # 应用运行中
     
     # 关闭事件
     logger.info("应用正在关闭...")
+
+    # 停止孤儿任务回收，剩余任务由排空流程统一停止
+    await orphan_reconciler.stop()
+
+    # 排空：等待进行中的加入/离开操作，按配置停止剩余媒体任务（需在停止 Volc 接入点路由之前）
+    await drain_controller.drain()
+
+    # 发送队列中剩余的实时消息
+    await message_bus.stop()
+
+    # 停止媒体节点健康探测
+    await media_allocator.stop()
+    await endpoint_router.stop()
+    await rts_client.stop()
+    await record_manager.stop()
+    await relay_token_renewer.stop()
+
+    # 所有任务停止事件写入后关闭媒体任务日志
+    await task_ledger.stop()
+    await tracer.stop()
+    await traffic_capture.stop()
+    await loop_monitor.stop()
     
     # 关闭所有 WebSocket 连接
     #for connection_id in list(manager.active_connections.keys()):
@@ -45,10 +165,12 @@ async def lifespan(app: FastAPI) -> AsyncGenerator[None, None]:
     
     logger.info("应用已关闭")
 
+_create_app_start = time.perf_counter()
 app = FastAPI(
     title=settings.app_name,
     version=settings.app_version,
-    lifespan=lifespan
+    lifespan=lifespan,
+    default_response_class=get_response_class()
 )
 
 # 配置CORS
@@ -60,12 +182,44 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# 采样分析器的请求过滤
+app.add_middleware(ProfilerMiddleware)
+
 # 添加Log中间件
 app.add_middleware(RequestLoggingMiddleware)
 
 # 注册路由
 app.include_router(drift_router, prefix=settings.api_prefix, tags=["Drift Server"])
 app.include_router(meeting_router, prefix=settings.api_prefix, tags=["Meeting Management"])
+app.include_router(record_router, prefix=settings.api_prefix, tags=["Cloud Recording"])
+app.include_router(agent_router, prefix=settings.api_prefix, tags=["AI Agent"])
+app.include_router(rtm_router, prefix=settings.api_prefix, tags=["Real-time Messaging"])
+app.include_router(admin_router, prefix=settings.api_prefix, tags=["Admin"])
+
+
+# 准入控制拒绝的请求返回503，客户端按 Retry-After 重试
+@app.exception_handler(AdmissionRejected)
+async def admission_rejected_handler(request: Request, exc: AdmissionRejected):
+    content = ResponseMessageBase(type=MessageType.Overloaded, code=503, message=f"服务繁忙，请稍后重试: {exc}")
+    return JSONResponse(
+        status_code=503,
+        content=content.model_dump(),
+        headers={"Retry-After": str(settings.admission_retry_after)}
+    )
+
+# 无权访问运维接口返回403
+@app.exception_handler(AdminForbidden)
+async def admin_forbidden_handler(request: Request, exc: AdminForbidden):
+    content = ResponseMessageBase(type=MessageType.Forbidden, code=403, message=f"无权访问: {exc}")
+    return JSONResponse(status_code=403, content=content.model_dump())
+
+# 未被接口处理的截止时间超时返回504
+@app.exception_handler(DeadlineExceeded)
+async def deadline_exceeded_handler(request: Request, exc: DeadlineExceeded):
+    content = ResponseMessageBase(type=MessageType.DeadlineExceeded, code=504, message=str(exc))
+    return JSONResponse(status_code=504, content=content.model_dump())
+
+startup_timer.record("create_app", _create_app_start)
 
 # 处理根路径请求
 @app.get("/")
@@ -74,10 +228,5 @@ async def root():
 
 # 启动应用
 if __name__ == "__main__":
-    uvicorn.run(
-        "main:app",
-        host=settings.bind_addr,
-        port=settings.bind_port,
-        reload=settings.debug,
-        reload_dirs=["."],
-        log_level=log_level)
+    from server import serve
+    serve()
@@ -0,0 +1,178 @@
+'''
+媒体边缘节点分配
+上行（设备推流）和下行（合流转推）RTMP节点池，按 device_sn 做加权一致性哈希（Rendezvous Hashing），
+权重由周期性健康探测的连通性、RTT以及节点上已分配的设备数决定；分配结果记录在设备会话中保持粘性
+'''
+import asyncio
+import hashlib
+import logging
+import math
+import time
+from collections import Counter
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+from config import settings
+from session_registry import session_registry, DeviceSession
+from schemas import MediaNodeStatus
+
+
+logger = logging.getLogger(__name__)
+
+
+# 媒体节点
+@dataclass
+class MediaNode:
+    host: str
+    rtmp_port: int
+    rtsp_port: Optional[int] = None
+    healthy: bool = True
+    rtt_ms: Optional[float] = None  # 最近一次探测的连接耗时
+    failures: int = 0  # 连续探测失败次数
+
+    @property
+    def key(self) -> str:
+        return f"{self.host}:{self.rtmp_port}"
+
+    @staticmethod
+    def parse(spec: str) -> "MediaNode":
+        """解析节点配置，格式为 host:rtmp_port 或 host:rtmp_port:rtsp_port"""
+        parts = spec.strip().split(":")
+        if len(parts) not in (2, 3):
+            raise ValueError(f"媒体节点配置格式错误: {spec}")
+        rtsp_port = int(parts[2]) if len(parts) == 3 else None
+        return MediaNode(host=parts[0], rtmp_port=int(parts[1]), rtsp_port=rtsp_port)
+
+
+class MediaNodePool:
+    """同类媒体节点池"""
+
+    def __init__(self, name: str, nodes: List[MediaNode]):
+        self.name = name
+        self.nodes: Dict[str, MediaNode] = {node.key: node for node in nodes}
+
+    def weight(self, node: MediaNode, load: int) -> float:
+        """节点权重：不健康为0；已分配设备越多、RTT越高权重越低"""
+        if not node.healthy:
+            return 0.0
+        capacity = max(1, settings.media_node_capacity)
+        free_ratio = max(capacity - load, 1) / capacity
+        rtt_factor = 1.0 / (1.0 + (node.rtt_ms or 0.0) / 100.0)
+        return free_ratio * rtt_factor
+
+    def pick(self, device_sn: str, loads: Counter) -> MediaNode:
+        """加权一致性哈希选择节点，节点增减时只有少量设备会迁移"""
+        candidates = [(node, self.weight(node, loads[node.key])) for node in self.nodes.values()]
+        if not any(weight > 0 for _, weight in candidates):
+            # 所有节点都不健康时退化为不加权哈希，保证仍能分配
+            candidates = [(node, 1.0) for node, _ in candidates]
+
+        best_node, best_score = None, -math.inf
+        for node, weight in candidates:
+            if weight <= 0:
+                continue
+            digest = hashlib.md5(f"{device_sn}/{node.key}".encode("utf-8")).digest()
+            h = (int.from_bytes(digest[:8], "big") + 1) / (2 ** 64 + 1)  # 映射到 (0, 1)
+            score = -weight / math.log(h)
+            if score > best_score:
+                best_node, best_score = node, score
+        return best_node
+
+    def get(self, key: Optional[str]) -> Optional[MediaNode]:
+        return self.nodes.get(key) if key else None
+
+    async def probe(self) -> None:
+        """并发探测所有节点的 RTMP 端口连通性"""
+        await asyncio.gather(*[self._probe_node(node) for node in self.nodes.values()])
+
+    async def _probe_node(self, node: MediaNode) -> None:
+        start = time.perf_counter()
+        try:
+            _, writer = await asyncio.wait_for(
+                asyncio.open_connection(node.host, node.rtmp_port),
+                timeout=settings.media_probe_timeout
+            )
+            writer.close()
+            node.rtt_ms = (time.perf_counter() - start) * 1000
+            if not node.healthy:
+                logger.info(f"媒体节点恢复: {self.name} {node.key}")
+            node.healthy = True
+            node.failures = 0
+        except Exception as e:
+            node.failures += 1
+            if node.healthy and node.failures >= settings.media_probe_failures:
+                logger.warning(f"媒体节点不可用: {self.name} {node.key}: {str(e)}")
+                node.healthy = False
+
+
+class MediaAllocator:
+    """上下行媒体节点分配器"""
+
+    def __init__(self):
+        ingest = [MediaNode.parse(spec) for spec in settings.media_ingest_nodes] or [
+            MediaNode(host=settings.video_rtmp_host, rtmp_port=settings.video_rtmp_port)
+        ]
+        egress = [MediaNode.parse(spec) for spec in settings.media_egress_nodes] or [
+            MediaNode(host=settings.audio_rtmp_host, rtmp_port=settings.audio_rtmp_port, rtsp_port=settings.audio_rtsp_port)
+        ]
+        self.ingest = MediaNodePool("ingest", ingest)
+        self.egress = MediaNodePool("egress", egress)
+        self._probe_task: Optional[asyncio.Task] = None
+
+    def allocate(self, session: DeviceSession) -> Tuple[MediaNode, MediaNode]:
+        """为设备会话分配上下行节点，已分配且健康的节点保持不变"""
+        ingest = self.ingest.get(session.ingest_node)
+        egress = self.egress.get(session.egress_node)
+
+        if ingest is None or not ingest.healthy or egress is None or not egress.healthy:
+            sessions = [s for s in session_registry.all_sessions() if s is not session]
+            if ingest is None or not ingest.healthy:
+                ingest = self.ingest.pick(session.device_sn, Counter(s.ingest_node for s in sessions))
+            if egress is None or not egress.healthy:
+                egress = self.egress.pick(session.device_sn, Counter(s.egress_node for s in sessions))
+
+        session.ingest_node = ingest.key
+        session.egress_node = egress.key
+        return ingest, egress
+
+    def status(self) -> List[MediaNodeStatus]:
+        """节点状态及已分配的设备数"""
+        sessions = session_registry.all_sessions()
+        result = []
+        for pool, loads in ((self.ingest, Counter(s.ingest_node for s in sessions)),
+                            (self.egress, Counter(s.egress_node for s in sessions))):
+            for node in pool.nodes.values():
+                result.append(MediaNodeStatus(
+                    pool=pool.name,
+                    node=node.key,
+                    healthy=node.healthy,
+                    rtt_ms=node.rtt_ms,
+                    devices=loads[node.key],
+                    weight=pool.weight(node, loads[node.key]),
+                ))
+        return result
+
+    async def start(self) -> None:
+        """启动周期性健康探测"""
+        if self._probe_task is None:
+            self._probe_task = asyncio.create_task(self._probe_loop())
+
+    async def stop(self) -> None:
+        if self._probe_task is not None:
+            self._probe_task.cancel()
+            try:
+                await self._probe_task
+            except asyncio.CancelledError:
+                pass
+            self._probe_task = None
+
+    async def _probe_loop(self) -> None:
+        while True:
+            try:
+                await asyncio.gather(self.ingest.probe(), self.egress.probe())
+            except Exception as e:
+                logger.warning(f"媒体节点探测失败: {str(e)}")
+            await asyncio.sleep(settings.media_probe_interval)
+
+
+# 媒体节点分配器全局实例
+media_allocator: MediaAllocator = MediaAllocator()
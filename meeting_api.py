@@ -8,6 +8,11 @@ import httpx
 from fastapi import APIRouter
 from schemas import *
 from config import settings
+from task_manager import teardown_room
+from drain import drain_controller
+from admission import admit, EndpointClass
+from request_deadline import DeadlineExceeded, cap_timeout, deadline_expired, no_deadline
+from rts_client import rts_client
 
 logger = logging.getLogger(__name__)
 
@@ -15,7 +20,7 @@ meeting_router = APIRouter()
 
 
 # 创建 HTTP 客户端
-async def call_rts_service(method: str, endpoint: str, data: dict = None) -> dict:
+async def call_rts_service(method: str, endpoint: str, data: dict = None, hedge: bool = False) -> dict:
     """
     调用 RTS 服务的通用方法
 
@@ -23,6 +28,7 @@ async def call_rts_service(method: str, endpoint: str, data: dict = None) -> dic
         method: HTTP 方法 (GET/POST)
         endpoint: API 端点
         data: 请求数据
+        hedge: 是否允许对冲到其他 RTS 实例（仅用于只读查询）
 
     Returns:
         响应数据
@@ -31,31 +37,28 @@ async def call_rts_service(method: str, endpoint: str, data: dict = None) -> dic
 
     logger.info(f"调用RTS服务: {method} {url} 数据: {data}")
 
-    # 设置请求头
-    headers = {
-        "Content-Type": "application/json"
-    }
-
     try:
-        # 禁用代理，避免 localhost 请求被系统代理拦截
-        async with httpx.AsyncClient(timeout=10.0, trust_env=False) as client:
-            if method == "POST":
-                response = await client.post(url, json=data, headers=headers)
-            else:
-                response = await client.get(url, params=data, headers=headers)
-
-            response.raise_for_status()
-            return response.json()
+        # 超时不超过请求剩余时间
+        response = await rts_client.request(method, endpoint, data, timeout=cap_timeout(settings.rts_timeout),
+                                            hedge=hedge)
+        response.raise_for_status()
+        return response.json()
     except httpx.HTTPStatusError as e:
         logger.error(f"RTS服务返回错误 {e.response.status_code}: {e.response.text}")
         return {"code": e.response.status_code, "message": f"RTS服务错误: {e.response.text}"}
+    except (DeadlineExceeded, httpx.TimeoutException) as e:
+        if isinstance(e, DeadlineExceeded) or deadline_expired():
+            logger.warning(f"调用RTS服务超过请求截止时间: {method} {url}")
+            return {"code": 504, "message": "调用RTS服务超过请求截止时间"}
+        logger.error(f"调用RTS服务超时: {str(e)}")
+        return {"code": 500, "message": f"调用RTS服务失败: {str(e)}"}
     except Exception as e:
         logger.error(f"调用RTS服务失败: {str(e)}")
         return {"code": 500, "message": f"调用RTS服务失败: {str(e)}"}
 
 
 # 预定会议
-@meeting_router.post("meeting/book", response_model=BookMeetingResponse)
+@meeting_router.post("meeting/book", response_model=BookMeetingResponse, dependencies=[admit(EndpointClass.RTS)])
 async def book_meeting(request: BookMeetingRequest):
     """
     预定会议
@@ -96,7 +99,7 @@ async def book_meeting(request: BookMeetingRequest):
 
 
 # 取消会议
-@meeting_router.post("meeting/cancel", response_model=CancelMeetingResponse)
+@meeting_router.post("meeting/cancel", response_model=CancelMeetingResponse, dependencies=[admit(EndpointClass.RTS)])
 async def cancel_meeting(request: CancelMeetingRequest):
     """
     取消会议（只有主持人可以取消，且房间内没有人时才能取消）
@@ -124,6 +127,13 @@ async def cancel_meeting(request: CancelMeetingRequest):
                 message=error_msg
             )
 
+        # 会议取消成功后停止房间内残留的设备任务，避免继续计费（不受请求截止时间限制）
+        if result.get("code") == 200:
+            with drain_controller.track(), no_deadline():
+                summary = await teardown_room(request.room_id)
+            if summary.failed:
+                logger.error(f"取消会议后停止房间任务失败: {summary.failed}个")
+
         return CancelMeetingResponse(**result)
     except Exception as e:
         logger.error(f"取消会议失败: {e}")
@@ -135,7 +145,7 @@ async def cancel_meeting(request: CancelMeetingRequest):
 
 
 # 查询我的会议
-@meeting_router.post("meeting/get-my", response_model=GetMyMeetingsResponse)
+@meeting_router.post("meeting/get-my", response_model=GetMyMeetingsResponse, dependencies=[admit(EndpointClass.RTS)])
 async def get_my_meetings(request: GetMyMeetingsRequest):
     """
     查询用户作为主持人的所有会议
@@ -150,7 +160,8 @@ async def get_my_meetings(request: GetMyMeetingsRequest):
         result = await call_rts_service(
             "POST",
             "/meeting/get-my",
-            request.model_dump()
+            request.model_dump(),
+            hedge=True
         )
 
         # 检查 RTS 服务是否返回错误
@@ -176,7 +187,7 @@ async def get_my_meetings(request: GetMyMeetingsRequest):
 
 
 # 检查房间是否存在
-@meeting_router.post("/meeting/check-room", response_model=CheckRoomResponse)
+@meeting_router.post("/meeting/check-room", response_model=CheckRoomResponse, dependencies=[admit(EndpointClass.RTS)])
 async def check_room(request: CheckRoomRequest):
     """
     检查房间号是否存在
@@ -191,7 +202,8 @@ async def check_room(request: CheckRoomRequest):
         result = await call_rts_service(
             "POST",
             "/meeting/check-room",
-            request.model_dump()
+            request.model_dump(),
+            hedge=True
         )
 
         # 检查 RTS 服务是否返回错误
@@ -217,7 +229,7 @@ async def check_room(request: CheckRoomRequest):
 
 
 # 检查用户是否在房间中
-@meeting_router.post("/meeting/check-user-in-room", response_model=CheckUserInRoomResponse)
+@meeting_router.post("/meeting/check-user-in-room", response_model=CheckUserInRoomResponse, dependencies=[admit(EndpointClass.RTS)])
 async def check_user_in_room(request: CheckUserInRoomRequest):
     """
     检查用户是否在某个会议中
@@ -232,7 +244,8 @@ async def check_user_in_room(request: CheckUserInRoomRequest):
         result = await call_rts_service(
             "POST",
             "/meeting/check-user-in-room",
-            request.model_dump()
+            request.model_dump(),
+            hedge=True
         )
 
         # 检查 RTS 服务是否返回错误
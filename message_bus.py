@@ -0,0 +1,295 @@
+'''
+实时消息发送队列
+房间广播、房间内点对点、房间外点对点消息先进入按房间划分的队列，不直接调用 Volc 接口：
+相同合并键的状态更新只发送最新一条，发给多个用户的相同消息合并为一次 BatchSendRoomUnicast，
+队列达到消息数上限或缓冲时间到期时发送，所有消息接口共享QPS上限，并统计从入队到发送成功的延迟
+'''
+import asyncio
+import itertools
+import logging
+import time
+from collections import deque
+from dataclasses import dataclass
+from enum import StrEnum
+from typing import Deque, Dict, List, Optional
+from config import settings
+from vertc_client import rtc_client
+from schemas import LatencySummary, RtmBusStatus
+
+
+logger = logging.getLogger(__name__)
+
+# 房间外点对点消息使用的队列
+UNICAST_QUEUE = ""
+
+# Volc OpenAPI 限流错误码
+THROTTLE_ERRORS = {"RequestLimitExceeded", "Throttling", "TooManyRequests"}
+
+
+# 消息类型
+class MessageKind(StrEnum):
+    Broadcast = "broadcast"  # 房间内广播（SendBroadcast）
+    RoomUnicast = "room_unicast"  # 房间内点对点（SendRoomUnicast / BatchSendRoomUnicast）
+    Unicast = "unicast"  # 房间外点对点（SendUnicast）
+
+
+class MessageBusFull(Exception):
+    """待发送消息数已达上限"""
+
+
+# 待发送消息
+@dataclass
+class OutboundMessage:
+    kind: MessageKind
+    room_id: str
+    from_user: str
+    to_user: str  # 广播时为空
+    message: str
+    binary: bool = False
+    enqueued_at: float = 0.0  # 入队时间（time.monotonic）
+
+
+# 单个房间的待发送队列
+class RoomQueue:
+    def __init__(self, room_id: str):
+        self.room_id = room_id
+        # 合并键 -> 消息，相同合并键的新消息替换旧消息；无合并键的消息使用唯一序号
+        self.messages: Dict[tuple, OutboundMessage] = {}
+        self.timer: Optional[asyncio.TimerHandle] = None
+        self.queued = False  # 已在待发送房间队列中
+        self.sending = False  # 正在发送（同一房间同时只有一个发送者，保证消息顺序）
+
+
+class MessageBus:
+    """按房间缓冲、合并和限速发送实时消息（仅在事件循环线程中访问）"""
+
+    def __init__(self):
+        self._rooms: Dict[str, RoomQueue] = {}
+        self._ready: Optional[asyncio.Queue] = None  # 待发送的房间ID
+        self._workers: List[asyncio.Task] = []
+        self._seq = itertools.count()
+        self._tokens = 0.0
+        self._tokens_updated = time.monotonic()
+        self._latency_ms: Deque[float] = deque(maxlen=settings.rtm_latency_samples)
+        self.pending = 0
+        self.enqueued = 0
+        self.coalesced = 0  # 被新消息替换而未发送的消息数
+        self.delivered = 0
+        self.failed = 0
+        self.api_calls = 0
+        self.batched_calls = 0  # BatchSendRoomUnicast 调用次数
+        self.throttled = 0
+
+    # ============================ 入队 ============================
+
+    def broadcast(self, room_id: str, from_user: str, message: str, binary: bool = False,
+                  key: Optional[str] = None) -> None:
+        """房间内广播，key 相同的未发送消息只保留最新一条"""
+        self._publish(OutboundMessage(MessageKind.Broadcast, room_id, from_user, "", message, binary), key)
+
+    def room_unicast(self, room_id: str, from_user: str, to_users: List[str], message: str, binary: bool = False,
+                     key: Optional[str] = None) -> None:
+        """向房间内的多个用户发送相同消息，key 按接收用户分别合并"""
+        for to_user in to_users:
+            self._publish(OutboundMessage(MessageKind.RoomUnicast, room_id, from_user, to_user, message, binary), key)
+
+    def unicast(self, from_user: str, to_users: List[str], message: str, binary: bool = False,
+                key: Optional[str] = None) -> None:
+        """房间外点对点消息"""
+        for to_user in to_users:
+            self._publish(OutboundMessage(MessageKind.Unicast, UNICAST_QUEUE, from_user, to_user, message, binary), key)
+
+    def _publish(self, message: OutboundMessage, key: Optional[str]) -> None:
+        if self.pending >= settings.rtm_max_pending:
+            raise MessageBusFull(f"待发送消息数已达上限 {settings.rtm_max_pending}")
+
+        message.enqueued_at = time.monotonic()
+        room = self._rooms.get(message.room_id)
+        if room is None:
+            room = self._rooms[message.room_id] = RoomQueue(message.room_id)
+
+        slot = (message.kind, message.to_user, key) if key is not None else (next(self._seq),)
+        if slot in room.messages:
+            # 被替换的状态更新不再发送，新消息排到队尾
+            del room.messages[slot]
+            self.coalesced += 1
+            self.pending -= 1
+        room.messages[slot] = message
+        self.enqueued += 1
+        self.pending += 1
+
+        if len(room.messages) >= settings.rtm_flush_size:
+            self._mark_ready(room)
+        elif room.timer is None and not room.queued and self._ready is not None:
+            room.timer = asyncio.get_running_loop().call_later(settings.rtm_flush_interval, self._mark_ready, room)
+
+    def _mark_ready(self, room: RoomQueue) -> None:
+        if room.timer is not None:
+            room.timer.cancel()
+            room.timer = None
+        if not room.queued and not room.sending and self._ready is not None:
+            room.queued = True
+            self._ready.put_nowait(room.room_id)
+
+    # ============================ 发送 ============================
+
+    async def start(self) -> None:
+        if not self._workers:
+            self._ready = asyncio.Queue()
+            self._workers = [asyncio.create_task(self._worker()) for _ in range(max(1, settings.rtm_concurrency))]
+            # 启动前入队的消息
+            for room in self._rooms.values():
+                if room.messages:
+                    self._mark_ready(room)
+
+    async def stop(self) -> None:
+        """发送剩余消息（最长 rtm_shutdown_flush_timeout 秒）后停止"""
+        if not self._workers:
+            return
+
+        async def flush_all() -> None:
+            while self.pending > 0:
+                for room in list(self._rooms.values()):
+                    if room.messages:
+                        self._mark_ready(room)
+                await self._ready.join()
+
+        try:
+            await asyncio.wait_for(flush_all(), timeout=settings.rtm_shutdown_flush_timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"停止时仍有 {self.pending} 条消息未发送")
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    async def _worker(self) -> None:
+        while True:
+            room_id = await self._ready.get()
+            room = self._rooms.get(room_id)
+            try:
+                if room is not None:
+                    room.queued = False
+                    room.sending = True
+                    messages = list(room.messages.values())
+                    room.messages = {}
+                    try:
+                        await self._send_room(messages)
+                    finally:
+                        room.sending = False
+                    if room.messages:
+                        # 发送期间新入队的消息
+                        if len(room.messages) >= settings.rtm_flush_size:
+                            self._mark_ready(room)
+                        elif room.timer is None:
+                            room.timer = asyncio.get_running_loop().call_later(
+                                settings.rtm_flush_interval, self._mark_ready, room
+                            )
+                    elif room.timer is None:
+                        self._rooms.pop(room_id, None)
+            except Exception as e:
+                logger.warning(f"发送房间 {room_id} 的消息失败: {str(e)}")
+            finally:
+                self._ready.task_done()
+
+    async def _send_room(self, messages: List[OutboundMessage]) -> None:
+        """按入队顺序发送，连续入队的、发给多个用户的相同房间内消息合并为一次批量发送
+
+        只合并相邻的消息：中间有其他消息（如广播）时分开发送，否则接收者会先收到较新的消息再收到较旧的状态
+        """
+        groups: List[List[OutboundMessage]] = []
+        for message in messages:
+            last = groups[-1][-1] if groups else None
+            if settings.rtm_batch_unicast and message.kind == MessageKind.RoomUnicast and last is not None \
+                    and last.kind == MessageKind.RoomUnicast \
+                    and (last.from_user, last.message, last.binary) == (message.from_user, message.message, message.binary):
+                groups[-1].append(message)
+            else:
+                groups.append([message])
+
+        for group in groups:
+            for start in range(0, len(group), max(1, settings.rtm_batch_max_users)):
+                await self._send(group[start:start + settings.rtm_batch_max_users])
+
+    async def _send(self, batch: List[OutboundMessage]) -> None:
+        first = batch[0]
+        if first.kind == MessageKind.Broadcast:
+            func, kwargs = rtc_client.send_broadcast, {"room_id": first.room_id}
+        elif first.kind == MessageKind.Unicast:
+            func, kwargs = rtc_client.send_unicast, {"to_user": first.to_user}
+        elif len(batch) == 1:
+            func, kwargs = rtc_client.send_room_unicast, {"room_id": first.room_id, "to_user": first.to_user}
+        else:
+            func = rtc_client.batch_send_room_unicast
+            kwargs = {"room_id": first.room_id, "to_users": [m.to_user for m in batch]}
+
+        last_error = None
+        for attempt in range(max(0, settings.rtm_retries) + 1):
+            await self._acquire_token()
+            self.api_calls += 1
+            try:
+                # SDK为同步调用，放到线程池中执行
+                response = await asyncio.to_thread(
+                    func, from_user=first.from_user, message=first.message, binary=first.binary, **kwargs
+                )
+                error = response.get("ResponseMetadata", {}).get("Error") if isinstance(response, dict) else None
+                if error:
+                    if error.get("Code") in THROTTLE_ERRORS:
+                        # 被限流：清空令牌，等待令牌恢复后重试
+                        self.throttled += 1
+                        self._tokens = min(self._tokens, 0.0) - 1
+                    raise Exception(f"{error.get('Code')}: {error.get('Message')}")
+            except Exception as e:
+                last_error = e
+                continue
+
+            if len(batch) > 1:
+                self.batched_calls += 1
+            now = time.monotonic()
+            for message in batch:
+                self._latency_ms.append((now - message.enqueued_at) * 1000)
+            self.delivered += len(batch)
+            self.pending -= len(batch)
+            return
+
+        logger.warning(f"发送{first.kind}消息失败（房间 {first.room_id}，{len(batch)}个接收者）: {str(last_error)}")
+        self.failed += len(batch)
+        self.pending -= len(batch)
+
+    async def _acquire_token(self) -> None:
+        """令牌桶限制所有消息接口的总QPS"""
+        qps = settings.rtm_qps
+        while True:
+            now = time.monotonic()
+            self._tokens = min(max(1.0, qps), self._tokens + (now - self._tokens_updated) * qps)
+            self._tokens_updated = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return
+            await asyncio.sleep((1 - self._tokens) / qps)
+
+    # ============================ 统计 ============================
+
+    def status(self) -> RtmBusStatus:
+        samples = sorted(self._latency_ms)
+
+        def percentile(p: float) -> Optional[float]:
+            return samples[min(len(samples) - 1, int(len(samples) * p))] if samples else None
+
+        return RtmBusStatus(
+            rooms=sum(1 for room in self._rooms.values() if room.messages),
+            pending=self.pending,
+            enqueued=self.enqueued,
+            coalesced=self.coalesced,
+            delivered=self.delivered,
+            failed=self.failed,
+            api_calls=self.api_calls,
+            batched_calls=self.batched_calls,
+            throttled=self.throttled,
+            latency=LatencySummary(count=len(samples), p50_ms=percentile(0.50), p95_ms=percentile(0.95),
+                                   max_ms=samples[-1] if samples else None),
+        )
+
+
+# 实时消息发送队列全局实例
+message_bus: MessageBus = MessageBus()
@@ -0,0 +1,125 @@
+'''
+孤儿任务回收
+设备掉线且未调用 /camera/leave 时，其合流转推、在线媒体流输入等任务会一直运行并计费：
+后台定期从设备会话登记表中取出失联（心跳超时，或从未上报心跳且加入房间已超过最长时间）的设备，
+限制并发和QPS停止其任务；每轮只检查判定时间已到的设备并限制每轮数量，开销不随设备总数增长
+
+只回收本 worker 持有的会话：会话由本 worker 的加入房间请求创建，或从本 worker 自己的媒体任务日志恢复
+（日志记录所属的 worker 序号，与当前序号不一致的日志不恢复），不会回收其他 worker 启动的任务
+'''
+import asyncio
+import logging
+import time
+from collections import Counter
+from typing import Optional
+from config import settings
+from session_registry import session_registry
+from task_manager import stop_session_tasks
+from agent_manager import agent_manager
+from drain import drain_controller
+from schemas import ReconcilerStatus
+from utils import current_timestamp_ms
+
+
+logger = logging.getLogger(__name__)
+
+
+class OrphanReconciler:
+    """定期回收失联设备的媒体任务（仅在事件循环线程中访问）"""
+
+    def __init__(self):
+        self._task: Optional[asyncio.Task] = None
+        self._tokens = 0.0
+        self._tokens_updated = time.monotonic()
+        self.rounds = 0
+        self.stale_sessions = 0  # 判定为失联的设备数
+        self.reclaimed_sessions = 0  # 任务全部停止的失联设备数
+        self.reclaimed_tasks: Counter = Counter()  # 任务类型 -> 停止的任务数
+        self.failed_tasks = 0  # 停止失败、等待下一轮重试的任务数
+        self.last_round_ms: Optional[float] = None
+
+    async def start(self) -> None:
+        if self._task is None and settings.reconcile_interval > 0:
+            self._task = asyncio.create_task(self._reconcile_loop())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        self._task = None
+
+    async def _reconcile_loop(self) -> None:
+        while True:
+            await asyncio.sleep(settings.reconcile_interval)
+            # 停机排空时由排空流程停止所有任务
+            if drain_controller.draining:
+                continue
+            try:
+                await self.reconcile()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"孤儿任务回收失败: {str(e)}")
+
+    async def reconcile(self) -> int:
+        """回收一轮失联设备的任务，返回本轮处理的设备数"""
+        start = time.perf_counter()
+        sessions = session_registry.stale_sessions(current_timestamp_ms(), settings.reconcile_batch_size)
+        self.rounds += 1
+        if sessions:
+            self.stale_sessions += len(sessions)
+            for session in sessions:
+                logger.warning(f"设备 {session.device_sn} 已失联（房间 {session.room_id}），回收任务: {list(session.tasks)}")
+
+            with drain_controller.track():
+                results = await stop_session_tasks(
+                    sessions, concurrency=settings.reconcile_concurrency, limiter=self._acquire_token
+                )
+
+            for result in results:
+                if result.success:
+                    self.reclaimed_tasks[result.task_type] += 1
+                else:
+                    self.failed_tasks += 1
+
+            retry_at = current_timestamp_ms() + int(settings.reconcile_interval * 1000)
+            for session in sessions:
+                if session_registry.get_session(session.device_sn) is session and session.tasks:
+                    # 停止失败的任务保留在登记表中，下一轮重试
+                    session_registry.watch(session.device_sn, retry_at)
+                    continue
+                if session_registry.get_session(session.device_sn) is session:
+                    session_registry.close_session(session.device_sn)
+                agent_manager.release(session.device_sn)
+                self.reclaimed_sessions += 1
+        self.last_round_ms = (time.perf_counter() - start) * 1000
+        return len(sessions)
+
+    async def _acquire_token(self) -> None:
+        """令牌桶限制停止任务的总QPS，避免回收大量任务时挤占正常请求的 Volc 配额"""
+        qps = settings.reconcile_qps
+        while True:
+            now = time.monotonic()
+            self._tokens = min(max(1.0, qps), self._tokens + (now - self._tokens_updated) * qps)
+            self._tokens_updated = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return
+            await asyncio.sleep((1 - self._tokens) / qps)
+
+    def status(self) -> ReconcilerStatus:
+        return ReconcilerStatus(
+            rounds=self.rounds,
+            stale_sessions=self.stale_sessions,
+            reclaimed_sessions=self.reclaimed_sessions,
+            reclaimed_tasks=dict(self.reclaimed_tasks),
+            failed_tasks=self.failed_tasks,
+            last_round_ms=self.last_round_ms,
+        )
+
+
+# 孤儿任务回收全局实例
+orphan_reconciler: OrphanReconciler = OrphanReconciler()
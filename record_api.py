@@ -0,0 +1,82 @@
+'''
+云端录制API
+按房间或设备启动/停止云端录制，查询缓存的录制状态，订阅录制完成事件
+'''
+import logging
+import uuid
+from typing import Optional
+from fastapi import APIRouter
+from fastapi.responses import StreamingResponse
+from record_manager import record_manager
+from session_registry import session_registry
+from drain import drain_controller
+from admission import admit, EndpointClass
+from schemas import *
+
+
+logger = logging.getLogger(__name__)
+
+record_router = APIRouter()
+
+
+# 开始云端录制接口
+@record_router.post("/record/start", response_model=RecordTaskMessage, dependencies=[admit(EndpointClass.Volc)])
+async def start_record(data: StartRecordRequest):
+    user_id = None
+    if data.device_sn:
+        # 设备录制：只录制该设备的流，并登记到设备会话，设备离开房间时一并停止
+        session = session_registry.get_session(data.device_sn)
+        if session is None or session.room_id != data.room_id:
+            return RecordTaskMessage(type=MessageType.StartRecord, code=404, message="设备未加入该房间")
+        user_id = session.user_id
+
+    task_id = data.task_id or data.device_sn or uuid.uuid4().hex
+    try:
+        with drain_controller.track():
+            status = await record_manager.start_record(data.room_id, task_id, data.device_sn, user_id)
+        return RecordTaskMessage(type=MessageType.StartRecord, data=status)
+
+    except Exception as e:
+        logger.error(f"处理StartRecord请求失败: {str(e)}")
+        return RecordTaskMessage(type=MessageType.StartRecord, code=500, message=f"启动录制失败: {str(e)}")
+
+
+# 停止云端录制接口
+@record_router.post("/record/stop", response_model=RecordTaskMessage, dependencies=[admit(EndpointClass.Volc)])
+async def stop_record(data: StopRecordRequest):
+    try:
+        with drain_controller.track():
+            status = await record_manager.stop_record(data.room_id, data.task_id)
+        return RecordTaskMessage(type=MessageType.StopRecord, data=status)
+
+    except Exception as e:
+        logger.error(f"处理StopRecord请求失败: {str(e)}")
+        return RecordTaskMessage(type=MessageType.StopRecord, code=500, message=f"停止录制失败: {str(e)}")
+
+
+# 查询录制状态接口（读取轮询调度缓存的状态）
+@record_router.get("/record/tasks/{task_id}", response_model=RecordTaskMessage, dependencies=[admit(EndpointClass.Local)])
+async def get_record_task(task_id: str):
+    status = record_manager.get(task_id)
+    if status is None:
+        return RecordTaskMessage(type=MessageType.RecordTask, code=404, message="录制任务不存在")
+
+    return RecordTaskMessage(type=MessageType.RecordTask, data=status)
+
+
+# 订阅录制完成事件接口（SSE），可按房间过滤
+@record_router.get("/record/events", dependencies=[admit(EndpointClass.Local, streaming=True)])
+async def stream_record_events(room_id: Optional[str] = None):
+
+    async def event_stream():
+        async for status in record_manager.subscribe(room_id):
+            if status is None:
+                yield ": keepalive\n\n"
+            else:
+                yield f"event: {status.status}\ndata: {status.model_dump_json()}\n\n"
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
@@ -0,0 +1,356 @@
+'''
+云端录制管理
+启动/停止录制任务，并由单个调度器统一轮询所有进行中的录制任务状态（GetRecordTask）：
+按到期时间分批轮询、令牌桶限制总QPS，刚启动或状态变化后快速轮询，状态稳定后逐步放慢；
+查询接口读取缓存的状态，录制结束时推送完成事件
+'''
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from collections import Counter
+from dataclasses import dataclass
+from enum import StrEnum
+from typing import AsyncGenerator, Dict, List, Optional, Tuple
+from config import settings
+from vertc_client import rtc_client
+from session_registry import session_registry, TaskType
+from schemas import RecordTaskStatus, RecordPollerStatus
+from utils import current_timestamp_ms
+
+
+logger = logging.getLogger(__name__)
+
+
+# 录制任务状态
+class RecordStatus(StrEnum):
+    Pending = "pending"  # 已调用 StartRecord，尚未开始录制
+    Recording = "recording"
+    Stopping = "stopping"  # 已调用 StopRecord，等待录制文件生成
+    Completed = "completed"
+    Failed = "failed"
+
+
+# GetRecordTask 返回的任务状态: 0 未知异常, 1 未开始, 2 运行中, 3 已结束, 4 任务不存在
+VOLC_RECORD_STATUS: Dict[int, RecordStatus] = {
+    0: RecordStatus.Failed,
+    1: RecordStatus.Pending,
+    2: RecordStatus.Recording,
+    3: RecordStatus.Completed,
+    4: RecordStatus.Failed,
+}
+
+# 录制异常结束的 StopReason
+FAILED_STOP_REASONS = {"StartTaskFailed", "UnknownReason"}
+
+# Volc OpenAPI 限流错误码
+THROTTLE_ERRORS = {"RequestLimitExceeded", "Throttling", "TooManyRequests"}
+
+
+def _response_error(response) -> Optional[dict]:
+    return response.get("ResponseMetadata", {}).get("Error") if isinstance(response, dict) else None
+
+
+# 单个录制任务的轮询状态
+@dataclass
+class RecordEntry:
+    status: RecordTaskStatus
+    interval: float  # 当前轮询间隔（秒）
+    due: float = 0.0  # 下次轮询时间（time.monotonic）
+    errors: int = 0  # 连续轮询失败次数
+
+
+class RecordManager:
+    """录制任务登记和状态轮询调度（仅在事件循环线程中访问）"""
+
+    def __init__(self):
+        self._entries: Dict[str, RecordEntry] = {}  # task_id -> 录制任务
+        self._schedule: List[Tuple[float, int, str]] = []  # (下次轮询时间, 序号, task_id) 小顶堆
+        self._seq = itertools.count()
+        self._subscribers: List[Tuple[Optional[str], asyncio.Queue]] = []  # (房间ID过滤, 队列)
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._tokens = 0.0
+        self._tokens_updated = time.monotonic()
+        self._paused_until = 0.0  # 被 Volc 限流后暂停轮询到该时间
+        self.polls = 0
+        self.poll_errors = 0
+        self.throttled = 0
+        self.batches = 0
+
+    # ============================ 录制任务 ============================
+
+    async def start_record(self, room_id: str, task_id: str, device_sn: Optional[str] = None,
+                           user_id: Optional[str] = None) -> RecordTaskStatus:
+        """启动录制（SDK为同步调用，放到线程池中执行），成功后加入轮询调度"""
+        self._expire_entries()
+        response = await asyncio.to_thread(
+            rtc_client.start_record, room_id=room_id, task_id=task_id, user_id=user_id
+        )
+        error = _response_error(response)
+        if error:
+            raise Exception(f"{error.get('Code')}: {error.get('Message')}")
+        logger.info(f"启动录制 {task_id} (房间 {room_id}): {response}")
+
+        entry = RecordEntry(
+            status=RecordTaskStatus(task_id=task_id, room_id=room_id, device_sn=device_sn, status=RecordStatus.Pending),
+            interval=settings.record_poll_min_interval,
+        )
+        self._entries[task_id] = entry
+        if device_sn:
+            session_registry.add_task(device_sn, TaskType.Record, task_id)
+        self._schedule_poll(entry)
+        return entry.status
+
+    async def stop_record(self, room_id: str, task_id: str) -> RecordTaskStatus:
+        """停止录制，之后快速轮询直到录制文件生成"""
+        response = await asyncio.to_thread(rtc_client.stop_record, room_id=room_id, task_id=task_id)
+        error = _response_error(response)
+        if error:
+            raise Exception(f"{error.get('Code')}: {error.get('Message')}")
+        logger.info(f"停止录制 {task_id} (房间 {room_id}): {response}")
+
+        entry = self._entries.get(task_id)
+        if entry is None:
+            # 本实例未登记（如服务重启后），登记后轮询直到结束
+            entry = RecordEntry(
+                status=RecordTaskStatus(task_id=task_id, room_id=room_id, status=RecordStatus.Stopping),
+                interval=settings.record_poll_min_interval,
+            )
+            self._entries[task_id] = entry
+        self.mark_stopping(task_id)
+        if entry.status.device_sn:
+            self._remove_session_task(entry.status)
+        return entry.status
+
+    def mark_stopping(self, task_id: str) -> None:
+        """录制已停止（如设备离开房间时由任务管理停止），恢复快速轮询"""
+        entry = self._entries.get(task_id)
+        if entry is None or self._is_finished(entry.status):
+            return
+        entry.status.status = RecordStatus.Stopping
+        entry.status.updated_at = current_timestamp_ms()
+        entry.interval = settings.record_poll_min_interval
+        self._schedule_poll(entry)
+
+    def get(self, task_id: str) -> Optional[RecordTaskStatus]:
+        """读取缓存的录制状态，不调用 Volc 接口"""
+        entry = self._entries.get(task_id)
+        return entry.status if entry is not None else None
+
+    async def subscribe(self, room_id: Optional[str] = None) -> AsyncGenerator[Optional[RecordTaskStatus], None]:
+        """订阅录制完成事件（可按房间过滤），长时间无事件时产出 None 作为心跳"""
+        queue: asyncio.Queue = asyncio.Queue()
+        subscriber = (room_id, queue)
+        self._subscribers.append(subscriber)
+        try:
+            while True:
+                try:
+                    yield await asyncio.wait_for(queue.get(), timeout=settings.join_job_keepalive_seconds)
+                except asyncio.TimeoutError:
+                    yield None  # 心跳
+        finally:
+            self._subscribers.remove(subscriber)
+
+    # ============================ 轮询调度 ============================
+
+    async def start(self) -> None:
+        if self._task is None:
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._poll_loop())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        self._task = None
+
+    def _schedule_poll(self, entry: RecordEntry) -> None:
+        entry.due = time.monotonic() + entry.interval
+        heapq.heappush(self._schedule, (entry.due, next(self._seq), entry.status.task_id))
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    def _refill_tokens(self) -> None:
+        now = time.monotonic()
+        qps = settings.record_poll_qps
+        self._tokens = min(max(1.0, qps), self._tokens + (now - self._tokens_updated) * qps)
+        self._tokens_updated = now
+
+    @staticmethod
+    def _batch_tokens() -> float:
+        """每批需要的令牌数：限流时按批而不是逐个轮询"""
+        qps = settings.record_poll_qps
+        return max(1.0, min(settings.record_poll_batch_size, qps * settings.record_poll_batch_window, qps))
+
+    def _next_wait(self) -> Optional[float]:
+        """距下一批轮询的等待时间，无待轮询任务时返回 None"""
+        if not self._schedule:
+            return None
+        now = time.monotonic()
+        wait = max(self._schedule[0][0] - now, self._paused_until - now)
+        self._refill_tokens()
+        needed = self._batch_tokens()
+        if self._tokens < needed:
+            wait = max(wait, (needed - self._tokens) / settings.record_poll_qps)
+        return max(0.0, wait)
+
+    def _take_due(self) -> List[RecordEntry]:
+        """取出已到期和即将到期（batch_window 内）的任务，数量不超过批大小和可用令牌数"""
+        self._refill_tokens()
+        limit = min(settings.record_poll_batch_size, int(self._tokens))
+        horizon = time.monotonic() + settings.record_poll_batch_window
+        batch: List[RecordEntry] = []
+        while self._schedule and len(batch) < limit and self._schedule[0][0] <= horizon:
+            due, _, task_id = heapq.heappop(self._schedule)
+            entry = self._entries.get(task_id)
+            # 跳过已结束或已重新调度的过期条目
+            if entry is None or entry.due != due or self._is_finished(entry.status):
+                continue
+            batch.append(entry)
+        self._tokens -= len(batch)
+        return batch
+
+    async def _poll_loop(self) -> None:
+        while True:
+            try:
+                wait = self._next_wait()
+                if wait is None or wait > 0:
+                    self._wakeup.clear()
+                    try:
+                        await asyncio.wait_for(self._wakeup.wait(), timeout=wait)
+                    except asyncio.TimeoutError:
+                        pass
+                    continue
+
+                batch = self._take_due()
+                if batch:
+                    self.batches += 1
+                    await self._poll_batch(batch)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"录制状态轮询失败: {str(e)}")
+                await asyncio.sleep(settings.record_poll_min_interval)
+
+    async def _poll_batch(self, batch: List[RecordEntry]) -> None:
+        semaphore = asyncio.Semaphore(max(1, settings.record_poll_concurrency))
+
+        async def _poll(entry: RecordEntry) -> None:
+            async with semaphore:
+                await self._poll(entry)
+
+        await asyncio.gather(*[_poll(entry) for entry in batch])
+
+    async def _poll(self, entry: RecordEntry) -> None:
+        status = entry.status
+        self.polls += 1
+        try:
+            response = await asyncio.to_thread(
+                rtc_client.get_record_task, room_id=status.room_id, task_id=status.task_id
+            )
+            error = _response_error(response)
+            if error:
+                if error.get("Code") in THROTTLE_ERRORS:
+                    # 被限流：所有任务暂停轮询一段时间，本任务稍后重试
+                    self.throttled += 1
+                    self._paused_until = time.monotonic() + settings.record_poll_throttle_backoff
+                    self._schedule_poll(entry)
+                    return
+                raise Exception(f"{error.get('Code')}: {error.get('Message')}")
+        except Exception as e:
+            self.poll_errors += 1
+            entry.errors += 1
+            status.error = str(e)
+            if entry.errors >= settings.record_poll_max_errors:
+                logger.warning(f"录制 {status.task_id} 连续{entry.errors}次查询失败，停止轮询: {str(e)}")
+                self._finish(entry, RecordStatus.Failed)
+                return
+            entry.interval = min(settings.record_poll_max_interval, entry.interval * settings.record_poll_backoff)
+            self._schedule_poll(entry)
+            return
+
+        entry.errors = 0
+        status.error = None
+        status.polls += 1
+        status.polled_at = current_timestamp_ms()
+        record_task = (response.get("Result") or {}).get("RecordTask") or {}
+        volc_status = record_task.get("Status")
+        status.volc_status = volc_status
+        status.stop_reason = record_task.get("StopReason") or None
+        status.files = record_task.get("RecordFileList") or []
+
+        new_status = VOLC_RECORD_STATUS.get(volc_status, status.status)
+        if new_status == RecordStatus.Completed and status.stop_reason in FAILED_STOP_REASONS:
+            new_status = RecordStatus.Failed
+        if new_status in (RecordStatus.Pending, RecordStatus.Recording) and status.status == RecordStatus.Stopping:
+            new_status = RecordStatus.Stopping  # 停止请求已发出，服务端状态尚未更新
+
+        if new_status in (RecordStatus.Completed, RecordStatus.Failed):
+            self._finish(entry, new_status)
+            return
+
+        # 状态变化后恢复快速轮询，状态不变则逐步放慢
+        if new_status != status.status:
+            status.status = new_status
+            status.updated_at = current_timestamp_ms()
+            entry.interval = settings.record_poll_min_interval
+        else:
+            entry.interval = min(settings.record_poll_max_interval, entry.interval * settings.record_poll_backoff)
+        self._schedule_poll(entry)
+
+    def _finish(self, entry: RecordEntry, result: RecordStatus) -> None:
+        """录制结束：从轮询调度中移除（保留缓存），推送完成事件"""
+        status = entry.status
+        status.status = result
+        status.updated_at = current_timestamp_ms()
+        if status.device_sn:
+            self._remove_session_task(status)
+        logger.info(f"录制 {status.task_id} (房间 {status.room_id}) 结束: {result}, 文件{len(status.files)}个")
+
+        for room_id, queue in self._subscribers:
+            if room_id is None or room_id == status.room_id:
+                queue.put_nowait(status.model_copy(deep=True))
+
+    @staticmethod
+    def _remove_session_task(status: RecordTaskStatus) -> None:
+        """录制已停止或自行结束时从设备会话中移除，避免离开房间时重复停止"""
+        session = session_registry.get_session(status.device_sn)
+        task = session.tasks.get(TaskType.Record) if session is not None else None
+        if task is not None and task.task_id == status.task_id:
+            session_registry.remove_task(status.device_sn, TaskType.Record)
+
+    @staticmethod
+    def _is_finished(status: RecordTaskStatus) -> bool:
+        return status.status in (RecordStatus.Completed, RecordStatus.Failed)
+
+    def _expire_entries(self) -> None:
+        deadline = current_timestamp_ms() - settings.record_cache_ttl_seconds * 1000
+        expired = [task_id for task_id, entry in self._entries.items()
+                   if self._is_finished(entry.status) and entry.status.updated_at < deadline]
+        for task_id in expired:
+            self._entries.pop(task_id, None)
+
+    def status(self) -> RecordPollerStatus:
+        active = [entry for entry in self._entries.values() if not self._is_finished(entry.status)]
+        wait = self._next_wait()
+        return RecordPollerStatus(
+            active=len(active),
+            cached=len(self._entries),
+            by_status=dict(Counter(entry.status.status for entry in self._entries.values())),
+            polls=self.polls,
+            poll_errors=self.poll_errors,
+            throttled=self.throttled,
+            batches=self.batches,
+            avg_batch_size=self.polls / self.batches if self.batches else 0.0,
+            next_poll_in_ms=wait * 1000 if wait is not None else None,
+            subscribers=len(self._subscribers),
+        )
+
+
+# 录制管理全局实例
+record_manager: RecordManager = RecordManager()
@@ -0,0 +1,71 @@
+'''
+请求截止时间
+每个请求的截止时间取自请求头 X-Request-Timeout-Ms（客户端还愿意等待的毫秒数）或接口类别的默认值，
+保存在 contextvar 中，随 asyncio 任务和 asyncio.to_thread 传递到每一次上游调用；
+上游调用只使用剩余的时间，截止时间已过则不再发起新的调用
+'''
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional
+from config import settings
+
+
+DEADLINE_HEADER = "X-Request-Timeout-Ms"
+
+# 截止时间（time.monotonic），None 表示不限制
+_deadline: ContextVar[Optional[float]] = ContextVar("request_deadline", default=None)
+
+
+class DeadlineExceeded(Exception):
+    """请求已超过截止时间"""
+
+
+def parse_timeout_header(value: Optional[str], default: float) -> float:
+    """解析请求头中的超时（毫秒），返回秒；无效时使用默认值，并限制在 request_timeout_max 以内"""
+    try:
+        timeout = float(value) / 1000 if value else default
+    except ValueError:
+        timeout = default
+    return min(max(timeout, 0.0), settings.request_timeout_max)
+
+
+def set_deadline(timeout: float) -> None:
+    _deadline.set(time.monotonic() + timeout)
+
+
+def remaining_time() -> Optional[float]:
+    """距截止时间的剩余秒数，未设置截止时间时返回 None"""
+    deadline = _deadline.get()
+    return None if deadline is None else deadline - time.monotonic()
+
+
+def deadline_expired() -> bool:
+    remaining = remaining_time()
+    return remaining is not None and remaining <= 0
+
+
+def check_deadline(step: str = "") -> None:
+    """截止时间已过则抛出 DeadlineExceeded，在每个上游调用步骤之前调用"""
+    if deadline_expired():
+        raise DeadlineExceeded(f"{step} 已超过请求截止时间" if step else "已超过请求截止时间")
+
+
+def cap_timeout(timeout: float) -> float:
+    """上游调用的超时不超过剩余时间"""
+    remaining = remaining_time()
+    if remaining is None:
+        return timeout
+    if remaining <= 0:
+        raise DeadlineExceeded("已超过请求截止时间")
+    return min(timeout, remaining)
+
+
+@contextmanager
+def no_deadline():
+    """在不受请求截止时间限制的上下文中执行（如后台任务、超时后的清理）"""
+    token = _deadline.set(None)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
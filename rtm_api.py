@@ -0,0 +1,40 @@
+'''
+实时消息API
+供 RTS 等内部服务发送房间状态通知，消息进入发送队列合并、批量、限速发送
+'''
+import logging
+from fastapi import APIRouter, Depends, Response
+from message_bus import message_bus, MessageBusFull
+from admin_auth import require_admin
+from admission import admit, EndpointClass
+from config import settings
+from schemas import *
+
+
+logger = logging.getLogger(__name__)
+
+rtm_router = APIRouter()
+
+
+# 发送实时消息接口：指定房间时广播（无接收者）或房间内点对点，否则房间外点对点
+# 消息以任意 from_user_id 发出，只允许内部服务调用（与运维接口相同的鉴权）
+@rtm_router.post("/rtm/send", response_model=RtmSendMessage,
+                 dependencies=[Depends(require_admin), admit(EndpointClass.Local)])
+async def send_rtm_message(data: RtmSendRequest, response: Response):
+    if not data.room_id and not data.to_user_ids:
+        return RtmSendMessage(type=MessageType.RtmSend, code=400, message="房间外点对点消息需要指定接收者")
+
+    try:
+        if data.room_id and not data.to_user_ids:
+            message_bus.broadcast(data.room_id, data.from_user_id, data.message, data.binary, data.key)
+        elif data.room_id:
+            message_bus.room_unicast(data.room_id, data.from_user_id, data.to_user_ids, data.message, data.binary, data.key)
+        else:
+            message_bus.unicast(data.from_user_id, data.to_user_ids, data.message, data.binary, data.key)
+    except MessageBusFull as e:
+        logger.warning(f"实时消息入队失败: {str(e)}")
+        response.status_code = 503
+        response.headers["Retry-After"] = str(settings.admission_retry_after)
+        return RtmSendMessage(type=MessageType.RtmSend, code=503, message=str(e))
+
+    return RtmSendMessage(type=MessageType.RtmSend, data=RtmSendResponse(queued=len(data.to_user_ids) or 1))
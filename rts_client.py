@@ -0,0 +1,172 @@
+'''
+RTS 服务客户端
+使用共享的长连接客户端调用 jusi_meet_rts；只读查询可开启对冲请求：
+主实例在观测到的响应耗时分位数（默认 p95）内未响应时，向另一个 RTS 实例发出相同请求，先返回者胜出，另一个取消，
+对冲请求数受预算限制（不超过请求数的一定比例）
+'''
+import asyncio
+import itertools
+import logging
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Deque, Dict, List, Optional
+import httpx
+from config import settings
+from tracing import tracer, current_span, SpanKind
+from schemas import RtsHedgeStatus
+
+
+logger = logging.getLogger(__name__)
+
+# 样本数少于该值时使用初始对冲延迟
+MIN_SAMPLES = 20
+# 每新增多少个样本重新计算一次分位数
+RECOMPUTE_INTERVAL = 16
+
+
+# 单个接口的延迟统计和对冲计数
+@dataclass
+class EndpointStats:
+    samples: Deque[float] = field(default_factory=lambda: deque(maxlen=256))  # 最近的响应耗时（秒）
+    percentile: Optional[float] = None  # 缓存的分位数（秒）
+    pending_samples: int = 0
+    requests: int = 0
+    hedged: int = 0
+    hedge_wins: int = 0  # 对冲请求先返回的次数
+    budget_exhausted: int = 0  # 达到对冲延迟但预算不足未对冲的次数
+
+    def record(self, elapsed: float) -> None:
+        self.samples.append(elapsed)
+        self.pending_samples += 1
+        if self.percentile is None or self.pending_samples >= RECOMPUTE_INTERVAL:
+            ordered = sorted(self.samples)
+            self.percentile = ordered[min(len(ordered) - 1, int(len(ordered) * settings.rts_hedge_percentile))]
+            self.pending_samples = 0
+
+    def hedge_delay(self) -> float:
+        if len(self.samples) < MIN_SAMPLES or self.percentile is None:
+            return settings.rts_hedge_initial_delay
+        return max(settings.rts_hedge_min_delay, self.percentile)
+
+
+class RtsClient:
+    """调用 RTS 服务，只读查询可对冲到其他实例"""
+
+    def __init__(self):
+        self.primary_url = settings.rts_service_url
+        self.hedge_urls: List[str] = list(settings.rts_hedge_urls)
+        self._hedge_targets = itertools.cycle(self.hedge_urls) if self.hedge_urls else None
+        self.stats: Dict[str, EndpointStats] = {}
+        self._budget = 0.0  # 可用的对冲次数
+        self._client: Optional[httpx.AsyncClient] = None
+
+    async def start(self) -> None:
+        if self._client is None:
+            # 禁用代理，避免 localhost 请求被系统代理拦截
+            self._client = httpx.AsyncClient(trust_env=False)
+
+    async def stop(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    @property
+    def hedging_enabled(self) -> bool:
+        return bool(self.hedge_urls) and settings.rts_hedge_budget > 0
+
+    async def request(self, method: str, endpoint: str, data: Optional[dict], timeout: float,
+                      hedge: bool = False) -> httpx.Response:
+        """发送请求，hedge=True 时仅用于幂等的只读查询"""
+        with tracer.span(f"rts {endpoint}", SpanKind.Client, **{"http.method": method, "rts.hedge": hedge}):
+            return await self._request(method, endpoint, data, timeout, hedge)
+
+    async def _request(self, method: str, endpoint: str, data: Optional[dict], timeout: float,
+                       hedge: bool) -> httpx.Response:
+        stats = self.stats.setdefault(endpoint, EndpointStats())
+        stats.requests += 1
+        if not (hedge and self.hedging_enabled):
+            return await self._send(stats, self.primary_url, method, endpoint, data, timeout, record=True)
+
+        self._budget = min(settings.rts_hedge_burst, self._budget + settings.rts_hedge_budget)
+        start = time.perf_counter()
+        primary = asyncio.create_task(
+            self._send(stats, self.primary_url, method, endpoint, data, timeout, record=True)
+        )
+        pending = {primary}
+        try:
+            done, pending = await asyncio.wait(pending, timeout=stats.hedge_delay())
+            if done:
+                return primary.result()
+
+            if self._budget < 1:
+                stats.budget_exhausted += 1
+                return await primary
+
+            self._budget -= 1
+            stats.hedged += 1
+            remaining = max(0.001, timeout - (time.perf_counter() - start))
+            secondary = asyncio.create_task(
+                self._send(stats, next(self._hedge_targets), method, endpoint, data, remaining)
+            )
+            pending.add(secondary)
+
+            while True:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                # 先成功返回者胜出；一方异常时等待另一方，都失败时抛出异常
+                succeeded = [task for task in done if task.exception() is None]
+                if succeeded:
+                    if succeeded[0] is secondary:
+                        stats.hedge_wins += 1
+                        span = current_span()
+                        if span is not None:
+                            span.set("rts.hedge_won", True)
+                    return succeeded[0].result()
+                if not pending:
+                    return done.pop().result()
+        finally:
+            # 取消未完成的请求（败者，或调用方被取消时的所有请求）
+            for task in pending:
+                task.cancel()
+
+    async def _send(self, stats: EndpointStats, base_url: str, method: str, endpoint: str,
+                    data: Optional[dict], timeout: float, record: bool = False) -> httpx.Response:
+        url = f"{base_url}{settings.api_prefix}{endpoint}"
+        headers = {"Content-Type": "application/json"}
+        tracer.inject(headers)
+        start = time.perf_counter()
+        try:
+            if self._client is None:
+                # 未在 lifespan 中启动（如脚本直接调用）时使用临时客户端
+                async with httpx.AsyncClient(trust_env=False) as client:
+                    return await self._do_send(client, method, url, data, headers, timeout)
+            return await self._do_send(self._client, method, url, data, headers, timeout)
+        finally:
+            # 只统计主实例的耗时；被取消的请求记录取消时的耗时，避免分位数因对冲而偏低
+            if record:
+                stats.record(time.perf_counter() - start)
+
+    @staticmethod
+    async def _do_send(client: httpx.AsyncClient, method: str, url: str, data: Optional[dict],
+                       headers: dict, timeout: float) -> httpx.Response:
+        if method == "POST":
+            return await client.post(url, json=data, headers=headers, timeout=timeout)
+        return await client.get(url, params=data, headers=headers, timeout=timeout)
+
+    def status(self) -> List[RtsHedgeStatus]:
+        return [
+            RtsHedgeStatus(
+                endpoint=endpoint,
+                requests=stats.requests,
+                hedged=stats.hedged,
+                hedge_wins=stats.hedge_wins,
+                budget_exhausted=stats.budget_exhausted,
+                percentile_ms=stats.percentile * 1000 if stats.percentile is not None else None,
+                hedge_delay_ms=stats.hedge_delay() * 1000,
+            )
+            for endpoint, stats in self.stats.items()
+        ]
+
+
+# RTS 服务客户端全局实例
+rts_client: RtsClient = RtsClient()
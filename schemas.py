@@ -1,13 +1,42 @@
 import time
 from enum import StrEnum
-from pydantic import BaseModel, Field
-from typing import Optional, List, Dict, Any
+from pydantic import BaseModel, Field, field_serializer
+from typing import Optional, List, Dict, Any, Generic, TypeVar
 from utils import current_timestamp_ms
 
 # 事件类型枚举
 class MessageType(StrEnum):
     CameraJoinRoom = "CameraJoinRoom"
     CameraLeaveRoom = "CameraLeaveRoom"
+    RoomTeardown = "RoomTeardown"
+    CameraJoinJob = "CameraJoinJob"
+    MediaNodes = "MediaNodes"
+    VolcEndpoints = "VolcEndpoints"
+    StartupReport = "StartupReport"
+    Drain = "Drain"
+    Admission = "Admission"
+    Overloaded = "Overloaded"
+    Forbidden = "Forbidden"
+    DeadlineExceeded = "DeadlineExceeded"
+    RtsHedging = "RtsHedging"
+    StartRecord = "StartRecord"
+    StopRecord = "StopRecord"
+    RecordTask = "RecordTask"
+    RecordPoller = "RecordPoller"
+    AgentActivate = "AgentActivate"
+    AgentEvent = "AgentEvent"
+    AgentTimeline = "AgentTimeline"
+    AgentReport = "AgentReport"
+    RtmSend = "RtmSend"
+    RtmBus = "RtmBus"
+    RelayToken = "RelayToken"
+    TaskLedger = "TaskLedger"
+    CameraHeartbeat = "CameraHeartbeat"
+    Reconciler = "Reconciler"
+    LoopLag = "LoopLag"
+    Profile = "Profile"
+    Tracing = "Tracing"
+    TrafficCapture = "TrafficCapture"
 
 # 响应消息模型
 class ResponseMessageBase(BaseModel):
@@ -18,16 +47,53 @@ class ResponseMessageBase(BaseModel):
     data: Optional[Any] = {}
 
 
+DataT = TypeVar("DataT")
+
+# 带类型的响应消息模型，data 类型确定后可使用编译好的序列化器，避免按 Any 逐个推断类型
+# 没有数据时（如错误响应）与 ResponseMessageBase 一样输出 {}，保持设备端已有的响应格式
+class ResponseMessage(ResponseMessageBase, Generic[DataT]):
+    data: Optional[DataT] = None
+
+    @field_serializer("data", mode="wrap")
+    def _serialize_data(self, data: Optional[DataT], handler):
+        return {} if data is None else handler(data)
+
+
 # 相机加入房间请求
 class CameraJoinRequest(BaseModel):
     user_id: str = Field(description="用户ID")
     room_id: str = Field(description="房间ID")
     device_sn: str = Field(description="设备序列号")
+    async_mode: bool = Field(default=False, description="异步模式：立即返回任务ID，进度通过轮询或SSE获取")
 
 # 相机加入房间响应
 class CameraJoinResponse(BaseModel):
     rtmp_url: str = Field(description="RTMP URL")
     rtsp_url: str = Field(description="RTSP URL")
+    job_id: Optional[str] = Field(default=None, description="异步模式下的任务ID")
+    agent_status: Optional[str] = Field(default=None, description="AI智能体状态: prepared/started/failed，未启用时为空")
+
+CameraJoinMessage = ResponseMessage[CameraJoinResponse]
+
+# 异步加入房间任务的单个步骤
+class JoinJobStep(BaseModel):
+    name: str = Field(description="步骤名称")
+    message: str = Field(default="ok", description="步骤说明")
+    timestamp: int = Field(default_factory=lambda: current_timestamp_ms())  # 时间戳ms
+
+# 异步加入房间任务状态
+class JoinJobStatus(BaseModel):
+    job_id: str = Field(description="任务ID")
+    device_sn: str = Field(description="设备序列号")
+    room_id: str = Field(description="房间ID")
+    status: str = Field(description="任务状态: pending/running/succeeded/failed")
+    steps: List[JoinJobStep] = Field(default_factory=list)
+    result: Optional[CameraJoinResponse] = None
+    error: Optional[str] = None
+    created_at: int = Field(default_factory=lambda: current_timestamp_ms())  # 时间戳ms
+    updated_at: int = Field(default_factory=lambda: current_timestamp_ms())  # 时间戳ms
+
+JoinJobMessage = ResponseMessage[JoinJobStatus]
 
 
 # 相机离开房间请求
@@ -40,6 +106,376 @@ class CameraLeaveRequest(BaseModel):
 class CameraLeaveResponse(BaseModel):
     pass
 
+CameraLeaveMessage = ResponseMessage[CameraLeaveResponse]
+
+
+# 相机心跳请求
+class CameraHeartbeatRequest(BaseModel):
+    device_sn: str = Field(description="设备序列号")
+
+# 相机心跳响应
+class CameraHeartbeatResponse(BaseModel):
+    room_id: str = Field(description="设备所在房间ID")
+
+CameraHeartbeatMessage = ResponseMessage[CameraHeartbeatResponse]
+
+
+# 停止房间任务请求
+class RoomTeardownRequest(BaseModel):
+    room_id: str = Field(description="房间ID")
+
+# 单个任务的停止结果
+class TaskStopResult(BaseModel):
+    device_sn: str = Field(description="设备序列号")
+    task_type: str = Field(description="任务类型")
+    task_id: str = Field(description="任务ID")
+    success: bool = Field(description="是否停止成功")
+    attempts: int = Field(description="尝试次数")
+    error: Optional[str] = Field(default=None, description="最后一次失败原因")
+
+# 停止房间任务响应
+class RoomTeardownResponse(BaseModel):
+    room_id: str = Field(description="房间ID")
+    total: int = Field(description="任务总数")
+    stopped: int = Field(description="停止成功的任务数")
+    failed: int = Field(description="停止失败的任务数")
+    elapsed_ms: int = Field(description="耗时ms")
+    tasks: List[TaskStopResult] = Field(default_factory=list)
+
+RoomTeardownMessage = ResponseMessage[RoomTeardownResponse]
+
+
+# 开始云端录制请求
+class StartRecordRequest(BaseModel):
+    room_id: str = Field(description="房间ID")
+    device_sn: Optional[str] = Field(default=None, description="设备序列号，指定时只录制该设备的流，设备离开房间时自动停止录制")
+    task_id: Optional[str] = Field(default=None, description="录制任务ID，默认为设备序列号，未指定设备时随机生成")
+
+# 停止云端录制请求
+class StopRecordRequest(BaseModel):
+    room_id: str = Field(description="房间ID")
+    task_id: str = Field(description="录制任务ID")
+
+# 云端录制任务状态（轮询调度缓存的最近一次查询结果）
+class RecordTaskStatus(BaseModel):
+    task_id: str = Field(description="录制任务ID")
+    room_id: str = Field(description="房间ID")
+    device_sn: Optional[str] = Field(default=None, description="设备序列号")
+    status: str = Field(description="录制状态: pending/recording/stopping/completed/failed")
+    volc_status: Optional[int] = Field(default=None, description="GetRecordTask 返回的任务状态")
+    stop_reason: Optional[str] = Field(default=None, description="录制结束原因")
+    files: List[Dict[str, Any]] = Field(default_factory=list, description="录制文件列表（RecordFileList）")
+    error: Optional[str] = Field(default=None, description="最近一次查询失败原因")
+    polls: int = Field(default=0, description="查询次数")
+    polled_at: Optional[int] = Field(default=None, description="最近一次查询成功的时间戳ms")
+    created_at: int = Field(default_factory=lambda: current_timestamp_ms())  # 时间戳ms
+    updated_at: int = Field(default_factory=lambda: current_timestamp_ms())  # 时间戳ms
+
+RecordTaskMessage = ResponseMessage[RecordTaskStatus]
+
+
+# 启动AI智能体请求（lazy 模式下设备检测到首次说话时调用）
+class AgentActivateRequest(BaseModel):
+    device_sn: str = Field(description="设备序列号")
+
+# 上报AI智能体事件请求
+class AgentEventRequest(BaseModel):
+    device_sn: str = Field(description="设备序列号")
+    event: str = Field(description="事件: ready（智能体进房）/welcome（欢迎词开始播放）")
+
+# AI智能体启动时间线（时间戳ms，各耗时相对 requested_at）
+class AgentTimeline(BaseModel):
+    device_sn: str = Field(description="设备序列号")
+    room_id: str = Field(description="房间ID")
+    kind: str = Field(description="智能体类型: voice/video")
+    mode: str = Field(description="启动方式: concurrent/lazy")
+    status: str = Field(description="状态: prepared/starting/started/ready/failed/stopped")
+    error: Optional[str] = Field(default=None, description="失败原因")
+    prepare_ms: float = Field(default=0.0, description="构建并校验请求体耗时ms")
+    prepared_at: int = Field(default_factory=lambda: current_timestamp_ms())  # 时间戳ms
+    requested_at: Optional[int] = Field(default=None, description="开始启动的时间戳ms")
+    started_at: Optional[int] = Field(default=None, description="启动接口返回的时间戳ms")
+    ready_at: Optional[int] = Field(default=None, description="智能体进房的时间戳ms")
+    welcome_at: Optional[int] = Field(default=None, description="欢迎词开始播放的时间戳ms")
+    start_ms: Optional[int] = Field(default=None, description="启动耗时ms")
+    ready_ms: Optional[int] = Field(default=None, description="到智能体进房的耗时ms")
+    welcome_ms: Optional[int] = Field(default=None, description="到欢迎词开始播放的耗时ms（首次响应时间）")
+
+AgentTimelineMessage = ResponseMessage[AgentTimeline]
+
+
+# 发送实时消息请求
+class RtmSendRequest(BaseModel):
+    room_id: Optional[str] = Field(default=None, description="房间ID，为空时发送房间外点对点消息")
+    from_user_id: str = Field(description="发送者用户ID")
+    to_user_ids: List[str] = Field(default_factory=list, description="接收者用户ID，房间内为空时广播")
+    message: str = Field(description="消息内容")
+    binary: bool = Field(default=False, description="是否为二进制消息（base64编码）")
+    key: Optional[str] = Field(default=None, description="合并键：未发送的相同合并键消息只发送最新一条，用于状态更新")
+
+# 发送实时消息响应
+class RtmSendResponse(BaseModel):
+    queued: int = Field(description="入队的消息数")
+
+RtmSendMessage = ResponseMessage[RtmSendResponse]
+
+
+# 媒体节点状态
+class MediaNodeStatus(BaseModel):
+    pool: str = Field(description="节点池: ingest/egress")
+    node: str = Field(description="节点地址")
+    healthy: bool = Field(description="是否健康")
+    rtt_ms: Optional[float] = Field(default=None, description="最近一次探测耗时ms")
+    devices: int = Field(description="本进程分配到该节点的设备数")
+    weight: float = Field(description="当前分配权重")
+
+MediaNodesMessage = ResponseMessage[List[MediaNodeStatus]]
+
+
+# Volc 接入点连接池统计
+class VolcPoolStats(BaseModel):
+    pool_size: int = Field(description="连接池大小")
+    created: int = Field(description="累计建立的连接数")
+    requests: int = Field(description="累计请求数")
+    idle: int = Field(description="当前空闲连接数")
+    warmups: int = Field(description="预热/保活请求数")
+    last_warmup_ms: Optional[float] = Field(default=None, description="最近一次预热耗时ms")
+
+# Volc 接入点状态
+class VolcEndpointStatus(BaseModel):
+    endpoint: str = Field(description="接入点 host@region")
+    healthy: bool = Field(description="是否健康")
+    probe_rtt_ms: Optional[float] = Field(default=None, description="探测建连耗时ms（滑动平均）")
+    call_latency_ms: Optional[float] = Field(default=None, description="调用耗时ms（滑动平均）")
+    calls: int = Field(description="调用次数")
+    errors: int = Field(description="失败次数")
+    pool: Optional[VolcPoolStats] = Field(default=None, description="连接池统计")
+
+VolcEndpointsMessage = ResponseMessage[List[VolcEndpointStatus]]
+
+
+# 启动阶段耗时
+class StartupPhase(BaseModel):
+    name: str = Field(description="阶段名称，如 import.routers、init.rtc_client、start.endpoint_router")
+    offset_ms: float = Field(description="相对启动起点的开始时间ms")
+    elapsed_ms: float = Field(description="耗时ms")
+
+# 启动耗时报告
+class StartupReport(BaseModel):
+    ready: bool = Field(description="是否已启动完成")
+    total_ms: float = Field(description="从启动起点到启动完成的耗时ms")
+    phases: List[StartupPhase] = Field(default_factory=list)
+
+StartupReportMessage = ResponseMessage[StartupReport]
+
+
+# 停机排空结果
+class DrainReport(BaseModel):
+    inflight: int = Field(description="开始排空时进行中的操作数")
+    inflight_remaining: int = Field(description="等待超时后仍未完成的操作数")
+    timed_out: bool = Field(description="等待进行中的操作是否超时")
+    sessions: int = Field(description="剩余设备会话数")
+    tasks: int = Field(description="剩余任务数")
+    stopped: int = Field(description="停止成功的任务数")
+    failed: int = Field(description="停止失败的任务数")
+    left_running: int = Field(description="按配置保留运行的任务数")
+    elapsed_ms: int = Field(description="排空耗时ms")
+
+# 停机排空状态
+class DrainStatus(BaseModel):
+    draining: bool = Field(description="是否正在排空（拒绝新的加入房间请求）")
+    inflight: int = Field(description="进行中的加入/离开等操作数")
+    report: Optional[DrainReport] = Field(default=None, description="排空结果，排空完成后才有")
+
+DrainStatusMessage = ResponseMessage[DrainStatus]
+
+
+# 接口类别准入状态
+class AdmissionStatus(BaseModel):
+    endpoint_class: str = Field(description="接口类别 volc/rts/local")
+    concurrency: int = Field(description="并发上限")
+    queue_size: int = Field(description="队列长度上限")
+    max_wait: float = Field(description="最长排队时间（秒）")
+    active: int = Field(description="处理中的请求数")
+    waiting: int = Field(description="排队中的请求数")
+    peak_waiting: int = Field(description="排队请求数峰值")
+    admitted: int = Field(description="已准入的请求数")
+    shed_queue_full: int = Field(description="因队列已满拒绝的请求数")
+    shed_timeout: int = Field(description="因排队超时拒绝的请求数")
+    avg_wait_ms: float = Field(description="已准入请求的平均排队时间ms")
+
+AdmissionMessage = ResponseMessage[List[AdmissionStatus]]
+
+
+# RTS 接口对冲统计
+class RtsHedgeStatus(BaseModel):
+    endpoint: str = Field(description="RTS 接口")
+    requests: int = Field(description="请求数")
+    hedged: int = Field(description="发出对冲请求的次数")
+    hedge_wins: int = Field(description="对冲请求先返回的次数")
+    budget_exhausted: int = Field(description="因对冲预算不足未对冲的次数")
+    percentile_ms: Optional[float] = Field(default=None, description="最近响应耗时的分位数ms（rts_hedge_percentile）")
+    hedge_delay_ms: float = Field(description="当前对冲等待时间ms")
+
+RtsHedgeMessage = ResponseMessage[List[RtsHedgeStatus]]
+
+
+# 录制状态轮询调度统计
+class RecordPollerStatus(BaseModel):
+    active: int = Field(description="轮询中的录制任务数")
+    cached: int = Field(description="缓存的录制任务数（含已结束）")
+    by_status: Dict[str, int] = Field(description="各状态的录制任务数")
+    polls: int = Field(description="GetRecordTask 调用次数")
+    poll_errors: int = Field(description="查询失败次数")
+    throttled: int = Field(description="被限流次数")
+    batches: int = Field(description="轮询批数")
+    avg_batch_size: float = Field(description="平均每批查询数")
+    next_poll_in_ms: Optional[float] = Field(default=None, description="距下一批轮询的时间ms")
+    subscribers: int = Field(description="完成事件订阅数")
+
+RecordPollerMessage = ResponseMessage[RecordPollerStatus]
+
+
+# 耗时分布
+class LatencySummary(BaseModel):
+    count: int = Field(description="样本数")
+    p50_ms: Optional[float] = None
+    p95_ms: Optional[float] = None
+    max_ms: Optional[float] = None
+
+# AI智能体统计
+class AgentReport(BaseModel):
+    mode: str = Field(description="启动方式: off/concurrent/lazy")
+    kind: str = Field(description="智能体类型: voice/video")
+    enabled: bool = Field(description="是否启用")
+    error: Optional[str] = Field(default=None, description="配置校验失败原因")
+    agents: int = Field(description="设备智能体数")
+    by_status: Dict[str, int] = Field(description="各状态的智能体数")
+    start_ms: LatencySummary = Field(description="启动耗时")
+    ready_ms: LatencySummary = Field(description="到智能体进房的耗时")
+    welcome_ms: LatencySummary = Field(description="到欢迎词开始播放的耗时")
+
+AgentReportMessage = ResponseMessage[AgentReport]
+
+
+# 实时消息发送队列统计
+class RtmBusStatus(BaseModel):
+    rooms: int = Field(description="有待发送消息的房间数")
+    pending: int = Field(description="待发送消息数")
+    enqueued: int = Field(description="入队消息数")
+    coalesced: int = Field(description="被新状态替换而未发送的消息数")
+    delivered: int = Field(description="发送成功的消息数")
+    failed: int = Field(description="发送失败的消息数")
+    api_calls: int = Field(description="消息接口调用次数")
+    batched_calls: int = Field(description="批量发送调用次数")
+    throttled: int = Field(description="被限流次数")
+    latency: LatencySummary = Field(description="从入队到发送成功的延迟")
+
+RtmBusMessage = ResponseMessage[RtmBusStatus]
+
+
+# 在线媒体流输入令牌续期统计
+class RelayTokenStatus(BaseModel):
+    method: str = Field(description="续期方式: update/restart")
+    tracked: int = Field(description="登记续期的输入流任务数")
+    next_renew_in_s: Optional[float] = Field(None, description="距最近一次计划续期的时间（秒）")
+    soonest_expire_in_s: Optional[float] = Field(None, description="距最早过期令牌的时间（秒）")
+    renewed: int = Field(description="续期成功次数")
+    failed: int = Field(description="续期失败次数")
+    expired: int = Field(description="续期失败直到令牌过期的任务数")
+    batches: int = Field(description="续期批次数")
+
+RelayTokenMessage = ResponseMessage[RelayTokenStatus]
+
+
+# 媒体任务日志统计
+class TaskLedgerStatus(BaseModel):
+    enabled: bool = Field(description="是否记录日志")
+    path: str = Field(description="日志文件路径")
+    live_tasks: int = Field(description="进行中的任务数")
+    file_bytes: int = Field(description="已落盘的日志大小")
+    live_bytes: int = Field(description="进行中任务记录的大小（压缩后的日志大小）")
+    pending_bytes: int = Field(description="待提交的记录大小")
+    appended: int = Field(description="追加的记录数")
+    commits: int = Field(description="组提交（fsync）次数")
+    compactions: int = Field(description="压缩次数")
+    replayed: int = Field(description="启动时回放恢复的任务数")
+    replay_ms: Optional[float] = Field(None, description="启动时回放耗时")
+    truncated_bytes: int = Field(description="回放时截断的不完整尾部字节数")
+
+TaskLedgerMessage = ResponseMessage[TaskLedgerStatus]
+
+
+# 孤儿任务回收统计
+class ReconcilerStatus(BaseModel):
+    rounds: int = Field(description="已执行的回收轮数")
+    stale_sessions: int = Field(description="判定为失联的设备数")
+    reclaimed_sessions: int = Field(description="任务全部停止的失联设备数")
+    reclaimed_tasks: Dict[str, int] = Field(description="按任务类型统计的已停止任务数")
+    failed_tasks: int = Field(description="停止失败、等待下一轮重试的任务数")
+    last_round_ms: Optional[float] = Field(None, description="最近一轮耗时")
+
+ReconcilerMessage = ResponseMessage[ReconcilerStatus]
+
+
+# 事件循环调度延迟直方图的桶
+class LoopLagBucket(BaseModel):
+    le_ms: Optional[float] = Field(None, description="桶上界，为空时表示超过最大上界")
+    count: int = Field(description="落在该桶的样本数")
+
+# 事件循环阻塞记录
+class LoopStall(BaseModel):
+    detected_at: int = Field(description="发现阻塞的时间戳ms")
+    lag_ms: Optional[float] = Field(None, description="阻塞总时长，阻塞未结束时为空")
+    stack: List[str] = Field(description="发现阻塞时事件循环线程的调用栈（由外到内）")
+
+# 事件循环延迟统计
+class LoopLagStatus(BaseModel):
+    enabled: bool = Field(description="是否监控")
+    interval_ms: float = Field(description="测量间隔")
+    threshold_ms: float = Field(description="阻塞阈值")
+    samples: int = Field(description="样本数")
+    mean_ms: Optional[float] = Field(None, description="平均调度延迟")
+    max_ms: float = Field(description="最大调度延迟")
+    over_threshold: int = Field(description="超过阈值的样本数")
+    suppressed: int = Field(description="因限频未抓取调用栈的阻塞次数")
+    histogram: List[LoopLagBucket] = Field(description="调度延迟直方图")
+    stalls: List[LoopStall] = Field(description="最近的阻塞记录（由新到旧）")
+
+LoopLagMessage = ResponseMessage[LoopLagStatus]
+
+
+# 分布式追踪状态
+class TracingStatus(BaseModel):
+    exporter: Optional[str] = Field(None, description="导出方式（file/otlp），为空时未启用")
+    sample_rate: float = Field(description="请求的采样比例")
+    parent_based: bool = Field(description="上游已采样的请求是否始终采样")
+    sampled_requests: int = Field(description="采样的请求数")
+    recorded: int = Field(description="记录的span数")
+    exported: int = Field(description="已导出的span数")
+    queued: int = Field(description="待导出的span数")
+    dropped: int = Field(description="队列满或导出未启动时丢弃的span数")
+    export_errors: int = Field(description="导出失败的批次数")
+
+TracingMessage = ResponseMessage[TracingStatus]
+
+
+# 流量录制状态
+class TrafficCaptureStatus(BaseModel):
+    enabled: bool = Field(description="是否正在录制")
+    format: str = Field(description="分段格式（jsonl/bin）")
+    segment: Optional[str] = Field(None, description="当前分段文件")
+    captured: int = Field(description="录制的请求数")
+    omitted_bodies: int = Field(description="未录制请求体的请求数（multipart 或超过大小上限）")
+    dropped: int = Field(description="队列满时丢弃的请求数")
+    queued: int = Field(description="待写入的请求数")
+    segments: int = Field(description="已创建的分段数")
+    written_bytes: int = Field(description="已写入的字节数")
+    write_errors: int = Field(description="写入失败的批次数")
+    full: bool = Field(description="是否已达到录制总量上限")
+
+TrafficCaptureMessage = ResponseMessage[TrafficCaptureStatus]
+
 
 # ==================== 会议管理相关 Schemas ====================
 
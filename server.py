@@ -0,0 +1,194 @@
+'''
+服务启动
+debug 模式下单进程运行并在代码变更时自动重载；
+否则按配置启动 worker 进程（默认1个，多个 worker 需设置 allow_multi_worker，见 config.py），
+主进程负责监控 worker，worker 异常退出或达到请求数上限后自动重启
+
+用法: python server.py
+'''
+import logging
+import multiprocessing
+import os
+import random
+import signal
+import socket
+import threading
+import time
+from typing import List, Optional
+import uvicorn
+from config import settings
+
+
+logger = logging.getLogger(__name__)
+
+
+def worker_count() -> int:
+    workers = settings.workers if settings.workers > 0 else (os.cpu_count() or 1)
+    if workers > 1 and not settings.allow_multi_worker:
+        # 会话等状态在 worker 进程内，多个 worker 时请求会落到不持有该设备/房间状态的 worker
+        logger.warning(f"workers={workers} 需要共享状态或按 device_sn/room_id 粘性路由，"
+                       f"未设置 allow_multi_worker，只启动1个 worker")
+        return 1
+    return workers
+
+
+def _installed(module: str) -> bool:
+    try:
+        __import__(module)
+        return True
+    except ImportError:
+        return False
+
+
+def resolved_loop() -> str:
+    """实际使用的事件循环，auto 时 uvloop 已安装则使用 uvloop"""
+    if settings.loop == "auto":
+        return "uvloop" if _installed("uvloop") else "asyncio"
+    return settings.loop
+
+
+def resolved_http() -> str:
+    """实际使用的HTTP解析器，auto 时 httptools 已安装则使用 httptools"""
+    if settings.http == "auto":
+        return "httptools" if _installed("httptools") else "h11"
+    return settings.http
+
+
+def reuse_port_supported() -> bool:
+    return hasattr(socket, "SO_REUSEPORT")
+
+
+def create_socket(reuse_port: bool) -> socket.socket:
+    """创建监听socket，由 uvicorn 在 worker 中按 backlog 调用 listen"""
+    family = socket.AF_INET6 if ":" in settings.bind_addr else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    if reuse_port:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    sock.bind((settings.bind_addr, settings.bind_port))
+    sock.set_inheritable(True)
+    return sock
+
+
+def build_config(limit_max_requests: int) -> uvicorn.Config:
+    return uvicorn.Config(
+        "main:app",
+        host=settings.bind_addr,
+        port=settings.bind_port,
+        loop=settings.loop,
+        http=settings.http,
+        backlog=settings.backlog,
+        timeout_keep_alive=settings.keepalive_timeout,
+        limit_concurrency=settings.limit_concurrency or None,
+        limit_max_requests=limit_max_requests or None,
+        timeout_graceful_shutdown=settings.worker_shutdown_timeout,
+        log_level=logging.WARNING,
+    )
+
+
+def run_worker(sock: Optional[socket.socket], limit_max_requests: int, index: int) -> None:
+    """worker 进程入口，sock 为 None 时使用 SO_REUSEPORT 创建独立的监听socket"""
+    # 媒体任务日志等按序号区分各 worker 的文件；通过 python main.py 启动时 spawn 会先以 __mp_main__ 导入 main，
+    # 早于此处设置序号，因此依赖序号的模块需在 lifespan 中（而不是导入时）读取
+    settings.worker_index = index
+    if sock is None:
+        sock = create_socket(reuse_port=True)
+    uvicorn.Server(build_config(limit_max_requests)).run(sockets=[sock])
+
+
+class WorkerSupervisor:
+    """启动并监控 worker 进程"""
+
+    def __init__(self, workers: int, reuse_port: bool):
+        self.workers = workers
+        self.reuse_port = reuse_port
+        # 不使用 SO_REUSEPORT 时由主进程创建监听socket，所有 worker 共享
+        self.shared_socket = None if reuse_port else create_socket(reuse_port=False)
+        self.processes: List[Optional[multiprocessing.Process]] = [None] * workers
+        self.context = multiprocessing.get_context("spawn")
+        self.should_exit = threading.Event()
+        self.restarts = 0
+
+    def spawn(self, index: int) -> None:
+        limit = settings.limit_max_requests
+        if limit > 0 and settings.limit_max_requests_jitter > 0:
+            limit += random.randint(0, settings.limit_max_requests_jitter)
+        process = self.context.Process(target=run_worker, args=(self.shared_socket, limit, index),
+                                       name=f"worker-{index}")
+        process.start()
+        self.processes[index] = process
+
+    def run(self) -> None:
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(sig, lambda *_: self.should_exit.set())
+
+        for index in range(self.workers):
+            self.spawn(index)
+        logger.info(f"已启动 {self.workers} 个 worker: {[p.pid for p in self.processes]}")
+
+        while not self.should_exit.wait(0.5):
+            for index, process in enumerate(self.processes):
+                if process.is_alive():
+                    continue
+                process.join()
+                self.restarts += 1
+                if process.exitcode == 0:
+                    logger.info(f"worker {process.pid} 已达到请求数上限并退出，重启")
+                else:
+                    logger.warning(f"worker {process.pid} 异常退出（退出码 {process.exitcode}），重启")
+                self.spawn(index)
+
+        self.shutdown()
+
+    def shutdown(self) -> None:
+        """向所有 worker 发送 SIGTERM 等待其优雅退出，超时后强制结束"""
+        logger.info("正在停止 worker...")
+        for process in self.processes:
+            if process.is_alive():
+                process.terminate()
+        # worker 先等待连接关闭，再在 lifespan 中排空并停止剩余媒体任务
+        deadline = time.monotonic() + settings.worker_shutdown_timeout + settings.drain_timeout + 30
+        for process in self.processes:
+            process.join(max(0.0, deadline - time.monotonic()))
+            if process.is_alive():
+                logger.warning(f"worker {process.pid} 未能在超时内退出，强制结束")
+                process.kill()
+                process.join()
+        if self.shared_socket is not None:
+            self.shared_socket.close()
+        logger.info(f"所有 worker 已停止，运行期间共重启 {self.restarts} 次")
+
+
+def serve() -> None:
+    # 仅配置主进程的日志，worker 的日志由 main 按 debug 配置
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s - %(levelname)s - %(name)s - %(message)s",
+        datefmt="%Y-%m-%d %H:%M:%S",
+        force=True
+    )
+
+    if settings.debug:
+        uvicorn.run(
+            "main:app",
+            host=settings.bind_addr,
+            port=settings.bind_port,
+            reload=True,
+            reload_dirs=["."],
+            log_level=logging.DEBUG)
+        return
+
+    workers = worker_count()
+    reuse_port = settings.reuse_port and reuse_port_supported()
+    if settings.reuse_port and not reuse_port:
+        logger.warning("当前系统不支持 SO_REUSEPORT，worker 共享监听socket")
+    logger.info(
+        f"生产模式启动: {settings.bind_addr}:{settings.bind_port} workers={workers} reuse_port={reuse_port} "
+        f"loop={resolved_loop()} http={resolved_http()} backlog={settings.backlog} "
+        f"keepalive={settings.keepalive_timeout}s limit_max_requests={settings.limit_max_requests}"
+    )
+    WorkerSupervisor(workers, reuse_port).run()
+
+
+if __name__ == "__main__":
+    serve()
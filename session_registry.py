@@ -0,0 +1,191 @@
+'''
+设备会话登记表
+记录每个设备加入房间后启动的媒体任务（合流转推、在线媒体流输入、对话式AI等），
+供离开房间、按房间批量停止任务时查找；同时记录设备最近一次加入房间或心跳的时间，
+按失联判定时间排列在小顶堆中，供孤儿任务回收增量查找失联的设备
+'''
+import heapq
+import logging
+from dataclasses import dataclass, field
+from enum import StrEnum
+from typing import Dict, List, Optional, Tuple
+from config import settings
+from utils import current_timestamp_ms
+from task_ledger import task_ledger, LedgerTask
+
+
+logger = logging.getLogger(__name__)
+
+
+# 媒体任务类型
+class TaskType(StrEnum):
+    MixedStream = "MixedStream"  # 合流转推（StartPushMixedStreamToCDN）
+    RelayStream = "RelayStream"  # 在线媒体流输入（StartRelayStream）
+    VoiceChat = "VoiceChat"      # 实时对话式AI（StartVoiceChat）
+    VideoChat = "VideoChat"      # 音视频互动智能体（StartVideoChat）
+    Record = "Record"            # 云端录制（StartRecord）
+
+
+# 已启动的媒体任务
+@dataclass
+class MediaTask:
+    room_id: str
+    task_id: str
+    task_type: TaskType
+    started_at: int = field(default_factory=current_timestamp_ms)  # 启动时间戳ms
+
+
+# 设备会话
+@dataclass
+class DeviceSession:
+    device_sn: str
+    room_id: str
+    user_id: str
+    tasks: Dict[TaskType, MediaTask] = field(default_factory=dict)
+    ingest_node: Optional[str] = None  # 分配的上行媒体节点
+    egress_node: Optional[str] = None  # 分配的下行媒体节点
+    joined_at: int = field(default_factory=current_timestamp_ms)  # 加入时间戳ms
+    last_seen: int = field(default_factory=current_timestamp_ms)  # 最近一次加入房间或心跳的时间戳ms
+    heartbeat: bool = False  # 设备是否上报过心跳
+
+
+class SessionRegistry:
+    """设备会话登记表（仅在事件循环线程中访问，无需加锁）"""
+
+    def __init__(self):
+        self._sessions: Dict[str, DeviceSession] = {}  # device_sn -> 会话
+        self._liveness: List[Tuple[int, str]] = []  # (失联判定时间戳ms, device_sn) 小顶堆
+        self._watched: Dict[str, int] = {}  # device_sn -> 堆中有效条目的判定时间，其余条目为过期条目
+
+    def open_session(self, device_sn: str, room_id: str, user_id: str) -> DeviceSession:
+        """创建设备会话，同一设备重复加入时沿用已登记的任务
+
+        设备切换房间时调用方需先停止旧房间的任务，旧任务未全部停止时不替换旧会话（否则旧任务无人停止，持续计费）
+        """
+        session = self._sessions.get(device_sn)
+        if session is not None and session.room_id == room_id:
+            session.user_id = user_id
+            session.last_seen = current_timestamp_ms()
+            return session
+
+        if session is not None and session.tasks:
+            raise RuntimeError(f"设备 {device_sn} 在房间 {session.room_id} 的任务未停止: {list(session.tasks)}")
+
+        session = DeviceSession(device_sn=device_sn, room_id=room_id, user_id=user_id)
+        self._sessions[device_sn] = session
+        self.watch(device_sn, self._stale_at(session))
+        return session
+
+    def add_task(self, device_sn: str, task_type: TaskType, task_id: str, stream_url: str = "") -> None:
+        """登记设备已启动的媒体任务（在线媒体流输入同时记录源地址，重启后续期令牌时使用）"""
+        session = self._sessions.get(device_sn)
+        if session is None:
+            logger.warning(f"设备 {device_sn} 没有会话，忽略任务 {task_type}:{task_id}")
+            return
+        task = MediaTask(room_id=session.room_id, task_id=task_id, task_type=task_type)
+        session.tasks[task_type] = task
+        task_ledger.record_start(device_sn, session.room_id, session.user_id, task_type, task_id, task.started_at,
+                                 stream_url)
+
+    def remove_task(self, device_sn: str, task_type: TaskType, room_id: Optional[str] = None,
+                    task_id: Optional[str] = None) -> bool:
+        """移除已停止的媒体任务，任务全部停止后关闭会话，返回是否移除了登记的任务
+
+        指定 room_id/task_id 时只在与登记的任务一致时移除：按其他房间构造的会话停止任务时（如离开旧房间），
+        不能移除设备当前房间仍在运行的同类型任务
+        """
+        session = self._sessions.get(device_sn)
+        if session is None:
+            return False
+        task = session.tasks.get(task_type)
+        removed = task is not None and (room_id is None or task.room_id == room_id) \
+            and (task_id is None or task.task_id == task_id)
+        if removed:
+            del session.tasks[task_type]
+            task_ledger.record_stop(device_sn, task_type)
+        if not session.tasks:
+            self._sessions.pop(device_sn, None)
+        return removed
+
+    def close_session(self, device_sn: str) -> Optional[DeviceSession]:
+        """关闭设备会话"""
+        task_ledger.record_close(device_sn)
+        return self._sessions.pop(device_sn, None)
+
+    def restore(self, tasks: List[LedgerTask]) -> int:
+        """启动时根据媒体任务日志恢复设备会话和进行中的任务（不再写入日志），返回恢复的会话数"""
+        for item in tasks:
+            session = self._sessions.get(item.device_sn)
+            if session is None:
+                # 重启前的活跃时间未记录，从恢复时开始计算失联时间
+                session = DeviceSession(device_sn=item.device_sn, room_id=item.room_id, user_id=item.user_id)
+                self._sessions[item.device_sn] = session
+                self.watch(item.device_sn, self._stale_at(session))
+            task_type = TaskType(item.task_type)
+            session.tasks[task_type] = MediaTask(room_id=item.room_id, task_id=item.task_id, task_type=task_type,
+                                                 started_at=item.started_at)
+        if tasks:
+            logger.info(f"从媒体任务日志恢复 {len(self._sessions)} 个设备会话，{len(tasks)} 个任务")
+        return len(self._sessions)
+
+    def get_session(self, device_sn: str) -> Optional[DeviceSession]:
+        return self._sessions.get(device_sn)
+
+    @property
+    def owns_all_devices(self) -> bool:
+        """本 worker 是否持有所有设备的会话：多个 worker 时设备的会话可能在其他 worker，查不到不代表设备未加入房间"""
+        return not settings.allow_multi_worker or settings.workers == 1
+
+    # ============================ 设备活跃状态 ============================
+
+    def touch(self, device_sn: str) -> Optional[DeviceSession]:
+        """记录设备心跳（只更新时间，堆中的条目到期时再按最新时间重新排列）"""
+        session = self._sessions.get(device_sn)
+        if session is not None:
+            session.last_seen = current_timestamp_ms()
+            session.heartbeat = True
+        return session
+
+    @staticmethod
+    def _stale_at(session: DeviceSession) -> int:
+        """设备的失联判定时间：上报过心跳的设备按心跳超时，从未上报心跳的设备按加入房间后的最长时间"""
+        timeout = settings.reconcile_stale_seconds if session.heartbeat else settings.reconcile_join_stale_seconds
+        return session.last_seen + int(timeout * 1000)
+
+    def watch(self, device_sn: str, at: int) -> None:
+        """在 at 时间检查设备是否失联"""
+        self._watched[device_sn] = at
+        heapq.heappush(self._liveness, (at, device_sn))
+
+    def stale_sessions(self, now: int, limit: int) -> List[DeviceSession]:
+        """取出最多 limit 个已失联的设备会话，只检查判定时间已到的条目，仍活跃的设备按最新时间重新排列
+
+        返回的会话不再被检查，调用方处理失败时需重新 watch
+        """
+        stale: List[DeviceSession] = []
+        while self._liveness and self._liveness[0][0] <= now and len(stale) < limit:
+            at, device_sn = heapq.heappop(self._liveness)
+            if self._watched.get(device_sn) != at:
+                continue
+            session = self._sessions.get(device_sn)
+            if session is None:
+                del self._watched[device_sn]
+                continue
+            stale_at = self._stale_at(session)
+            if stale_at > now:
+                self.watch(device_sn, stale_at)
+                continue
+            del self._watched[device_sn]
+            stale.append(session)
+        return stale
+
+    def room_sessions(self, room_id: str) -> List[DeviceSession]:
+        """查询房间内的所有设备会话"""
+        return [s for s in self._sessions.values() if s.room_id == room_id]
+
+    def all_sessions(self) -> List[DeviceSession]:
+        return list(self._sessions.values())
+
+
+# 设备会话登记表全局实例
+session_registry: SessionRegistry = SessionRegistry()
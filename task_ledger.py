@@ -0,0 +1,375 @@
+'''
+媒体任务日志
+将媒体任务的启动/停止事件追加写入本地日志文件，进程崩溃重启后回放日志即可恢复所有进行中的任务，无需查询 Volc：
+每条记录带长度和 CRC32 校验，写入在内存中累积后由后台任务合并为一次 write + fsync（组提交），
+日志中已停止任务的记录占比过高时重写为只含进行中任务的新文件（压缩），启动时通过 mmap 顺序回放
+
+每个 worker 只写自己的日志文件（按 worker 序号区分，不按 pid），同一文件同一时间只有一个写入方；
+worker 重启后沿用原序号，回放并接管前一个进程的日志，因此每个 worker 只恢复自己启动的任务。
+日志开头记录所属的 worker 序号，回放时与当前序号不一致的日志不恢复（避免回收其他 worker 的任务）
+'''
+import asyncio
+import logging
+import mmap
+import os
+import struct
+import time
+import zlib
+from dataclasses import dataclass
+from enum import IntEnum
+from typing import Dict, List, Optional, Tuple
+from config import settings
+from schemas import TaskLedgerStatus
+
+
+logger = logging.getLogger(__name__)
+
+# 文件头（格式标识和版本）
+MAGIC = b"JTL1"
+# 记录头: 记录体长度、记录体 CRC32
+RECORD_HEADER = struct.Struct("<II")
+# 记录体开头: 事件类型、时间戳ms，之后为 \0 分隔的 UTF-8 字段
+EVENT_HEADER = struct.Struct("<BQ")
+FIELD_SEP = b"\x00"
+
+
+# 日志事件类型
+class LedgerOp(IntEnum):
+    Start = 1  # 任务启动: device_sn, room_id, user_id, task_type, task_id[, stream_url]
+    Stop = 2  # 任务停止: device_sn, task_type
+    Close = 3  # 会话关闭（其余任务不再跟踪）: device_sn
+    Owner = 4  # 日志所属的 worker（文件开头）: worker_index
+
+
+# 回放得到的进行中任务
+@dataclass
+class LedgerTask:
+    device_sn: str
+    room_id: str
+    user_id: str
+    task_type: str
+    task_id: str
+    started_at: int  # 启动时间戳ms
+    stream_url: str = ""  # 在线媒体流输入的源地址（restart 方式续期令牌时使用），其他任务为空
+
+
+def worker_ledger_path(path: str, worker_index: int) -> str:
+    """worker 的日志文件路径：序号为0时即配置的路径，否则在文件名后加序号"""
+    if not path or worker_index == 0:
+        return path
+    root, ext = os.path.splitext(path)
+    return f"{root}-{worker_index}{ext}"
+
+
+def encode_record(op: LedgerOp, timestamp_ms: int, *fields: str) -> bytes:
+    body = EVENT_HEADER.pack(op, timestamp_ms) + FIELD_SEP.join(field.encode("utf-8") for field in fields)
+    return RECORD_HEADER.pack(len(body), zlib.crc32(body)) + body
+
+
+def encode_start(device_sn: str, room_id: str, user_id: str, task_type: str, task_id: str, started_at: int,
+                 stream_url: str = "") -> bytes:
+    fields = (device_sn, room_id, user_id, task_type, task_id) + ((stream_url,) if stream_url else ())
+    return encode_record(LedgerOp.Start, started_at, *fields)
+
+
+class TaskLedger:
+    """媒体任务日志（追加、组提交、压缩在事件循环线程中调度，文件读写在线程池中执行）"""
+
+    def __init__(self):
+        self._fd: Optional[int] = None
+        self._buffer = bytearray()  # 待提交的记录
+        self._waiters: List[asyncio.Future] = []  # 等待当前缓冲区落盘的调用方
+        self._live: Dict[Tuple[str, str], bytes] = {}  # (device_sn, task_type) -> 进行中任务的启动记录
+        self._live_bytes = 0
+        self._file_bytes = 0
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._committing = False  # 有已取出缓冲区、尚未落盘的提交
+        self._stopping = False
+        self._last_compact = time.monotonic()
+        self.appended = 0
+        self.commits = 0
+        self.compactions = 0
+        self.replayed = 0
+        self.replay_ms: Optional[float] = None
+        self.truncated_bytes = 0  # 回放时丢弃的不完整或校验失败的尾部字节数
+
+    @property
+    def path(self) -> str:
+        """本 worker 的日志路径（每次读取配置：spawn 的 worker 进程在设置序号之前就会导入本模块）"""
+        return worker_ledger_path(settings.task_ledger_path, settings.worker_index)
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.path)
+
+    @staticmethod
+    def _owner_record() -> bytes:
+        return encode_record(LedgerOp.Owner, int(time.time() * 1000), str(settings.worker_index))
+
+    # ============================ 回放 ============================
+
+    def replay(self) -> List[LedgerTask]:
+        """启动时回放日志，返回进行中的任务；截断崩溃时写了一半的尾部记录后以追加方式打开日志"""
+        if not self.enabled:
+            return []
+        start = time.perf_counter()
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        size = os.fstat(fd).st_size
+        tasks: Dict[Tuple[str, str], LedgerTask] = {}
+        good = 0
+        owner: Optional[int] = None
+        if size >= len(MAGIC):
+            with mmap.mmap(fd, size, access=mmap.ACCESS_READ) as view:
+                if view[:len(MAGIC)] == MAGIC:
+                    good, owner = self._replay_records(view, size, tasks)
+            moved_to = None
+            if good == 0:
+                # 不是可识别的日志文件，保留原文件供排查后重新开始
+                moved_to = f"{self.path}.corrupt"
+                logger.error(f"{self.path} 不是媒体任务日志，已移动到 {moved_to}")
+            elif owner is not None and owner != settings.worker_index:
+                # 其他 worker 的日志：其中的任务不归本 worker 所有，不恢复也不接管，保留原文件供排查
+                moved_to = f"{self.path}.worker-{owner}"
+                logger.error(f"{self.path} 属于 worker {owner}（当前 worker {settings.worker_index}），"
+                             f"不恢复其中的 {len(tasks)} 个任务，已移动到 {moved_to}")
+                tasks.clear()
+                good = 0
+            if moved_to is not None:
+                os.close(fd)
+                os.replace(self.path, moved_to)
+                fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+
+        if good == 0:
+            os.ftruncate(fd, 0)
+            header = MAGIC + self._owner_record()
+            os.write(fd, header)
+            good = len(header)
+        else:
+            if good < size:
+                self.truncated_bytes = size - good
+                logger.warning(f"媒体任务日志尾部 {size - good} 字节不完整或校验失败，已截断")
+                os.ftruncate(fd, good)
+            if owner is None:
+                # 旧版日志没有所属 worker 记录，补写后由本 worker 接管
+                os.lseek(fd, 0, os.SEEK_END)
+                record = self._owner_record()
+                os.write(fd, record)
+                good += len(record)
+        os.fsync(fd)
+        os.lseek(fd, 0, os.SEEK_END)
+        self._fd = fd
+        self._file_bytes = good
+
+        for task in tasks.values():
+            record = encode_start(task.device_sn, task.room_id, task.user_id, task.task_type, task.task_id,
+                                  task.started_at, task.stream_url)
+            self._live[(task.device_sn, task.task_type)] = record
+            self._live_bytes += len(record)
+        self.replayed = len(tasks)
+        self.replay_ms = (time.perf_counter() - start) * 1000
+        logger.info(f"回放媒体任务日志: {self.replayed} 个进行中的任务，{good} 字节，耗时{self.replay_ms:.1f}ms")
+        return list(tasks.values())
+
+    @staticmethod
+    def _replay_records(view: mmap.mmap, size: int,
+                        tasks: Dict[Tuple[str, str], LedgerTask]) -> Tuple[int, Optional[int]]:
+        """顺序回放记录，返回最后一条完整记录的结束位置和日志所属的 worker 序号（旧版日志无此记录时为 None）"""
+        offset = len(MAGIC)
+        owner: Optional[int] = None
+        while offset + RECORD_HEADER.size <= size:
+            length, crc = RECORD_HEADER.unpack_from(view, offset)
+            end = offset + RECORD_HEADER.size + length
+            if length < EVENT_HEADER.size or end > size:
+                break
+            body = view[offset + RECORD_HEADER.size:end]
+            if zlib.crc32(body) != crc:
+                break
+            op, timestamp_ms = EVENT_HEADER.unpack_from(body)
+            fields = [field.decode("utf-8") for field in body[EVENT_HEADER.size:].split(FIELD_SEP)]
+            if op == LedgerOp.Start and len(fields) in (5, 6):
+                tasks[(fields[0], fields[3])] = LedgerTask(*fields[:5], started_at=timestamp_ms,
+                                                           stream_url=fields[5] if len(fields) == 6 else "")
+            elif op == LedgerOp.Stop and len(fields) == 2:
+                tasks.pop((fields[0], fields[1]), None)
+            elif op == LedgerOp.Close and len(fields) == 1:
+                for key in [key for key in tasks if key[0] == fields[0]]:
+                    del tasks[key]
+            elif op == LedgerOp.Owner and len(fields) == 1 and fields[0].isdigit():
+                owner = int(fields[0])
+            offset = end
+        return offset, owner
+
+    # ============================ 追加 ============================
+
+    def record_start(self, device_sn: str, room_id: str, user_id: str, task_type: str, task_id: str,
+                     started_at: int, stream_url: str = "") -> None:
+        record = encode_start(device_sn, room_id, user_id, task_type, task_id, started_at, stream_url)
+        old = self._live.pop((device_sn, task_type), None)
+        if old is not None:
+            self._live_bytes -= len(old)
+        self._live[(device_sn, task_type)] = record
+        self._live_bytes += len(record)
+        self._append(record)
+
+    def record_stop(self, device_sn: str, task_type: str) -> None:
+        old = self._live.pop((device_sn, task_type), None)
+        if old is not None:
+            self._live_bytes -= len(old)
+            self._append(encode_record(LedgerOp.Stop, int(time.time() * 1000), device_sn, task_type))
+
+    def record_close(self, device_sn: str) -> None:
+        keys = [key for key in self._live if key[0] == device_sn]
+        if keys:
+            for key in keys:
+                self._live_bytes -= len(self._live.pop(key))
+            self._append(encode_record(LedgerOp.Close, int(time.time() * 1000), device_sn))
+
+    def _append(self, record: bytes) -> None:
+        if self._fd is None:
+            return
+        self._buffer += record
+        self.appended += 1
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def sync(self) -> None:
+        """等待已追加的记录落盘（与同一时间段内的其他调用方共用一次 fsync）"""
+        if self._fd is None or self._task is None or not (self._buffer or self._committing):
+            return
+        future = asyncio.get_running_loop().create_future()
+        self._waiters.append(future)
+        self._wakeup.set()
+        await asyncio.shield(future)
+
+    # ============================ 组提交和压缩 ============================
+
+    async def start(self) -> None:
+        if self._task is None and self._fd is not None:
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._commit_loop())
+
+    async def stop(self) -> None:
+        """提交剩余记录后关闭日志（不取消进行中的写入，避免与最后一次提交同时写文件）"""
+        if self._task is not None:
+            self._stopping = True
+            self._wakeup.set()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        if self._fd is not None:
+            try:
+                await self._commit()
+            except Exception as e:
+                logger.error(f"媒体任务日志写入失败，{len(self._buffer)} 字节未落盘: {str(e)}")
+            os.close(self._fd)
+            self._fd = None
+
+    async def _commit_loop(self) -> None:
+        while not self._stopping:
+            try:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=settings.task_ledger_compact_interval)
+                except asyncio.TimeoutError:
+                    pass
+                self._wakeup.clear()
+                if self._stopping:
+                    break
+                # 等待一个提交间隔，合并这段时间内追加的记录
+                await asyncio.sleep(settings.task_ledger_commit_interval)
+                await self._commit()
+                if self._should_compact():
+                    await self._compact()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"媒体任务日志写入失败: {str(e)}")
+                await asyncio.sleep(settings.task_ledger_commit_interval)
+
+    async def _commit(self) -> None:
+        waiters, self._waiters = self._waiters, []
+        if self._buffer:
+            data, self._buffer = bytes(self._buffer), bytearray()
+            self._committing = True
+            try:
+                await asyncio.to_thread(self._write, self._fd, data)
+            except Exception:
+                # 写入失败时保留记录，下次提交重试
+                self._buffer[:0] = data
+                self._waiters[:0] = waiters
+                raise
+            finally:
+                self._committing = False
+            self._file_bytes += len(data)
+            self.commits += 1
+        for waiter in waiters:
+            if not waiter.done():
+                waiter.set_result(None)
+
+    @staticmethod
+    def _write(fd: int, data: bytes) -> None:
+        view = memoryview(data)
+        while view:
+            written = os.write(fd, view)
+            view = view[written:]
+        os.fsync(fd)
+
+    def _should_compact(self) -> bool:
+        if self._file_bytes < settings.task_ledger_compact_min_bytes:
+            return False
+        if self._file_bytes > settings.task_ledger_compact_ratio * max(self._live_bytes, 1):
+            return True
+        # 定期压缩：超过压缩间隔且已停止任务的记录占多数
+        return time.monotonic() - self._last_compact >= settings.task_ledger_compact_interval \
+            and self._file_bytes > 2 * self._live_bytes
+
+    async def _compact(self) -> None:
+        """将进行中任务的启动记录写入新文件，fsync 后原子替换日志"""
+        data = MAGIC + self._owner_record() + b"".join(self._live.values())
+        old_fd = self._fd
+        self._fd = await asyncio.to_thread(self._rewrite, self.path, data)
+        os.close(old_fd)
+        logger.info(f"压缩媒体任务日志: {self._file_bytes} -> {len(data)} 字节")
+        self._file_bytes = len(data)
+        self._last_compact = time.monotonic()
+        self.compactions += 1
+
+    @staticmethod
+    def _rewrite(path: str, data: bytes) -> int:
+        tmp_path = f"{path}.compact"
+        fd = os.open(tmp_path, os.O_RDWR | os.O_CREAT | os.O_TRUNC, 0o644)
+        try:
+            TaskLedger._write(fd, data)
+            os.replace(tmp_path, path)
+        except Exception:
+            os.close(fd)
+            raise
+        # fsync 目录，确保替换后的文件名落盘
+        dir_fd = os.open(os.path.dirname(os.path.abspath(path)), os.O_RDONLY)
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
+        return fd
+
+    # ============================ 统计 ============================
+
+    def status(self) -> TaskLedgerStatus:
+        return TaskLedgerStatus(
+            enabled=self._fd is not None,
+            path=self.path,
+            live_tasks=len(self._live),
+            file_bytes=self._file_bytes,
+            live_bytes=self._live_bytes,
+            pending_bytes=len(self._buffer),
+            appended=self.appended,
+            commits=self.commits,
+            compactions=self.compactions,
+            replayed=self.replayed,
+            replay_ms=self.replay_ms,
+            truncated_bytes=self.truncated_bytes,
+        )
+
+
+# 媒体任务日志全局实例
+task_ledger: TaskLedger = TaskLedger()
@@ -0,0 +1,134 @@
+'''
+媒体任务管理
+并发停止设备/房间下的合流转推、在线媒体流输入、对话式AI等任务，失败自动重试
+'''
+import asyncio
+import logging
+from typing import Awaitable, Callable, Dict, List, Optional
+from vertc_client import rtc_client
+from session_registry import session_registry, TaskType, MediaTask, DeviceSession
+from config import settings
+from schemas import TaskStopResult, RoomTeardownResponse
+from utils import current_timestamp_ms
+from request_deadline import DeadlineExceeded
+from record_manager import record_manager
+from agent_manager import agent_manager
+from token_renewal import relay_token_renewer
+
+
+logger = logging.getLogger(__name__)
+
+
+# 各类任务对应的停止接口（VertcClient 方法名）
+_STOP_METHODS: Dict[TaskType, str] = {
+    TaskType.MixedStream: "stop_push_stream_to_cdn",
+    TaskType.RelayStream: "stop_relay_stream",
+    TaskType.VoiceChat: "stop_voice_chat",
+    TaskType.VideoChat: "stop_video_chat",
+    TaskType.Record: "stop_record",
+}
+
+
+async def stop_task(task: MediaTask) -> dict:
+    """停止单个任务（SDK为同步调用，放到线程池中执行避免阻塞事件循环）"""
+    stop_func = getattr(rtc_client, _STOP_METHODS[task.task_type])
+    response = await asyncio.to_thread(stop_func, room_id=task.room_id, task_id=task.task_id)
+
+    error = response.get("ResponseMetadata", {}).get("Error") if isinstance(response, dict) else None
+    if error:
+        raise Exception(f"{error.get('Code')}: {error.get('Message')}")
+    if task.task_type == TaskType.Record:
+        # 录制停止后由录制轮询调度跟踪录制文件生成
+        record_manager.mark_stopping(task.task_id)
+    return response
+
+
+async def stop_task_with_retry(device_sn: str, task: MediaTask) -> TaskStopResult:
+    """停止单个任务，失败时按指数退避重试"""
+    retries = max(1, settings.task_stop_retries)
+    delay = settings.task_stop_retry_delay
+    last_error = None
+
+    for attempt in range(1, retries + 1):
+        try:
+            response = await stop_task(task)
+            logger.info(f"停止任务 {task.task_type}:{task.task_id} (房间 {task.room_id}): {response}")
+            return TaskStopResult(
+                device_sn=device_sn,
+                task_type=task.task_type,
+                task_id=task.task_id,
+                success=True,
+                attempts=attempt,
+            )
+        except DeadlineExceeded as e:
+            # 已超过请求截止时间，不再重试，任务保留在登记表中
+            last_error = str(e)
+            logger.warning(f"停止任务 {task.task_type}:{task.task_id} 超过请求截止时间")
+            retries = attempt
+            break
+        except Exception as e:
+            last_error = str(e)
+            logger.warning(f"停止任务 {task.task_type}:{task.task_id} 第{attempt}次失败: {last_error}")
+            if attempt < retries:
+                await asyncio.sleep(delay)
+                delay *= 2
+
+    return TaskStopResult(
+        device_sn=device_sn,
+        task_type=task.task_type,
+        task_id=task.task_id,
+        success=False,
+        attempts=retries,
+        error=last_error,
+    )
+
+
+async def stop_session_tasks(sessions: List[DeviceSession], concurrency: Optional[int] = None,
+                             limiter: Optional[Callable[[], Awaitable[None]]] = None) -> List[TaskStopResult]:
+    """并发停止多个设备会话下的所有任务，停止成功的任务从登记表中移除
+
+    concurrency 默认为 task_stop_concurrency；limiter 在每个任务停止前等待（如限速）
+    """
+    semaphore = asyncio.Semaphore(max(1, concurrency or settings.task_stop_concurrency))
+
+    async def _stop(device_sn: str, task: MediaTask) -> TaskStopResult:
+        async with semaphore:
+            if limiter is not None:
+                await limiter()
+            return await stop_task_with_retry(device_sn, task)
+
+    pending = [(s.device_sn, t) for s in sessions for t in list(s.tasks.values())]
+    results = await asyncio.gather(*[_stop(device_sn, task) for device_sn, task in pending])
+
+    for (_, task), result in zip(pending, results):
+        # 只移除与登记一致的任务（调用方可能按其他房间构造会话），否则设备当前房间的任务会失去跟踪
+        if result.success and session_registry.remove_task(result.device_sn, task.task_type, task.room_id, task.task_id):
+            if result.task_type in (TaskType.VoiceChat, TaskType.VideoChat):
+                agent_manager.release(result.device_sn)
+            elif result.task_type == TaskType.RelayStream:
+                relay_token_renewer.untrack(result.device_sn)
+
+    # 会话已关闭的设备同时移除已构建但未启动的智能体（lazy 模式下未说话），避免之后的启动请求启动无人停止的智能体
+    for device_sn in {s.device_sn for s in sessions}:
+        if session_registry.get_session(device_sn) is None:
+            agent_manager.release(device_sn)
+    return list(results)
+
+
+async def teardown_room(room_id: str) -> RoomTeardownResponse:
+    """停止房间内所有设备的媒体任务"""
+    start_time = current_timestamp_ms()
+    sessions = session_registry.room_sessions(room_id)
+    results = await stop_session_tasks(sessions)
+
+    stopped = sum(1 for r in results if r.success)
+    summary = RoomTeardownResponse(
+        room_id=room_id,
+        total=len(results),
+        stopped=stopped,
+        failed=len(results) - stopped,
+        elapsed_ms=current_timestamp_ms() - start_time,
+        tasks=results,
+    )
+    logger.info(f"房间 {room_id} 任务停止完成: 共{summary.total}个, 成功{summary.stopped}个, 失败{summary.failed}个, 耗时{summary.elapsed_ms}ms")
+    return summary
@@ -0,0 +1,263 @@
+'''
+在线媒体流输入令牌续期
+StartRelayStream 使用的令牌在 volc_token_expire_seconds 后过期，过期后 Volc 会断开输入流；
+单个调度器按到期时间（小顶堆）统一续期所有进行中的输入流任务：在过期前提前续期并加入随机抖动，
+到期的任务按批签发令牌、限制并发更新，批与批之间保持最小间隔，避免所有任务同时签发和推送
+'''
+import asyncio
+import heapq
+import itertools
+import logging
+import random
+import time
+from dataclasses import dataclass
+from enum import StrEnum
+from typing import Dict, List, Optional, Tuple
+from config import settings
+from vertc_client import rtc_client
+from session_registry import session_registry, TaskType, MediaTask, DeviceSession
+from task_ledger import LedgerTask
+from schemas import RelayTokenStatus
+
+
+logger = logging.getLogger(__name__)
+
+
+# 续期方式
+class RenewMethod(StrEnum):
+    Update = "update"  # UpdateRelayStream 更新令牌，输入流不中断
+    Restart = "restart"  # 停止后使用新令牌以相同任务ID重新启动，输入流短暂中断
+
+
+# 单个输入流任务的令牌
+@dataclass
+class RelayToken:
+    device_sn: str
+    room_id: str
+    user_id: str
+    stream_url: str
+    task: MediaTask  # 登记时的任务，任务停止或被重新启动的任务替换后不再续期
+    expire_at: int  # 令牌过期时间（Unix时间戳，秒）
+    renew_at: float = 0.0  # 计划续期时间（Unix时间戳，秒）
+    renewals: int = 0
+    failures: int = 0  # 连续续期失败次数
+
+
+class RelayTokenRenewer:
+    """在线媒体流输入任务的令牌续期调度（仅在事件循环线程中访问）"""
+
+    def __init__(self):
+        self.method = RenewMethod(settings.relay_token_renew_method)
+        self._entries: Dict[str, RelayToken] = {}  # device_sn -> 令牌
+        self._schedule: List[Tuple[float, int, str]] = []  # (计划续期时间, 序号, device_sn) 小顶堆
+        self._seq = itertools.count()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._next_batch_at = 0.0  # 下一批最早开始时间（time.monotonic）
+        self.renewed = 0
+        self.failed = 0
+        self.expired = 0  # 续期失败直到令牌过期的任务数
+        self.batches = 0
+
+    # ============================ 任务登记 ============================
+
+    def track(self, session: DeviceSession, stream_url: str, expire_at: int, renew_at: Optional[float] = None) -> None:
+        """登记刚启动的输入流任务，同一设备重新启动时替换旧的登记"""
+        task = session.tasks.get(TaskType.RelayStream)
+        if task is None:
+            return
+        entry = RelayToken(device_sn=session.device_sn, room_id=session.room_id, user_id=session.user_id,
+                           stream_url=stream_url, task=task, expire_at=expire_at)
+        self._entries[session.device_sn] = entry
+        self._schedule_renewal(entry, renew_at)
+
+    def restore(self, tasks: List[LedgerTask]) -> int:
+        """登记从媒体任务日志恢复的输入流任务（需在会话恢复之后调用），返回登记的任务数
+
+        重启前最后一次续期的令牌过期时间未记录，登记后立即续期一次（按批、限速执行）
+        """
+        now = time.time()
+        restored = 0
+        for item in tasks:
+            if item.task_type != TaskType.RelayStream:
+                continue
+            session = session_registry.get_session(item.device_sn)
+            if session is None:
+                continue
+            if self.method == RenewMethod.Restart and not item.stream_url:
+                logger.warning(f"设备 {item.device_sn} 的输入流任务未记录源地址（旧版日志），无法以 restart 方式续期")
+                continue
+            # 令牌至少在任务启动后 volc_token_expire_seconds 内有效；之后可能已续期，续期失败时至少按 renew_before 重试
+            expire_at = max(item.started_at // 1000 + settings.volc_token_expire_seconds,
+                            int(now + settings.relay_token_renew_before))
+            self.track(session, item.stream_url, expire_at, renew_at=now)
+            restored += 1
+        if restored:
+            logger.info(f"登记 {restored} 个恢复的输入流任务，立即续期令牌")
+        return restored
+
+    def untrack(self, device_sn: str) -> None:
+        """输入流任务已停止，不再续期（堆中的条目在到期时丢弃）"""
+        self._entries.pop(device_sn, None)
+
+    def _is_active(self, entry: RelayToken) -> bool:
+        if self._entries.get(entry.device_sn) is not entry:
+            return False
+        session = session_registry.get_session(entry.device_sn)
+        return session is not None and session.tasks.get(TaskType.RelayStream) is entry.task
+
+    def _schedule_renewal(self, entry: RelayToken, at: Optional[float] = None) -> None:
+        if at is None:
+            # 过期前 renew_before 秒再随机提前 0~jitter 秒，同时加入的任务分散到不同批次；
+            # 令牌有效期较短时最晚在有效期过半时续期
+            lifetime = max(0.0, entry.expire_at - time.time())
+            lead = settings.relay_token_renew_before + random.uniform(0, settings.relay_token_renew_jitter)
+            at = entry.expire_at - min(lead, lifetime / 2)
+        entry.renew_at = at
+        heapq.heappush(self._schedule, (at, next(self._seq), entry.device_sn))
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    # ============================ 续期调度 ============================
+
+    async def start(self) -> None:
+        if self._task is None:
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._renew_loop())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        self._task = None
+
+    def _next_wait(self) -> Optional[float]:
+        """距下一批续期的等待时间，无待续期任务时返回 None"""
+        if not self._schedule:
+            return None
+        wait = max(self._schedule[0][0] - time.time(), self._next_batch_at - time.monotonic())
+        return max(0.0, wait)
+
+    def _take_due(self) -> List[RelayToken]:
+        """取出已到期和即将到期（batch_window 内）的任务，数量不超过批大小"""
+        horizon = time.time() + settings.relay_token_renew_batch_window
+        batch: List[RelayToken] = []
+        while self._schedule and len(batch) < settings.relay_token_renew_batch_size \
+                and self._schedule[0][0] <= horizon:
+            renew_at, _, device_sn = heapq.heappop(self._schedule)
+            entry = self._entries.get(device_sn)
+            # 跳过已停止或已重新调度的过期条目
+            if entry is None or entry.renew_at != renew_at:
+                continue
+            if not self._is_active(entry):
+                self._entries.pop(device_sn, None)
+                continue
+            batch.append(entry)
+        return batch
+
+    async def _renew_loop(self) -> None:
+        while True:
+            try:
+                wait = self._next_wait()
+                if wait is None or wait > 0:
+                    self._wakeup.clear()
+                    try:
+                        await asyncio.wait_for(self._wakeup.wait(), timeout=wait)
+                    except asyncio.TimeoutError:
+                        pass
+                    continue
+
+                batch = self._take_due()
+                if batch:
+                    self.batches += 1
+                    self._next_batch_at = time.monotonic() + settings.relay_token_renew_batch_interval
+                    await self._renew_batch(batch)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"令牌续期调度失败: {str(e)}")
+                await asyncio.sleep(settings.relay_token_retry_delay)
+
+    async def _renew_batch(self, batch: List[RelayToken]) -> None:
+        # 整批在一次线程池调用中签发，再限制并发推送
+        expire_at = int(time.time()) + settings.volc_token_expire_seconds
+        tokens = await asyncio.to_thread(
+            lambda: [rtc_client.build_relay_token(entry.room_id, entry.user_id, expire_at) for entry in batch]
+        )
+        semaphore = asyncio.Semaphore(max(1, settings.relay_token_renew_concurrency))
+
+        async def _renew(entry: RelayToken, token: str) -> None:
+            async with semaphore:
+                await self._renew(entry, token, expire_at)
+
+        await asyncio.gather(*[_renew(entry, token) for entry, token in zip(batch, tokens)])
+
+    async def _renew(self, entry: RelayToken, token: str, expire_at: int) -> None:
+        try:
+            # SDK为同步调用，放到线程池中执行
+            if self.method == RenewMethod.Update:
+                response = await asyncio.to_thread(
+                    rtc_client.update_relay_stream_token,
+                    room_id=entry.room_id, task_id=entry.task.task_id, token=token,
+                )
+            else:
+                await asyncio.to_thread(rtc_client.stop_relay_stream, room_id=entry.room_id, task_id=entry.task.task_id)
+                response = await asyncio.to_thread(
+                    rtc_client.start_relay_stream,
+                    room_id=entry.room_id, user_id=entry.user_id, task_id=entry.task.task_id,
+                    stream_url=entry.stream_url, token=token,
+                )
+            error = response.get("ResponseMetadata", {}).get("Error") if isinstance(response, dict) else None
+            if error:
+                raise Exception(f"{error.get('Code')}: {error.get('Message')}")
+        except Exception as e:
+            self._on_failure(entry, e)
+            return
+
+        self.renewed += 1
+        entry.renewals += 1
+        entry.failures = 0
+        entry.expire_at = expire_at
+        # 续期期间任务已停止时不再调度
+        if self._is_active(entry):
+            self._schedule_renewal(entry)
+
+    def _on_failure(self, entry: RelayToken, error: Exception) -> None:
+        self.failed += 1
+        entry.failures += 1
+        now = time.time()
+        if now >= entry.expire_at:
+            # 令牌已过期，Volc 已断开输入流，由设备重新加入房间恢复
+            self.expired += 1
+            self._entries.pop(entry.device_sn, None)
+            logger.error(f"设备 {entry.device_sn} 的输入流令牌续期失败且已过期: {str(error)}")
+            return
+
+        logger.warning(f"设备 {entry.device_sn} 的输入流令牌续期失败（第{entry.failures}次）: {str(error)}")
+        if self._is_active(entry):
+            # 指数退避重试，最晚在剩余有效期过半时重试
+            delay = settings.relay_token_retry_delay * 2 ** (entry.failures - 1)
+            self._schedule_renewal(entry, now + min(delay, max(1.0, (entry.expire_at - now) / 2)))
+
+    # ============================ 统计 ============================
+
+    def status(self) -> RelayTokenStatus:
+        now = time.time()
+        active = list(self._entries.values())
+        return RelayTokenStatus(
+            method=self.method,
+            tracked=len(active),
+            next_renew_in_s=min(entry.renew_at for entry in active) - now if active else None,
+            soonest_expire_in_s=min(entry.expire_at for entry in active) - now if active else None,
+            renewed=self.renewed,
+            failed=self.failed,
+            expired=self.expired,
+            batches=self.batches,
+        )
+
+
+# 令牌续期调度全局实例
+relay_token_renewer: RelayTokenRenewer = RelayTokenRenewer()
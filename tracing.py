@@ -0,0 +1,302 @@
+'''
+分布式追踪
+接受请求头中的 W3C traceparent（无则新建追踪），在以下位置记录 span：
+API 请求（服务端）、日志中间件读取和格式化请求/响应体的耗时、RTS 服务调用（并向 jusi_meet_rts 传递 traceparent）、
+每个 Volc 接口调用、令牌签发；当前 span 保存在 ContextVar 中，随 asyncio.to_thread 传入线程池
+
+开销：未采样的请求不创建子 span（只传递 traceparent），采样的 span 结束时仅追加到队列，
+由后台任务按批异步导出到 JSON 行文件或 OTLP/HTTP 采集器；队列满时丢弃并计数
+'''
+import asyncio
+import json
+import logging
+import os
+import random
+import re
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from enum import IntEnum
+from typing import Any, Deque, Dict, Iterator, List, Optional, Tuple
+import httpx
+from config import settings
+from schemas import TracingStatus
+
+
+logger = logging.getLogger(__name__)
+
+TRACEPARENT_RE = re.compile(r"^00-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$")
+INVALID_TRACE_ID = "0" * 32
+INVALID_SPAN_ID = "0" * 16
+
+
+# span 类型（取值与 OTLP 一致）
+class SpanKind(IntEnum):
+    Internal = 1
+    Server = 2
+    Client = 3
+
+
+# 一个 span（sampled=False 时只用于传递 traceparent，不记录、不导出）
+@dataclass
+class Span:
+    trace_id: str
+    span_id: str
+    parent_id: Optional[str]
+    name: str
+    sampled: bool
+    kind: SpanKind = SpanKind.Internal
+    start_ns: int = 0
+    end_ns: int = 0
+    attributes: Dict[str, Any] = field(default_factory=dict)
+    error: Optional[str] = None
+
+    def set(self, key: str, value: Any) -> None:
+        if self.sampled:
+            self.attributes[key] = value
+
+    @property
+    def traceparent(self) -> str:
+        return f"00-{self.trace_id}-{self.span_id}-{'01' if self.sampled else '00'}"
+
+    def to_dict(self) -> dict:
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "kind": self.kind.name.lower(),
+            "start_ns": self.start_ns,
+            "duration_us": (self.end_ns - self.start_ns) // 1000,
+            "attributes": self.attributes,
+            "error": self.error,
+        }
+
+    def to_otlp(self) -> dict:
+        span = {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": int(self.kind),
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.end_ns),
+            "attributes": [_otlp_attribute(key, value) for key, value in self.attributes.items()],
+            "status": {"code": 2, "message": self.error} if self.error else {"code": 1},
+        }
+        if self.parent_id:
+            span["parentSpanId"] = self.parent_id
+        return span
+
+
+def _otlp_attribute(key: str, value: Any) -> dict:
+    if isinstance(value, bool):
+        return {"key": key, "value": {"boolValue": value}}
+    if isinstance(value, int):
+        return {"key": key, "value": {"intValue": str(value)}}
+    if isinstance(value, float):
+        return {"key": key, "value": {"doubleValue": value}}
+    return {"key": key, "value": {"stringValue": str(value)}}
+
+
+def parse_traceparent(header: Optional[str]) -> Optional[Tuple[str, str, bool]]:
+    """解析 traceparent，返回 (trace_id, parent_id, 是否已采样)，格式无效时返回 None"""
+    if not header:
+        return None
+    match = TRACEPARENT_RE.match(header.strip().lower())
+    if match is None:
+        return None
+    trace_id, parent_id, flags = match.groups()
+    if trace_id == INVALID_TRACE_ID or parent_id == INVALID_SPAN_ID:
+        return None
+    return trace_id, parent_id, bool(int(flags, 16) & 0x01)
+
+
+def _new_id(bits: int) -> str:
+    return f"{random.getrandbits(bits) or 1:0{bits // 4}x}"
+
+
+# 当前 span（asyncio.to_thread 会复制上下文，线程池中的同步调用可直接读取）
+_current: ContextVar[Optional[Span]] = ContextVar("trace_span", default=None)
+
+
+def current_span() -> Optional[Span]:
+    return _current.get()
+
+
+class Tracer:
+    """创建 span 并按批异步导出（结束的 span 可能来自线程池，队列只使用线程安全的 append/popleft）"""
+
+    def __init__(self):
+        self._queue: Deque[Span] = deque()
+        self._task: Optional[asyncio.Task] = None
+        self._flush: Optional[asyncio.Event] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._client: Optional[httpx.AsyncClient] = None
+        self.started_traces = 0  # 采样的请求数
+        self.recorded = 0
+        self.exported = 0
+        self.dropped = 0  # 队列满时丢弃的 span 数
+        self.export_errors = 0
+
+    @property
+    def enabled(self) -> bool:
+        return settings.trace_exporter in ("file", "otlp")
+
+    # ============================ span ============================
+
+    @contextmanager
+    def start_request(self, traceparent: Optional[str], name: str, **attributes) -> Iterator[Optional[Span]]:
+        """请求的根 span：有上游 traceparent 时沿用其追踪ID；未采样且无上游追踪时不创建 span"""
+        parent = parse_traceparent(traceparent)
+        trace_id, parent_id, parent_sampled = parent if parent else (None, None, False)
+        # parent-based：有合法上游 traceparent 时完全沿用其采样决定，只有无上游时才按比例采样
+        if parent is not None and settings.trace_parent_based:
+            sampled = self.enabled and parent_sampled
+        else:
+            sampled = self.enabled and random.random() < settings.trace_sample_rate
+        if trace_id is None and not sampled:
+            yield None
+            return
+        if sampled:
+            self.started_traces += 1
+        span = Span(trace_id=trace_id or _new_id(128), span_id=_new_id(64), parent_id=parent_id, name=name,
+                    sampled=sampled, kind=SpanKind.Server, attributes=attributes if sampled else {})
+        with self._activate(span):
+            yield span
+
+    @contextmanager
+    def span(self, name: str, kind: SpanKind = SpanKind.Internal, **attributes) -> Iterator[Optional[Span]]:
+        """当前 span 的子 span；所在请求未采样时直接返回当前 span（可能为 None）"""
+        parent = _current.get()
+        if parent is None or not parent.sampled:
+            yield parent
+            return
+        span = Span(trace_id=parent.trace_id, span_id=_new_id(64), parent_id=parent.span_id, name=name,
+                    sampled=True, kind=kind, attributes=attributes)
+        with self._activate(span):
+            yield span
+
+    @contextmanager
+    def _activate(self, span: Span) -> Iterator[Span]:
+        span.start_ns = time.time_ns()
+        token = _current.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.error = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            _current.reset(token)
+            span.end_ns = time.time_ns()
+            if span.sampled:
+                self._enqueue(span)
+
+    def inject(self, headers: dict) -> None:
+        """向下游请求头写入当前 span 的 traceparent"""
+        span = _current.get()
+        if span is not None:
+            headers["traceparent"] = span.traceparent
+
+    def _enqueue(self, span: Span) -> None:
+        if self._task is None or len(self._queue) >= settings.trace_queue_size:
+            self.dropped += 1
+            return
+        self.recorded += 1
+        self._queue.append(span)
+        if len(self._queue) >= settings.trace_batch_size:
+            # 可能在线程池中调用
+            try:
+                self._loop.call_soon_threadsafe(self._flush.set)
+            except RuntimeError:
+                pass
+
+    # ============================ 导出 ============================
+
+    async def start(self) -> None:
+        if self._task is None and self.enabled:
+            self._loop = asyncio.get_running_loop()
+            self._flush = asyncio.Event()
+            if settings.trace_exporter == "otlp":
+                self._client = httpx.AsyncClient(trust_env=False)
+            self._task = asyncio.create_task(self._export_loop())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+            # 导出剩余的 span
+            while self._queue:
+                await self._export_batch()
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def _export_loop(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._flush.wait(), timeout=settings.trace_export_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._flush.clear()
+            while self._queue:
+                await self._export_batch()
+
+    async def _export_batch(self) -> None:
+        batch: List[Span] = []
+        while self._queue and len(batch) < settings.trace_batch_size:
+            batch.append(self._queue.popleft())
+        try:
+            if settings.trace_exporter == "otlp":
+                await self._export_otlp(batch)
+            else:
+                await asyncio.to_thread(self._export_file, batch)
+            self.exported += len(batch)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self.export_errors += 1
+            logger.warning(f"导出 {len(batch)} 个 span 失败: {str(e)}")
+
+    @staticmethod
+    def _export_file(batch: List[Span]) -> None:
+        path = settings.trace_file_path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        lines = "".join(json.dumps(span.to_dict(), ensure_ascii=False, default=str) + "\n" for span in batch)
+        with open(path, "a", encoding="utf-8") as f:
+            f.write(lines)
+
+    async def _export_otlp(self, batch: List[Span]) -> None:
+        payload = {"resourceSpans": [{
+            "resource": {"attributes": [_otlp_attribute("service.name", settings.app_name)]},
+            "scopeSpans": [{"scope": {"name": "jusi_meet_server"}, "spans": [span.to_otlp() for span in batch]}],
+        }]}
+        response = await self._client.post(settings.trace_collector_url, json=payload,
+                                            timeout=settings.trace_export_timeout)
+        response.raise_for_status()
+
+    # ============================ 统计 ============================
+
+    def status(self) -> TracingStatus:
+        return TracingStatus(
+            exporter=settings.trace_exporter or None,
+            sample_rate=settings.trace_sample_rate,
+            parent_based=settings.trace_parent_based,
+            sampled_requests=self.started_traces,
+            recorded=self.recorded,
+            exported=self.exported,
+            queued=len(self._queue),
+            dropped=self.dropped,
+            export_errors=self.export_errors,
+        )
+
+
+# 分布式追踪全局实例
+tracer: Tracer = Tracer()
@@ -0,0 +1,318 @@
+'''
+流量录制
+在请求日志中间件中按紧凑格式录制请求（到达时间、方法、路径、查询参数、请求体、录制时的状态码和耗时），
+供 bench/replay.py 按原始到达间隔回放到预发布环境，用真实流量形态做容量测试：
+记录在内存中累积后由后台任务按批追加到分段文件（JSON 行或长度+CRC32 分帧的二进制记录），每个 worker 写各自的分段，
+分段达到大小上限时切换新文件，录制总量达到上限后停止录制
+
+记录在请求完成时写入，同一分段内的记录按到达时间最多乱序一个请求的处理时长，读取时按到达时间重新排序
+'''
+import asyncio
+import base64
+import glob
+import heapq
+import json
+import logging
+import os
+import random
+import struct
+import time
+import zlib
+from collections import deque
+from dataclasses import dataclass
+from typing import BinaryIO, Deque, Iterable, Iterator, List, Optional
+from fastapi import Request
+from config import settings
+from schemas import TrafficCaptureStatus
+
+
+logger = logging.getLogger(__name__)
+
+# 二进制分段文件头（格式标识和版本）
+MAGIC = b"JTC1"
+# 记录头: 记录体长度、记录体 CRC32
+RECORD_HEADER = struct.Struct("<II")
+# 记录体开头: 到达时间us、录制时耗时us、状态码、标志位，之后为 \0 分隔的 method、path、query、content_type 和请求体
+ENTRY_HEADER = struct.Struct("<QIHB")
+FIELD_SEP = b"\x00"
+# 标志位: 请求体未录制（multipart 或超过大小上限），回放时跳过
+FLAG_BODY_OMITTED = 0x01
+
+SEGMENT_EXTENSIONS = {"jsonl": ".jsonl", "bin": ".bin"}
+# 读取时按到达时间重新排序的窗口（us），需大于请求的最长处理时间
+REORDER_WINDOW_US = 300 * 1_000_000
+
+
+# 一条录制的请求
+@dataclass
+class CapturedRequest:
+    ts_us: int  # 到达时间（Unix时间戳，us）
+    method: str
+    path: str
+    query: str
+    content_type: str
+    body: bytes
+    body_omitted: bool = False
+    status: int = 0  # 录制时的响应状态码
+    duration_us: int = 0  # 录制时的处理耗时（至响应头）
+
+    def encode_json(self) -> bytes:
+        entry = {
+            "ts_us": self.ts_us,
+            "method": self.method,
+            "path": self.path,
+            "query": self.query,
+            "content_type": self.content_type,
+            "status": self.status,
+            "duration_us": self.duration_us,
+        }
+        if self.body_omitted:
+            entry["body_omitted"] = True
+        elif self.body:
+            try:
+                entry["body"] = self.body.decode("utf-8")
+            except UnicodeDecodeError:
+                entry["body_b64"] = base64.b64encode(self.body).decode("ascii")
+        return json.dumps(entry, ensure_ascii=False, separators=(",", ":")).encode("utf-8") + b"\n"
+
+    @classmethod
+    def decode_json(cls, line: bytes) -> "CapturedRequest":
+        entry = json.loads(line)
+        if "body_b64" in entry:
+            body = base64.b64decode(entry["body_b64"])
+        else:
+            body = entry.get("body", "").encode("utf-8")
+        return cls(ts_us=entry["ts_us"], method=entry["method"], path=entry["path"], query=entry.get("query", ""),
+                   content_type=entry.get("content_type", ""), body=body,
+                   body_omitted=entry.get("body_omitted", False), status=entry.get("status", 0),
+                   duration_us=entry.get("duration_us", 0))
+
+    def encode_binary(self) -> bytes:
+        fields = (self.method, self.path, self.query, self.content_type)
+        body = ENTRY_HEADER.pack(self.ts_us, min(self.duration_us, 0xFFFFFFFF), self.status,
+                                 FLAG_BODY_OMITTED if self.body_omitted else 0) \
+            + FIELD_SEP.join(field.encode("utf-8") for field in fields) + FIELD_SEP + self.body
+        return RECORD_HEADER.pack(len(body), zlib.crc32(body)) + body
+
+    @classmethod
+    def decode_binary(cls, body: bytes) -> "CapturedRequest":
+        ts_us, duration_us, status, flags = ENTRY_HEADER.unpack_from(body)
+        method, path, query, content_type, payload = body[ENTRY_HEADER.size:].split(FIELD_SEP, 4)
+        return cls(ts_us=ts_us, method=method.decode("utf-8"), path=path.decode("utf-8"),
+                   query=query.decode("utf-8"), content_type=content_type.decode("utf-8"), body=payload,
+                   body_omitted=bool(flags & FLAG_BODY_OMITTED), status=status, duration_us=duration_us)
+
+
+# ============================ 读取 ============================
+
+def read_segment(path: str) -> Iterator[CapturedRequest]:
+    """按写入顺序读取一个分段文件，跳过写了一半的尾部记录"""
+    with open(path, "rb") as f:
+        if path.endswith(SEGMENT_EXTENSIONS["bin"]):
+            yield from _read_binary(f, path)
+            return
+        for line in f:
+            if not line.endswith(b"\n"):
+                break
+            try:
+                yield CapturedRequest.decode_json(line)
+            except (ValueError, KeyError):
+                logger.warning(f"{path} 中有无法解析的记录，已跳过")
+
+
+def _read_binary(f: BinaryIO, path: str) -> Iterator[CapturedRequest]:
+    if f.read(len(MAGIC)) != MAGIC:
+        logger.warning(f"{path} 不是流量录制分段，已跳过")
+        return
+    while True:
+        header = f.read(RECORD_HEADER.size)
+        if len(header) < RECORD_HEADER.size:
+            return
+        length, crc = RECORD_HEADER.unpack(header)
+        body = f.read(length)
+        if len(body) < length or zlib.crc32(body) != crc:
+            return
+        yield CapturedRequest.decode_binary(body)
+
+
+def list_segments(paths: Iterable[str]) -> List[str]:
+    """展开目录为其中的分段文件"""
+    segments: List[str] = []
+    for path in paths:
+        if os.path.isdir(path):
+            for extension in SEGMENT_EXTENSIONS.values():
+                segments.extend(glob.glob(os.path.join(path, f"*{extension}")))
+        else:
+            segments.append(path)
+    return sorted(segments)
+
+
+def read_captures(paths: Iterable[str]) -> Iterator[CapturedRequest]:
+    """按到达时间顺序读取所有分段（可来自多个 worker），流式读取，内存占用只与重新排序窗口内的请求数有关"""
+    streams = [_reorder(read_segment(path)) for path in list_segments(paths)]
+    yield from heapq.merge(*streams, key=lambda entry: entry.ts_us)
+
+
+def _reorder(entries: Iterator[CapturedRequest]) -> Iterator[CapturedRequest]:
+    heap: list = []
+    for seq, entry in enumerate(entries):
+        heapq.heappush(heap, (entry.ts_us, seq, entry))
+        while heap[0][0] < entry.ts_us - REORDER_WINDOW_US:
+            yield heapq.heappop(heap)[2]
+    while heap:
+        yield heapq.heappop(heap)[2]
+
+
+# ============================ 录制 ============================
+
+class TrafficCapture:
+    """录制请求并按批追加到分段文件（文件写入在线程池中执行，同一时间只有一个写入）"""
+
+    def __init__(self):
+        self.format = settings.capture_format if settings.capture_format in SEGMENT_EXTENSIONS else "jsonl"
+        self._queue: Deque[CapturedRequest] = deque()
+        self._task: Optional[asyncio.Task] = None
+        self._stopping: Optional[asyncio.Event] = None
+        self._file: Optional[BinaryIO] = None
+        self._segment_bytes = 0
+        self._segment_seq = 0
+        self._prefix = ""
+        self.segment_path: Optional[str] = None
+        self.captured = 0
+        self.written_bytes = 0
+        self.segments = 0
+        self.omitted_bodies = 0
+        self.dropped = 0  # 队列满时丢弃的请求数
+        self.write_errors = 0
+        self.full = False  # 已达到录制总量上限
+
+    @property
+    def enabled(self) -> bool:
+        return self._task is not None and not self.full
+
+    async def start(self) -> None:
+        if self._task is None and settings.capture_enabled:
+            os.makedirs(settings.capture_dir, exist_ok=True)
+            # 多个 worker 写各自的分段
+            self._prefix = f"{os.getpid()}-{int(time.time() * 1000)}"
+            self._stopping = asyncio.Event()
+            self._task = asyncio.create_task(self._flush_loop())
+            logger.info(f"流量录制已开启，分段目录 {settings.capture_dir}")
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            # 不取消写入任务，避免线程池中的写入与最后一次写入并发
+            self._stopping.set()
+            await self._task
+            self._task = None
+            if self._file is not None:
+                await asyncio.to_thread(self._file.close)
+                self._file = None
+
+    def _matches(self, path: str) -> bool:
+        if any(path.startswith(prefix) for prefix in settings.capture_exclude_routes):
+            return False
+        return not settings.capture_routes or any(path.startswith(prefix) for prefix in settings.capture_routes)
+
+    async def capture_request(self, request: Request) -> Optional[CapturedRequest]:
+        """请求到达时调用（需在读取请求体之前，读取后的请求体会缓存供后续使用），不录制时返回 None"""
+        if not self.enabled or not self._matches(request.url.path):
+            return None
+        if settings.capture_sample_rate < 1 and random.random() >= settings.capture_sample_rate:
+            return None
+        ts_us = time.time_ns() // 1000
+        content_type = request.headers.get("content-type", "")
+        body = b""
+        content_length = request.headers.get("content-length", "")
+        omitted = content_type.startswith("multipart/form-data") \
+            or (content_length.isdigit() and int(content_length) > settings.capture_max_body_bytes)
+        if not omitted:
+            body = await request.body()
+            omitted = len(body) > settings.capture_max_body_bytes
+            if omitted:
+                body = b""
+        if omitted:
+            self.omitted_bodies += 1
+        return CapturedRequest(ts_us=ts_us, method=request.method, path=request.url.path,
+                               query=request.url.query, content_type=content_type, body=body, body_omitted=omitted)
+
+    def record(self, entry: CapturedRequest, status: int) -> None:
+        """响应开始时调用，记录状态码和耗时后排队写入"""
+        entry.status = status
+        entry.duration_us = time.time_ns() // 1000 - entry.ts_us
+        if len(self._queue) >= settings.capture_queue_size:
+            self.dropped += 1
+            return
+        self.captured += 1
+        self._queue.append(entry)
+
+    # ============================ 分段写入 ============================
+
+    async def _flush_loop(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._stopping.wait(), timeout=settings.capture_flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            await self._flush()
+            if self._stopping.is_set():
+                return
+
+    async def _flush(self) -> None:
+        if not self._queue:
+            return
+        encode = CapturedRequest.encode_binary if self.format == "bin" else CapturedRequest.encode_json
+        data = b"".join(encode(self._queue.popleft()) for _ in range(len(self._queue)))
+        try:
+            await asyncio.to_thread(self._write, data)
+        except Exception as e:
+            self.write_errors += 1
+            logger.warning(f"写入流量录制分段失败: {str(e)}")
+
+    def _write(self, data: bytes) -> None:
+        if self.written_bytes + len(data) > settings.capture_max_bytes:
+            if not self.full:
+                self.full = True
+                logger.warning(f"流量录制达到总量上限 {settings.capture_max_bytes} 字节，停止录制")
+            return
+        if self._file is None or self._segment_bytes + len(data) > settings.capture_segment_bytes:
+            self._open_segment()
+        self._file.write(data)
+        self._file.flush()
+        self._segment_bytes += len(data)
+        self.written_bytes += len(data)
+
+    def _open_segment(self) -> None:
+        if self._file is not None:
+            self._file.close()
+        self._segment_seq += 1
+        self.segment_path = os.path.join(
+            settings.capture_dir, f"{self._prefix}-{self._segment_seq:04d}{SEGMENT_EXTENSIONS[self.format]}"
+        )
+        self._file = open(self.segment_path, "wb")
+        self._segment_bytes = 0
+        self.segments += 1
+        if self.format == "bin":
+            self._file.write(MAGIC)
+            self._segment_bytes = len(MAGIC)
+
+    # ============================ 统计 ============================
+
+    def status(self) -> TrafficCaptureStatus:
+        return TrafficCaptureStatus(
+            enabled=self.enabled,
+            format=self.format,
+            segment=self.segment_path,
+            captured=self.captured,
+            omitted_bodies=self.omitted_bodies,
+            dropped=self.dropped,
+            queued=len(self._queue),
+            segments=self.segments,
+            written_bytes=self.written_bytes,
+            write_errors=self.write_errors,
+            full=self.full,
+        )
+
+
+# 流量录制全局实例
+traffic_capture: TrafficCapture = TrafficCapture()
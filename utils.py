@@ -1,3 +1,4 @@
+import re
 import uuid
 import json
 import time
@@ -20,3 +21,39 @@ def current_timestamp_s() -> int:
 def current_timestamp_ms() -> int:
     """获取当前时间戳"""
     return int(time.time() * 1000)
+
+
+class Slot:
+    """JSON模板中的动态字段占位符"""
+
+    def __init__(self, name: str):
+        self.name = name
+
+
+class JsonTemplate:
+    """预序列化的JSON请求模板
+
+    模板中的静态部分只序列化一次，渲染时仅对占位符对应的动态字段做序列化并拼接，
+    输出与对完整字典直接 json.dumps 的结果逐字节一致
+    """
+
+    _SLOT_PATTERN = re.compile(r'"\\u0000(\w+)\\u0000"')
+
+    def __init__(self, template: dict):
+        text = json.dumps(template, default=self._encode_slot)
+        parts = self._SLOT_PATTERN.split(text)
+        self._static = [part.encode('utf-8') for part in parts[0::2]]
+        self._slots = parts[1::2]
+
+    @staticmethod
+    def _encode_slot(value):
+        if isinstance(value, Slot):
+            return f"\x00{value.name}\x00"
+        raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+    def render(self, **values) -> bytes:
+        chunks = [self._static[0]]
+        for name, static in zip(self._slots, self._static[1:]):
+            chunks.append(json.dumps(values[name]).encode('utf-8'))
+            chunks.append(static)
+        return b''.join(chunks)
@@ -1,9 +1,21 @@
 # coding:utf-8
 import time
-import json
-from vertc_service import VertcService
+from endpoint_router import endpoint_router
 from access_token import AccessToken, PrivSubscribeStream, PrivPublishStream
 from config import settings
+from bootstrap import LazyInstance
+from utils import JsonTemplate, Slot
+from tracing import tracer
+
+
+# 智能体人设
+SYSTEM_ROLE = ("##人设\n你的名字叫巨思（英文Juice），是一个全能的超级助手，具备强大的知识库、情感理解能力和解决问题的能力。"
+    + "你的目标是高效、专业、友好地帮助用户完成各类任务，包括但不限于日常生活、工作安排、信息检索、学习辅导、创意写作、语言翻译和技术支持等；"
+    + "\n\n##约束\n始终主动、礼貌、有条理；\n回答准确但不冗长，必要时可提供简洁总结+详细解释；\n不清楚的任务会主动澄清，不假设、不误导。"
+    )
+
+# 智能体启动后的欢迎词
+WELCOME_MESSAGE = "我是巨思AI助手，有什么需要我为您效劳的吗？"
 
 
 class VertcClient:
@@ -17,226 +29,397 @@ class VertcClient:
         self.s2s_app_id = settings.doubao_s2s_app_id
         self.s2s_access_token = settings.doubao_s2s_access_token
         
-        self.rtc_service = VertcService()
-        self.rtc_service.set_ak(settings.volc_ak)
-        self.rtc_service.set_sk(settings.volc_sk)
+        # 多接入点路由，按延迟选择接入点并在连接失败时切换
+        self.rtc_service = endpoint_router.get()
 
-    # ============================ 转推直播 ============================
+        # 预序列化的请求模板，调用时只序列化动态字段
+        self.templates = self.build_templates()
 
-    # 启动合流转推（StartPushMixedStreamToCDN）
-    def start_push_mixed_stream(self, room_id, user_id, task_id, push_url="", **kwargs):
-        """启动合流转推"""
-        request = {
+    def build_templates(self):
+        """构建各接口的请求模板，静态配置（应用ID、模型配置、人设等）只序列化一次"""
+        stop_rtc_task = JsonTemplate({
             "AppId": self.rtc_app_id,
-            "RoomId": room_id,
-            "TaskId": task_id,
-            "PushURL": push_url,
-            "ExcludeStreams": {
-                "StreamList": [
-                    {
-                        "UserId": user_id
+            "RoomId": Slot("room_id"),
+            "TaskId": Slot("task_id")
+        })
+
+        return {
+            # ============================ 转推直播 ============================
+            "StartPushMixedStreamToCDN": JsonTemplate({
+                "AppId": self.rtc_app_id,
+                "RoomId": Slot("room_id"),
+                "TaskId": Slot("task_id"),
+                "PushURL": Slot("push_url"),
+                "ExcludeStreams": {
+                    "StreamList": [
+                        {
+                            "UserId": Slot("user_id")
+                        }
+                    ]
+                },
+                "Control": {
+                    "MediaType": Slot("media_type"),            # 0: 音视频，1: 纯音频
+                    "PushStreamMode": Slot("push_stream_mode")  # 0：房间内有用户推流时才触发推流，1：调用接口即触发推流
+                }
+            }),
+            "StopPushStreamToCDN": stop_rtc_task,
+
+            # ============================ 输入在线媒体流 ============================
+            "StartRelayStream": JsonTemplate({
+                "AppId": self.rtc_app_id,
+                "RoomId": Slot("room_id"),
+                "UserId": Slot("user_id"),
+                "TaskId": Slot("task_id"),
+                "Token": Slot("token"),
+                "Control": {
+                    "StreamUrl": Slot("stream_url"),
+                    "VideoWidth": 1280,
+                    "VideoHeight": 720
+                }
+            }),
+            "UpdateRelayStream": JsonTemplate({
+                "AppId": self.rtc_app_id,
+                "RoomId": Slot("room_id"),
+                "TaskId": Slot("task_id"),
+                "Token": Slot("token")
+            }),
+            "StopRelayStream": stop_rtc_task,
+
+            # ============================ 实时对话式AI ============================
+            "StartVoiceChat": JsonTemplate({
+                "AppId": self.rtc_app_id,
+                "RoomId": Slot("room_id"),
+                "TaskId": Slot("task_id"),
+                "Config": {
+                    "S2SConfig": {           # 端到端语音模型核心配置
+                        "Provider": "volcano",  # 端到端语音模型服务提供商，当前固定取值 volcano
+                        "ProviderParams": {  # 语音端到端模型的详细配置
+                            "app": {         # 认证信息
+                                "appid": self.s2s_app_id,  # 必填，端到端模型的appid
+                                "token": self.s2s_access_token  # 必填，端到端模型的token
+                            },
+                            "tts": {  # TTS配置
+                                "speaker": "zh_female_vv_jupiter_bigtts"  # 指定发音人
+                            },
+                            "dialog": {  # 对话设定
+                                "bot_name": "巨思AI助手",
+                                "system_role": SYSTEM_ROLE,
+                                "speaking_style": "亲切",
+                                "dialog_id": Slot("dialog_id")  # 可选项，加载相同dialog id的对话历史，如未设置，会默认生成一个唯一的 ID
+                            }
+                        }
+                    }
+                },
+                "AgentConfig": {
+                    "TargetUserId": [Slot("user_id")],  # 单个房间内，仅支持一个用户与智能体一对一通话
+                    "WelcomeMessage": WELCOME_MESSAGE,  # 智能体启动后的欢迎词
+                    "UserId": Slot("bot_id")  # 智能体 ID，用于标识智能体
+                }
+            }),
+            "StopVoiceChat": stop_rtc_task,
+
+            # ============================ 音视频互动智能体 ============================
+            "StartVideoChat": JsonTemplate({
+                "AppId": self.cai_app_id,
+                "RoomId": Slot("room_id"),  # 房间ID
+                "TaskId": Slot("task_id"),  # 任务ID
+                "Config": {
+                    "ASRConfig": {
+                    "Provider": "volcano",
+                    "ProviderParams": {
+                        "Mode": "bigmodel",
+                        "StreamMode": 0
+                    },
+                    "VADConfig": {},
+                    "InterruptConfig": {}
+                    },
+                    "LLMConfig": {
+                        "Mode": "ArkV3",
+                        "ModelName": "doubao-seed-1-6-251015",
+                        "TopP": 0.3,
+                        "SystemMessages": [
+                            SYSTEM_ROLE
+                        ],
+                        "HistoryLength": 10,
+                        "ThinkingType": "disabled",
+                        "VisionConfig": {
+                            "SnapshotConfig": {},
+                            "StorageConfig": {
+                            "TosConfig": {}
+                            }
+                        }
+                    },
+                    "TTSConfig": {
+                        "Provider": "volcano_bidirection",
+                        "ProviderParams": {
+                            "Credential": {
+                                "ResourceId": "seed-tts-1.0"
+                            },
+                            "VolcanoTTSParameters": "{\"req_params\":{\"speaker\":\"zh_female_shuangkuaisisi_emo_v2_mars_bigtts\",\"audio_params\":{\"speech_rate\":0}}}"
+                        }
+                    },
+                    "SubtitleConfig": {
+                        "DisableRTSSubtitle": True
+                    },
+                    "InterruptMode": 0,
+                    "FunctionCallingConfig": {},
+                    "WebSearchAgentConfig": {},
+                    "MemoryConfig": {},
+                    "MusicAgentConfig": {}
+                },
+                "AgentConfig": {
+                    "TargetUserId": [Slot("user_id")],  # 目前仅支持一个用户与智能体对话
+                    "UserId": Slot("bot_id"),
+                    "WelcomeMessage": WELCOME_MESSAGE,
+                    "Burst": {
+                        "Enable": False,
+                        "BufferSize": 0,
+                        "Interval": 0
+                    },
+                    "VoicePrint": {
+                        "MetaList": None,
+                        "VoicePrintList": None
                     }
-                ]
-            },
-            "Control": {
-                "MediaType": kwargs.get('media_type', 1),            # 0: 音视频，1: 纯音频
-                "PushStreamMode": kwargs.get('push_stream_mode', 1)  # 0：房间内有用户推流时才触发推流，1：调用接口即触发推流
-            }
+                }
+            }),
+            "StopVideoChat": JsonTemplate({
+                "AppId": self.cai_app_id,
+                "RoomId": Slot("room_id"),
+                "TaskId": Slot("task_id")
+            }),
+
+            # ============================ 云端录制 ============================
+            "StartRecord": JsonTemplate({
+                "AppId": self.rtc_app_id,
+                "RoomId": Slot("room_id"),
+                "TaskId": Slot("task_id"),
+                "RecordMode": 0,  # 0: 合流录制，1: 单流录制
+                "FileFormatConfig": {
+                    "FileFormat": ["MP4"]
+                },
+                "StorageConfig": settings.volc_record_storage
+            }),
+            # 只录制指定用户的流
+            "StartRecordUser": JsonTemplate({
+                "AppId": self.rtc_app_id,
+                "RoomId": Slot("room_id"),
+                "TaskId": Slot("task_id"),
+                "RecordMode": 0,
+                "TargetStreams": {
+                    "StreamList": [
+                        {
+                            "UserId": Slot("user_id")
+                        }
+                    ]
+                },
+                "FileFormatConfig": {
+                    "FileFormat": ["MP4"]
+                },
+                "StorageConfig": settings.volc_record_storage
+            }),
+            "StopRecord": stop_rtc_task,
+
+            # ============================ 实时消息通信 ============================
+            "SendUnicast": JsonTemplate({
+                "AppId": self.rtc_app_id,
+                "From": Slot("from_user"),
+                "To": Slot("to_user"),
+                "Binary": Slot("binary"),
+                "Message": Slot("message")
+            }),
+            "SendRoomUnicast": JsonTemplate({
+                "AppId": self.rtc_app_id,
+                "RoomId": Slot("room_id"),
+                "From": Slot("from_user"),
+                "To": Slot("to_user"),
+                "Binary": Slot("binary"),
+                "Message": Slot("message")
+            }),
+            "BatchSendRoomUnicast": JsonTemplate({
+                "AppId": self.rtc_app_id,
+                "RoomId": Slot("room_id"),
+                "From": Slot("from_user"),
+                "To": Slot("to_users"),
+                "Binary": Slot("binary"),
+                "Message": Slot("message")
+            }),
+            "SendBroadcast": JsonTemplate({
+                "AppId": self.rtc_app_id,
+                "RoomId": Slot("room_id"),
+                "From": Slot("from_user"),
+                "Binary": Slot("binary"),
+                "Message": Slot("message")
+            }),
         }
 
-        body = json.dumps(request)
-        return self.rtc_service.start_push_mixed_stream_to_cdn(body)
+    # ============================ 转推直播 ============================
+
+    # 启动合流转推（StartPushMixedStreamToCDN）
+    def start_push_mixed_stream(self, room_id, user_id, task_id, push_url="", **kwargs):
+        """启动合流转推"""
+        body = self.templates["StartPushMixedStreamToCDN"].render(
+            room_id=room_id,
+            task_id=task_id,
+            push_url=push_url,
+            user_id=user_id,  # 排除的用户ID
+            media_type=kwargs.get('media_type', 1),            # 0: 音视频，1: 纯音频
+            push_stream_mode=kwargs.get('push_stream_mode', 1)  # 0：房间内有用户推流时才触发推流，1：调用接口即触发推流
+        )
+        return self.rtc_service.call("start_push_mixed_stream_to_cdn", body)
 
     # 停止合流转推（StopPushStreamToCDN）
     def stop_push_stream_to_cdn(self, room_id, task_id):    
         """停止合流转推"""
-        request = {
-            "AppId": self.rtc_app_id,
-            "RoomId": room_id,
-            "TaskId": task_id
-        }
-
-        body = json.dumps(request)
-        return self.rtc_service.stop_push_stream_to_cdn(body)
+        body = self.templates["StopPushStreamToCDN"].render(room_id=room_id, task_id=task_id)
+        return self.rtc_service.call("stop_push_stream_to_cdn", body)
 
     # ============================ 输入在线媒体流 ============================
 
     # 启动在线媒体流输入（StartRelayStream）
-    def start_relay_stream(self, room_id, user_id, task_id, stream_url, **kwargs):
-        """启动在线媒体流输入"""
-        atobj = AccessToken(self.rtc_app_id, self.rtc_app_key, room_id, user_id)
-        atobj.add_privilege(PrivSubscribeStream, 0)
-        atobj.add_privilege(PrivPublishStream, int(time.time()) + settings.volc_token_expire_seconds)
-        atobj.expire_time(int(time.time()) + settings.volc_token_expire_seconds)  # TODO: 复用优化，将token放在redis中，设定过期时间
-        token = atobj.serialize()
-
-        request = {
-            "AppId": self.rtc_app_id,
-            "RoomId": room_id,
-            "UserId": user_id,
-            "TaskId": task_id,
-            "Token": token,
-            "Control": {
-                "StreamUrl": stream_url,
-                "VideoWidth": 1280,
-                "VideoHeight": 720
-            }
-        }
+    def start_relay_stream(self, room_id, user_id, task_id, stream_url, token=None, expire_at=None, **kwargs):
+        """启动在线媒体流输入，未指定令牌时签发过期时间为 expire_at 的令牌"""
+        if token is None:
+            if expire_at is None:
+                expire_at = int(time.time()) + settings.volc_token_expire_seconds
+            token = self.build_relay_token(room_id, user_id, expire_at)
 
-        body = json.dumps(request)
-        return self.rtc_service.start_relay_stream(body)
+        body = self.templates["StartRelayStream"].render(
+            room_id=room_id,
+            user_id=user_id,
+            task_id=task_id,
+            token=token,
+            stream_url=stream_url
+        )
+        return self.rtc_service.call("start_relay_stream", body)
     
+    # 签发在线媒体流输入的进房令牌
+    def build_relay_token(self, room_id, user_id, expire_at):
+        with tracer.span("token.sign", **{"rtc.room_id": room_id}):
+            atobj = AccessToken(self.rtc_app_id, self.rtc_app_key, room_id, user_id)
+            atobj.add_privilege(PrivSubscribeStream, 0)
+            atobj.add_privilege(PrivPublishStream, expire_at)
+            atobj.expire_time(expire_at)
+            return atobj.serialize()
+
+    # 更新在线媒体流输入的令牌（UpdateRelayStream），由令牌续期调度在过期前调用
+    def update_relay_stream_token(self, room_id, task_id, token):
+        """更新在线媒体流输入的令牌"""
+        body = self.templates["UpdateRelayStream"].render(room_id=room_id, task_id=task_id, token=token)
+        return self.rtc_service.call("update_relay_stream", body)
+
     # 停止在线媒体流输入（StopRelayStream）
     def stop_relay_stream(self, room_id, task_id):
         """停止在线媒体流输入"""
-        request = {
-            "AppId": self.rtc_app_id,
-            "RoomId": room_id,
-            "TaskId": task_id
-        }
-
-        body = json.dumps(request)
-        return self.rtc_service.stop_relay_stream(body)
+        body = self.templates["StopRelayStream"].render(room_id=room_id, task_id=task_id)
+        return self.rtc_service.call("stop_relay_stream", body)
     
     # ============================ 实时对话式AI ============================
 
+    # 构建实时对话式AI请求体（可提前构建，启动时直接发送）
+    def build_voice_chat_body(self, room_id, bot_id, user_id, task_id, dialog_id):
+        return self.templates["StartVoiceChat"].render(
+            room_id=room_id,
+            task_id=task_id,
+            dialog_id=dialog_id,
+            user_id=user_id,
+            bot_id=bot_id
+        )
+
     # 启动实时对话式AI（StartVoiceChat）
     def start_voice_chat(self, room_id, bot_id, user_id, task_id, dialog_id, **kwargs):
         """启动实时对话式AI"""
-        request = {
-            "AppId": self.rtc_app_id,
-            "RoomId": room_id,
-            "TaskId": task_id,
-            "Config": {
-                "S2SConfig": {           # 端到端语音模型核心配置
-                    "Provider": "volcano",  # 端到端语音模型服务提供商，当前固定取值 volcano
-                    "ProviderParams": {  # 语音端到端模型的详细配置
-                        "app": {         # 认证信息
-                            "appid": self.s2s_app_id,  # 必填，端到端模型的appid
-                            "token": self.s2s_access_token  # 必填，端到端模型的token
-                        },
-                        "tts": {  # TTS配置
-                            "speaker": "zh_female_vv_jupiter_bigtts"  # 指定发音人
-                        },
-                        "dialog": {  # 对话设定
-                            "bot_name": "巨思AI助手",
-                            "system_role": ("##人设\n你的名字叫巨思（英文Juice），是一个全能的超级助手，具备强大的知识库、情感理解能力和解决问题的能力。"
-                                + "你的目标是高效、专业、友好地帮助用户完成各类任务，包括但不限于日常生活、工作安排、信息检索、学习辅导、创意写作、语言翻译和技术支持等；"
-                                + "\n\n##约束\n始终主动、礼貌、有条理；\n回答准确但不冗长，必要时可提供简洁总结+详细解释；\n不清楚的任务会主动澄清，不假设、不误导。"
-                                ),
-                            "speaking_style": "亲切",
-                            "dialog_id": dialog_id  # 可选项，加载相同dialog id的对话历史，如未设置，会默认生成一个唯一的 ID
-                        }
-                    }
-                }
-            },
-            "AgentConfig": {
-                "TargetUserId": [user_id],  # 单个房间内，仅支持一个用户与智能体一对一通话
-                "WelcomeMessage": "我是巨思AI助手，有什么需要我为您效劳的吗？",  # 智能体启动后的欢迎词
-                "UserId": bot_id  # 智能体 ID，用于标识智能体
-            }
-        }
-
-        body = json.dumps(request)
-        return self.rtc_service.start_voice_chat(body)
+        body = self.build_voice_chat_body(room_id, bot_id, user_id, task_id, dialog_id)
+        return self.rtc_service.call("start_voice_chat", body)
         
     # 关闭实时对话式AI（StopVoiceChat）
     def stop_voice_chat(self, room_id, task_id):
         """停止实时对话式AI"""
-        request = {
-            "AppId": self.rtc_app_id,
-            "RoomId": room_id,
-            "TaskId": task_id
-        }
-
-        body = json.dumps(request)
-        return self.rtc_service.stop_voice_chat(body)
+        body = self.templates["StopVoiceChat"].render(room_id=room_id, task_id=task_id)
+        return self.rtc_service.call("stop_voice_chat", body)
     
     # ============================ 音视频互动智能体 ============================
 
+    # 构建音视频互动智能体请求体（可提前构建，启动时直接发送）
+    def build_video_chat_body(self, room_id, bot_id, user_id, task_id):
+        return self.templates["StartVideoChat"].render(
+            room_id=room_id,
+            task_id=task_id,
+            user_id=user_id,
+            bot_id=bot_id
+        )
+
     # 启动音视频互动智能体（StartVideoChat）
     def start_video_chat(self, room_id, bot_id, user_id, task_id, **kwargs):
         """启动音视频互动智能体"""
-        request = {
-            "AppId": self.cai_app_id,
-            "RoomId": room_id,  # 房间ID
-            "TaskId": task_id,  # 任务ID
-            "Config": {
-                "ASRConfig": {
-                "Provider": "volcano",
-                "ProviderParams": {
-                    "Mode": "bigmodel",
-                    "StreamMode": 0
-                },
-                "VADConfig": {},
-                "InterruptConfig": {}
-                },
-                "LLMConfig": {
-                    "Mode": "ArkV3",
-                    "ModelName": "doubao-seed-1-6-251015",
-                    "TopP": 0.3,
-                    "SystemMessages": [
-                        "##人设\n你的名字叫巨思（英文Juice），是一个全能的超级助手，具备强大的知识库、情感理解能力和解决问题的能力。你的目标是高效、专业、友好地帮助用户完成各类任务，包括但不限于日常生活、工作安排、信息检索、学习辅导、创意写作、语言翻译和技术支持等；\n\n##约束\n始终主动、礼貌、有条理；\n回答准确但不冗长，必要时可提供简洁总结+详细解释；\n不清楚的任务会主动澄清，不假设、不误导。"
-                    ],
-                    "HistoryLength": 10,
-                    "ThinkingType": "disabled",
-                    "VisionConfig": {
-                        "SnapshotConfig": {},
-                        "StorageConfig": {
-                        "TosConfig": {}
-                        }
-                    }
-                },
-                "TTSConfig": {
-                    "Provider": "volcano_bidirection",
-                    "ProviderParams": {
-                        "Credential": {
-                            "ResourceId": "seed-tts-1.0"
-                        },
-                        "VolcanoTTSParameters": "{\"req_params\":{\"speaker\":\"zh_female_shuangkuaisisi_emo_v2_mars_bigtts\",\"audio_params\":{\"speech_rate\":0}}}"
-                    }
-                },
-                "SubtitleConfig": {
-                    "DisableRTSSubtitle": True
-                },
-                "InterruptMode": 0,
-                "FunctionCallingConfig": {},
-                "WebSearchAgentConfig": {},
-                "MemoryConfig": {},
-                "MusicAgentConfig": {}
-            },
-            "AgentConfig": {
-                "TargetUserId": [user_id],  # 目前仅支持一个用户与智能体对话
-                "UserId": bot_id,
-                "WelcomeMessage": "我是巨思AI助手，有什么需要我为您效劳的吗？",
-                "Burst": {
-                    "Enable": False,
-                    "BufferSize": 0,
-                    "Interval": 0
-                },
-                "VoicePrint": {
-                    "MetaList": None,
-                    "VoicePrintList": None
-                }
-            }
-        }
-        body = json.dumps(request)
-        return self.rtc_service.start_video_chat(body)
+        body = self.build_video_chat_body(room_id, bot_id, user_id, task_id)
+        return self.rtc_service.call("start_video_chat", body)
+
+    # 使用提前构建的请求体启动智能体（method 为 start_voice_chat 或 start_video_chat）
+    def start_agent(self, method, body):
+        """使用提前构建的请求体启动智能体"""
+        return self.rtc_service.call(method, body)
 
     # 关闭音视频互动智能体（StopVideoChat）
     def stop_video_chat(self, room_id, task_id):
         """停止音视频互动智能体"""
-        request = {
-            "AppId": self.cai_app_id,
-            "RoomId": room_id,
-            "TaskId": task_id
-        }
+        body = self.templates["StopVideoChat"].render(room_id=room_id, task_id=task_id)
+        return self.rtc_service.call("stop_video_chat", body)
+
+    # ============================ 云端录制 ============================
+
+    # 开始云端录制（StartRecord）
+    def start_record(self, room_id, task_id, user_id=None):
+        """开始云端录制，指定 user_id 时只录制该用户的流"""
+        if user_id:
+            body = self.templates["StartRecordUser"].render(room_id=room_id, task_id=task_id, user_id=user_id)
+        else:
+            body = self.templates["StartRecord"].render(room_id=room_id, task_id=task_id)
+        return self.rtc_service.call("start_record", body)
+
+    # 停止云端录制（StopRecord）
+    def stop_record(self, room_id, task_id):
+        """停止云端录制"""
+        body = self.templates["StopRecord"].render(room_id=room_id, task_id=task_id)
+        return self.rtc_service.call("stop_record", body)
+
+    # 查询录制任务状态（GetRecordTask）
+    def get_record_task(self, room_id, task_id):
+        """查询录制任务状态和录制文件"""
+        params = {"AppId": self.rtc_app_id, "RoomId": room_id, "TaskId": task_id}
+        return self.rtc_service.call("get_record_task", params)
+
+    # ============================ 实时消息通信 ============================
+
+    # 发送房间外点对点消息（SendUnicast）
+    def send_unicast(self, from_user, to_user, message, binary=False):
+        """发送房间外点对点消息"""
+        body = self.templates["SendUnicast"].render(from_user=from_user, to_user=to_user, binary=binary, message=message)
+        return self.rtc_service.call("send_unicast", body)
+
+    # 发送房间内点对点消息（SendRoomUnicast）
+    def send_room_unicast(self, room_id, from_user, to_user, message, binary=False):
+        """发送房间内点对点消息"""
+        body = self.templates["SendRoomUnicast"].render(
+            room_id=room_id, from_user=from_user, to_user=to_user, binary=binary, message=message
+        )
+        return self.rtc_service.call("send_room_unicast", body)
+
+    # 批量发送房间内点对点消息（BatchSendRoomUnicast）
+    def batch_send_room_unicast(self, room_id, from_user, to_users, message, binary=False):
+        """向房间内多个用户发送相同的点对点消息"""
+        body = self.templates["BatchSendRoomUnicast"].render(
+            room_id=room_id, from_user=from_user, to_users=to_users, binary=binary, message=message
+        )
+        return self.rtc_service.call("batch_send_room_unicast", body)
 
-        body = json.dumps(request)
-        return self.rtc_service.stop_video_chat(body)
+    # 发送房间内广播消息（SendBroadcast）
+    def send_broadcast(self, room_id, from_user, message, binary=False):
+        """发送房间内广播消息"""
+        body = self.templates["SendBroadcast"].render(room_id=room_id, from_user=from_user, binary=binary, message=message)
+        return self.rtc_service.call("send_broadcast", body)
 
-# veRTC全局实例
-rtc_client: VertcClient = VertcClient()
+# veRTC全局实例（首次使用时构造，应用启动时在 lifespan 中提前构造）
+rtc_client: VertcClient = LazyInstance(VertcClient, "rtc_client")
 
 
 # 测试代码
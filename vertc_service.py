@@ -1,35 +1,141 @@
 # coding:utf-8
 import json
 import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 
+from requests.adapters import HTTPAdapter
 from volcengine.ApiInfo import ApiInfo
 from volcengine.Credentials import Credentials
 from volcengine.base.Service import Service
 from volcengine.ServiceInfo import ServiceInfo
 from config import settings
+from bootstrap import LazyInstance
+from request_deadline import cap_timeout
+import volc_signer
+
+
+# 默认接入点
+VOLC_DEFAULT_HOST = "rtc.volcengineapi.com"
 
 
 class VertcService(Service):
     _instance_lock = threading.Lock()
+    _instances = {}  # (host, region) -> 实例，每个接入点一个单例
 
-    def __new__(cls, *args, **kwargs):
-        if not hasattr(VertcService, "_instance"):
+    def __new__(cls, host=VOLC_DEFAULT_HOST, region=None):
+        key = (host, region or settings.volc_region)
+        if key not in VertcService._instances:
             with VertcService._instance_lock:
-                if not hasattr(VertcService, "_instance"):
-                    VertcService._instance = object.__new__(cls)
-        return VertcService._instance
+                if key not in VertcService._instances:
+                    VertcService._instances[key] = object.__new__(cls)
+        return VertcService._instances[key]
 
-    def __init__(self):
-        self.service_info = VertcService.get_service_info()
+    def __init__(self, host=VOLC_DEFAULT_HOST, region=None):
+        if getattr(self, "_initialized", False):
+            return
+        self.service_info = VertcService.get_service_info(host, region or settings.volc_region)
         self.api_info = VertcService.get_api_info()
         super(VertcService, self).__init__(self.service_info, self.api_info)
+        self.configure_pool(settings.volc_pool_size)
+        self.warmups = 0  # 预热/保活请求次数
+        self.last_warmup_ms = None  # 最近一次预热耗时
+        self._initialized = True
 
     @staticmethod
-    def get_service_info():
-        service_info = ServiceInfo("rtc.volcengineapi.com", {'Accept': 'application/json'},
-                                   Credentials('', '', 'rtc', settings.volc_region), 30, 30)
+    def get_service_info(host=VOLC_DEFAULT_HOST, region=None):
+        service_info = ServiceInfo(host, {'Accept': 'application/json'},
+                                   Credentials('', '', 'rtc', region or settings.volc_region),
+                                   settings.volc_connect_timeout, settings.volc_read_timeout)
         return service_info
 
+    # ============================ 连接池 ============================
+
+    def configure_pool(self, pool_size):
+        """设置长连接池大小，连接池满时不阻塞（临时新建连接）"""
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def action_timeout(self, api):
+        """按接口取 (连接超时, 读超时)，未单独配置的使用默认值；均不超过请求剩余时间"""
+        timeout = settings.volc_action_timeouts.get(api)
+        connect, read = timeout if timeout else (self.service_info.connection_timeout, self.service_info.socket_timeout)
+        return cap_timeout(connect), cap_timeout(read)
+
+    def base_url(self):
+        return f"{self.service_info.scheme}://{self.service_info.host}/"
+
+    def warm_up(self, connections):
+        """并发发送轻量请求，完成DNS解析、TCP建连并在连接池中保留 connections 个长连接"""
+        start = time.perf_counter()
+        url = self.base_url()
+        timeout = (self.service_info.connection_timeout, self.service_info.socket_timeout)
+        with ThreadPoolExecutor(max_workers=max(1, connections)) as executor:
+            responses = list(executor.map(lambda _: self.session.head(url, timeout=timeout), range(max(1, connections))))
+        for response in responses:
+            response.close()
+        self.warmups += len(responses)
+        self.last_warmup_ms = (time.perf_counter() - start) * 1000
+        return self.last_warmup_ms
+
+    def pool_stats(self):
+        """连接池统计：已创建连接数、请求数、空闲连接数"""
+        adapter = self.session.get_adapter(self.base_url())
+        created, requests, idle = 0, 0, 0
+        pools = adapter.poolmanager.pools
+        for key in list(pools.keys()):
+            pool = pools.get(key)
+            if pool is None:
+                continue
+            created += pool.num_connections
+            requests += pool.num_requests
+            if pool.pool is not None:
+                idle += sum(1 for conn in list(pool.pool.queue) if conn is not None)
+        return {
+            "pool_size": adapter._pool_maxsize,
+            "created": created,
+            "requests": requests,
+            "idle": idle,
+            "warmups": self.warmups,
+            "last_warmup_ms": self.last_warmup_ms,
+        }
+
+    # 覆盖 SDK 的 json/get：使用按接口配置的超时和缓存签名密钥的签名实现，
+    # 响应体直接返回原文，不再做一次 json 解析再序列化
+    def json(self, api, params, body):
+        if not (api in self.api_info):
+            raise Exception("no such api")
+        api_info = self.api_info[api]
+        r = self.prepare_request(api_info, params)
+        r.headers['Content-Type'] = 'application/json'
+        r.body = body
+
+        volc_signer.sign(r, self.service_info.credentials)
+
+        url = r.build()
+        resp = self.session.post(url, headers=r.headers, data=r.body, timeout=self.action_timeout(api))
+        if resp.status_code == 200:
+            return resp.text
+        else:
+            raise Exception(resp.text.encode("utf-8"))
+
+    def get(self, api, params, doseq=0):
+        if not (api in self.api_info):
+            raise Exception("no such api")
+        api_info = self.api_info[api]
+
+        r = self.prepare_request(api_info, params, doseq)
+
+        volc_signer.sign(r, self.service_info.credentials)
+
+        url = r.build(doseq)
+        resp = self.session.get(url, headers=r.headers, timeout=self.action_timeout(api))
+        if resp.status_code == 200:
+            return resp.text
+        else:
+            raise Exception(resp.text)
+
     @staticmethod
     def get_api_info():
         api_info = {
@@ -44,6 +150,7 @@ class VertcService(Service):
 
             # 输入在线媒体流
             "StartRelayStream": ApiInfo("POST", "/", {"Action": "StartRelayStream", "Version": "2023-11-01"}, {}, {}),
+            "UpdateRelayStream": ApiInfo("POST", "/", {"Action": "UpdateRelayStream", "Version": "2023-11-01"}, {}, {}),
             "StopRelayStream": ApiInfo("POST", "/", {"Action": "StopRelayStream", "Version": "2023-11-01"}, {}, {}),
 
             # 实时对话式AI
@@ -58,6 +165,7 @@ class VertcService(Service):
             "SendUnicast": ApiInfo("POST", "/", {"Action": "SendUnicast", "Version": "2023-07-20"}, {}, {}),
             "SendBroadcast": ApiInfo("POST", "/", {"Action": "SendBroadcast", "Version": "2023-07-20"}, {}, {}),
             "SendRoomUnicast": ApiInfo("POST", "/", {"Action": "SendRoomUnicast", "Version": "2023-07-20"}, {}, {}),
+            "BatchSendRoomUnicast": ApiInfo("POST", "/", {"Action": "BatchSendRoomUnicast", "Version": "2023-07-20"}, {}, {}),
         }
         return api_info
 
@@ -112,6 +220,14 @@ class VertcService(Service):
         res_json = json.loads(res)
         return res_json
     
+    # 更新在线媒体流输入（UpdateRelayStream）
+    def update_relay_stream(self, body):
+        res = self.json("UpdateRelayStream", {}, body)
+        if res == '':
+            raise Exception("UpdateRelayStream: empty response")
+        res_json = json.loads(res)
+        return res_json
+
     # 停止在线媒体流输入（StopRelayStream）
     def stop_relay_stream(self, body):
         res = self.json("StopRelayStream", {}, body)
@@ -183,8 +299,21 @@ class VertcService(Service):
         res_json = json.loads(res)
         return res_json
 
+# 批量发送房间内点对点消息（BatchSendRoomUnicast）
+    def batch_send_room_unicast(self, body):
+        res = self.json("BatchSendRoomUnicast", {}, body)
+        if res == '':
+            raise Exception("BatchSendRoomUnicast: empty response")
+        res_json = json.loads(res)
+        return res_json
+
+
+def build_rtc_service() -> VertcService:
+    service = VertcService()
+    service.set_ak(settings.volc_ak)
+    service.set_sk(settings.volc_sk)
+    return service
+
 
-# 实时消息通信服务实例
-rtc_service: VertcService = VertcService()
-rtc_service.set_ak(settings.volc_ak)
-rtc_service.set_sk(settings.volc_sk)
+# 实时消息通信服务实例（首次使用时构造）
+rtc_service: VertcService = LazyInstance(build_rtc_service, "rtc_service")